@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+
+import numpy as np
+
+from nuvox.services.gaze_replay_server import GazeReplayServer, generate_synthetic_gaze
+from nuvox.services.gaze_stream import GazeStreamClient
+
+
+async def measure_throughput(rate_hz, streaming, duration):
+    """
+    Serve synthetic gaze at rate_hz and consume it with GazeStreamClient for duration seconds
+
+    Returns
+    -------
+    results: dict
+        samples per second received and the p50 / p95 / max gap between samples in ms
+    """
+    server = GazeReplayServer(generate_synthetic_gaze(rate_hz), rate_hz=rate_hz, host='127.0.0.1', port=0,
+                              streaming=streaming)
+    await server.start()
+    client = GazeStreamClient('http://127.0.0.1:{}'.format(server.port), poll_interval=1 / rate_hz)
+    timestamps = []
+    try:
+        async for timestamp, _, _ in client.iter_samples():
+            timestamps.append(timestamp)
+            if timestamp - timestamps[0] >= duration:
+                break
+    finally:
+        await server.stop()
+
+    gaps_ms = 1000 * np.diff(timestamps)
+    return {'mode': client.mode,
+            'samples_per_sec': (len(timestamps) - 1) / (timestamps[-1] - timestamps[0]),
+            'p50_gap_ms': float(np.percentile(gaps_ms, 50)),
+            'p95_gap_ms': float(np.percentile(gaps_ms, 95)),
+            'max_gap_ms': float(gaps_ms.max())}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Measure gaze throughput with the stand-in server at several rates')
+    parser.add_argument('--rates', type=float, nargs='+', default=[30, 60, 120, 250])
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds to measure each rate and mode for')
+    args = parser.parse_args()
+
+    for _rate in args.rates:
+        for _streaming in [True, False]:
+            _results = asyncio.run(measure_throughput(_rate, _streaming, args.duration))
+            print('{:>5.0f}Hz {:<6} {:>7.1f} samples/s  gap p50 {:>6.2f}ms  p95 {:>6.2f}ms  max {:>6.2f}ms'.format(
+                _rate, _results['mode'], _results['samples_per_sec'], _results['p50_gap_ms'],
+                _results['p95_gap_ms'], _results['max_gap_ms']))
@@ -0,0 +1,53 @@
+import argparse
+import time
+
+import numpy as np
+
+from nuvox.services.gpt2 import GPT2
+
+PROMPTS = ['what is your favourite', 'I would like to go to the', 'can you pass me the', 'she said that',
+           'we need to talk about']
+CANDIDATES = ['thing', 'appreciation', 'unbelievable', 'hospital', 'kitchen', 'salt', 'everything', 'wonderful',
+              'yesterday', 'responsibility']
+
+
+def time_candidate_word_probs(language_model, num_repeats):
+    """
+    Returns
+    -------
+    latencies: list[float]
+        seconds per get_candidate_word_probs call
+    word_to_probs: list[dict]
+        results for each prompt
+    """
+    latencies, word_to_probs = [], []
+    for _ in range(num_repeats):
+        for prompt in PROMPTS:
+            language_model.reset_prompt_cache()  # so both paths run the prompt
+            language_model.score_cache.clear()  # so the model is timed rather than cache lookups
+            start = time.perf_counter()
+            word_to_probs.append(language_model.get_candidate_word_probs(prompt, CANDIDATES))
+            latencies.append(time.perf_counter() - start)
+    return latencies, word_to_probs
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compare batched and sequential scoring of multi-token candidates')
+    parser.add_argument('--model', default='distilgpt2', help='model shortcut name or local dir')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    _language_model = GPT2(model_name=args.model, score_cache_size=0)
+    _results = {}
+    for _batch in [False, True]:
+        _language_model.batch_multi_token_words = _batch
+        _results[_batch] = time_candidate_word_probs(_language_model, args.repeats)
+        print('{:<10} mean {:.1f}ms  p95 {:.1f}ms'.format('batched' if _batch else 'sequential',
+                                                          1000 * np.mean(_results[_batch][0]),
+                                                          1000 * np.percentile(_results[_batch][0], 95)))
+
+    _max_relative_diff = max(abs(batched[word] - sequential[word]) / sequential[word]
+                             for sequential, batched in zip(_results[False][1], _results[True][1])
+                             for word in sequential)
+    print('max relative difference in word probs: {:.2e}'.format(_max_relative_diff))
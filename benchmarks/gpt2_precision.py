@@ -0,0 +1,48 @@
+import argparse
+import os
+
+import numpy as np
+
+from definition import ROOT_DIR
+from benchmarks.gpt2_batching import CANDIDATES, time_candidate_word_probs
+from nuvox.services.gpt2 import GPT2, PRECISIONS
+
+
+def compare_word_probs(reference_word_to_probs, word_to_probs):
+    """
+    Returns
+    -------
+    max_abs_diff: float
+        largest absolute difference between normalized word probs
+    top_1_agreement: float
+        fraction of prompts where the most likely candidate is the same
+    """
+    max_abs_diff, num_agree = 0.0, 0
+    for reference, other in zip(reference_word_to_probs, word_to_probs):
+        reference, other = [np.array([word_to_prob[word] for word in CANDIDATES]) for word_to_prob in (reference, other)]
+        reference, other = reference / reference.sum(), other / other.sum()
+        max_abs_diff = max(max_abs_diff, float(np.abs(reference - other).max()))
+        num_agree += int(reference.argmax() == other.argmax())
+    return max_abs_diff, num_agree / len(reference_word_to_probs)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compare the accuracy and latency of GPT2 at each precision')
+    parser.add_argument('--model', default='distilgpt2', help='model shortcut name or local dir')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--cache-dir', default=os.path.join(ROOT_DIR, 'model_cache'))
+    args = parser.parse_args()
+
+    _results = {}
+    for _precision in PRECISIONS:
+        _language_model = GPT2(model_name=args.model, precision=_precision, cache_dir=args.cache_dir,
+                               score_cache_size=0)
+        _results[_precision] = time_candidate_word_probs(_language_model, args.repeats)
+        del _language_model
+
+    for _precision, (_latencies, _word_to_probs) in _results.items():
+        _max_abs_diff, _top_1_agreement = compare_word_probs(_results['float32'][1], _word_to_probs)
+        print('{:<8} mean {:>7.1f}ms  p95 {:>7.1f}ms  max abs prob diff {:.2e}  top-1 agreement {:.0%}'.format(
+            _precision, 1000 * np.mean(_latencies), 1000 * np.percentile(_latencies, 95), _max_abs_diff,
+            _top_1_agreement))
@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from definition import ROOT_DIR
+from benchmarks.synthetic_swypes import generate_swypes, load_words
+from nuvox.config.config import Config
+from nuvox.keyboard import Keyboard
+from nuvox.services.predictive_text import PredictiveText
+from nuvox.swype import Swype
+from nuvox.utils.io import read_json_file, write_json_file
+
+BASELINE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'baseline.json')  # machine specific so not committed
+WORD_LENGTH_BUCKETS = [(1, 3), (4, 6), (7, 9), (10, None)]
+TRACE_LENGTH_BUCKETS = [(1, 34), (35, 49), (50, 69), (70, None)]
+
+
+class StubLanguageModel:
+    """ Stands in for GPT2 so that the benchmark measures the trace and ranking pipeline only"""
+
+    @staticmethod
+    def get_candidate_word_probs(prompt, candidate_words, normalize=False):
+        return {word: 1 / len(candidate_words) for word in candidate_words}
+
+
+def bucket_name(value, buckets):
+    for low, high in buckets:
+        if (value >= low) and ((high is None) or (value <= high)):
+            return '{}+'.format(low) if high is None else '{}-{}'.format(low, high)
+
+
+def summarise(latencies, peak_memories):
+    """ Returns dict of latency percentiles in ms and max peak memory in KB"""
+    latencies_ms = 1000 * np.array(latencies)
+    return {'count': len(latencies),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+            'peak_memory_kb': max(peak_memories) / 1024}
+
+
+def benchmark(func, swypes):
+    """
+    Time func(word, key_trace) for every swype and then measure its peak memory in a second pass - kept separate as
+    tracemalloc slows down the code being timed.
+
+    Returns
+    -------
+    results: dict
+        mapping from bucket name e.g. 'all', 'word_len=4-6' or 'trace_len=35-49' to summary statistics
+    """
+    latencies, peak_memories = [], []
+    for word, key_trace in swypes:
+        start = time.perf_counter()
+        func(word, key_trace)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    for word, key_trace in swypes:
+        tracemalloc.reset_peak()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        func(word, key_trace)
+        peak_memories.append(tracemalloc.get_traced_memory()[1] - baseline_memory)
+    tracemalloc.stop()
+
+    bucket_to_indices = {'all': list(range(len(swypes)))}
+    for idx, (word, key_trace) in enumerate(swypes):
+        bucket_to_indices.setdefault('word_len={}'.format(bucket_name(len(word), WORD_LENGTH_BUCKETS)), []).append(idx)
+        bucket_to_indices.setdefault('trace_len={}'.format(bucket_name(len(key_trace), TRACE_LENGTH_BUCKETS)), []).append(idx)
+
+    return {bucket: summarise([latencies[i] for i in indices], [peak_memories[i] for i in indices])
+            for bucket, indices in sorted(bucket_to_indices.items())}
+
+
+def run_benchmarks(config, num_swypes=500, seed=0):
+    """
+    Returns
+    -------
+    results: dict
+        mapping from component name to the bucketed results of benchmark
+    """
+    keyboard = Keyboard(key_list=config.KEY_LIST)
+    words = load_words(os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'clean_word_list.txt'), keyboard)
+    max_count = int(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
+    swypes = generate_swypes(words, keyboard, num_swypes, max_count=max_count, seed=seed)
+
+    predictive_text = PredictiveText(config=config, language_model=StubLanguageModel())
+    trace_algorithm = predictive_text.trace_algorithm
+    trace_algorithm.get_possible_word_to_trace_prob(['1', '2'])  # exclude one-off set up e.g. building the vocab trie
+
+    def decode_trace(word, key_trace):
+        trace_algorithm.get_possible_word_to_trace_prob(predictive_text.remove_blacklisted_keys(key_trace))
+
+    def predict_next_word(word, key_trace):
+        predictive_text.predict_next_word(prompt='', swype=Swype(key_trace=list(key_trace)))
+
+    return {'trace_algorithm': benchmark(decode_trace, swypes),
+            'predict_next_word': benchmark(predict_next_word, swypes)}
+
+
+def find_regressions(results, baseline, threshold, min_count=20):
+    """
+    Compare p95 latency of every bucket with the baseline
+    Returns
+    -------
+    regressions: list[str]
+        description of each bucket whose p95 latency exceeds the baseline by more than threshold (a fraction)
+    """
+    regressions = []
+    for component, bucket_to_summary in results.items():
+        for bucket, summary in bucket_to_summary.items():
+            baseline_summary = baseline.get(component, {}).get(bucket)
+            if (baseline_summary is None) or (summary['count'] < min_count):
+                continue
+            if summary['p95_ms'] > baseline_summary['p95_ms'] * (1 + threshold):
+                regressions.append('{} {}: p95 {:.2f}ms vs baseline {:.2f}ms'.format(
+                    component, bucket, summary['p95_ms'], baseline_summary['p95_ms']))
+    return regressions
+
+
+def print_results(results):
+    for component, bucket_to_summary in results.items():
+        print(component)
+        for bucket, summary in bucket_to_summary.items():
+            print('    {:<18} n={:<5} p50={:>8.2f}ms  p95={:>8.2f}ms  p99={:>8.2f}ms  peak={:>9.1f}KB'.format(
+                bucket, summary['count'], summary['p50_ms'], summary['p95_ms'], summary['p99_ms'],
+                summary['peak_memory_kb']))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the trace algorithm and predictive text pipeline')
+    parser.add_argument('--num-swypes', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--decoder', default=Config.TRACE_DECODER, help='trace decoder to benchmark')
+    parser.add_argument('--cache-size', type=int, default=0, help='trace cache size - disabled by default')
+    parser.add_argument('--cache-bucket-width', type=int, default=Config.TRACE_CACHE_BUCKET_WIDTH,
+                        help='run counts are bucketed by this many samples in the trace cache signature')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail if p95 latency exceeds the baseline by more than this fraction')
+    args = parser.parse_args()
+
+    _config = Config()
+    _config.TRACE_DECODER = args.decoder
+    _config.TRACE_CACHE_SIZE = args.cache_size
+    _config.TRACE_CACHE_BUCKET_WIDTH = args.cache_bucket_width
+
+    _results = run_benchmarks(_config, num_swypes=args.num_swypes, seed=args.seed)
+    print_results(_results)
+
+    if args.save_baseline:
+        write_json_file(args.baseline, _results)
+        print('saved baseline to {}'.format(args.baseline))
+    elif os.path.exists(args.baseline):
+        _regressions = find_regressions(_results, read_json_file(args.baseline), args.threshold)
+        for _regression in _regressions:
+            print('REGRESSION - {}'.format(_regression))
+        sys.exit(1 if _regressions else 0)
+    else:
+        print('no baseline found at {} - run with --save-baseline to create one'.format(args.baseline))
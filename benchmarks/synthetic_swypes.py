@@ -0,0 +1,68 @@
+import random
+
+from nuvox.utils.swype import get_discrete_representation_for_word
+
+
+def load_words(word_list_path, keyboard):
+    """ Returns all words in the word list that can be typed on the keyboard"""
+    with open(word_list_path, 'r', encoding='utf-8') as word_list_file:
+        words = [line.strip() for line in word_list_file]
+    return [word for word in words if word and all(char in keyboard.char_to_key for char in word)]
+
+
+def generate_key_trace(discrete_repr, max_count, rng, stray_keys=(), stray_key_prob=0.15, jitter_prob=0.2):
+    """
+    Generate a realistic key trace for a discrete repr e.g. '3246' -->
+    ['3', '3', '3', '3', '2', '2', '3', '4', '4', '4', '5', '6', '6', '6', '6']
+    The start and end keys are dwelled on for max_count intervals, intermediate keys for a random number of intervals,
+    stray keys are randomly passed over between intended keys and jitter occasionally flicks back to the previous key.
+    Parameters
+    ----------
+    discrete_repr: str
+    max_count: int
+        int(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
+    rng: random.Random
+    stray_keys: list[str], optional
+        keys that may be passed over unintentionally
+    stray_key_prob: float, optional
+        probability of passing over a stray key between consecutive intended keys
+    jitter_prob: float, optional
+        probability of flicking back to the previous key for a single interval after moving to a new key
+
+    Returns
+    -------
+    key_trace: list[str]
+    """
+    key_trace = [discrete_repr[0]] * max_count
+    if len(discrete_repr) == 1:
+        return key_trace
+
+    for idx, key_id in enumerate(discrete_repr[1:], start=1):
+        if stray_keys and (rng.random() < stray_key_prob):
+            key_trace += [rng.choice(stray_keys)] * rng.randint(1, 2)
+
+        is_end_key = idx == len(discrete_repr) - 1
+        count = max_count if is_end_key else rng.randint(1, max(1, max_count // 2))
+        key_trace += [key_id] * count
+
+        if (not is_end_key) and (rng.random() < jitter_prob):
+            key_trace += [discrete_repr[idx - 1], key_id]
+
+    return key_trace
+
+
+def generate_swypes(words, keyboard, num_swypes, max_count, seed=0, **trace_kwargs):
+    """
+    Returns
+    -------
+    swypes: list[tuple]
+        list of (word, key_trace) tuples for randomly chosen words
+    """
+    rng = random.Random(seed)
+    stray_keys = [key.key_id for key in keyboard.keys if key.key_id.isdigit()]
+    swypes = []
+    for word in rng.choices(words, k=num_swypes):
+        discrete_repr = get_discrete_representation_for_word(keyboard, word)
+        key_trace = generate_key_trace(discrete_repr, max_count, rng, stray_keys=stray_keys, **trace_kwargs)
+        swypes.append((word, key_trace))
+    return swypes
@@ -21,22 +21,44 @@ class Config:
 
     # swype settings
     REQ_DWELL_TIME = 0.7  # seconds required to start/stop a swype
+    DWELL_GRACE_PERIOD = REQ_DWELL_TIME / 4  # secs the gaze can be lost or off the keys before the dwell restarts
     GAZE_INTERVAL = 0.05  # seconds between consecutive sampling of the gaze position
+    GAZE_TICK_CATCH_UP = False  # run gaze callbacks missed while the UI was busy back to back rather than skip them
+    KEY_TRACE_MAX_RUNS = 256  # key runs kept by the controller between swypes - older runs are dropped, none during one
+    GAZE_BUFFER_SIZE = 256  # gaze samples buffered between the sampler thread and the UI - older samples are dropped
 
     # control settings
     CONTROL_WITH_EYES = True
     TIME_BEFORE_SWITCH_TO_MOUSE = 5  # secs without gaze data before asking to switch to mouse
-    INTERVALS_BEFORE_SWITCH_TO_MOUSE = TIME_BEFORE_SWITCH_TO_MOUSE / GAZE_INTERVAL
 
     # predictive text
-    VOCAB_PATH = os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'clean_vocab_discrete_repr_to_word.pkl')
+    VOCAB_PATH = os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'clean_vocab.idx')  # or the original clean_vocab_discrete_repr_to_word.pkl
     MAX_SUGGESTIONS = 5  # maximum words passed to the language model for consideration
+    LANGUAGE_MODEL = 'gpt2'  # 'gpt2' or 'ngram' - see nuvox.services.language_model.create_language_model
+    NGRAM_MODEL_PATH = os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'ngram_model.npz')  # see nuvox.services.ngram
+    LANGUAGE_MODEL_MAX_PROMPT_TOKENS = 32  # only the most recent prompt tokens are fed to the language model
+    LANGUAGE_MODEL_SCORE_CACHE_SIZE = 4096  # number of (prompt context, word) scores cached by GPT2 - 0 to disable
+    GPT2_PRECISION = 'float32'  # 'float32', 'float16' or 'int8' - reduced precisions run a TFLite conversion of GPT2
+    GPT2_CACHE_DIR = os.path.join(ROOT_DIR, 'model_cache')  # where TFLite conversions of GPT2 are cached
+    TRACE_DECODER = 'beam'  # 'beam', 'exhaustive' or 'vectorized' - see nuvox.services.trace_algorithm.TraceAlgorithm
+    TRACE_BEAM_WIDTH = 128  # number of partial sub-sequences kept at each step of the beam search
+    TRACE_PROB_FLOOR = 0.0  # sub-sequences below this joint prob are dropped by the vectorized decoder
+    TRACE_CACHE_SIZE = 512  # number of decoded swypes memoized on their run-length signature
+    TRACE_CACHE_BUCKET_WIDTH = 2  # run counts in the cache signature are bucketed by this many samples - 1 for exact
+    TRACE_MODEL = 'key_trace'  # 'key_trace' (TraceAlgorithm) or 'gaze_template' (TemplateDecoder on raw gaze)
+    TEMPLATE_NUM_POINTS = 32  # number of points gaze paths and templates are resampled to
+    TEMPLATE_SIGMA = 0.05  # std of gaussian mapping mean template distance (relative to window) to probability
+    TEMPLATE_TOP_K = 50  # maximum number of templates returned per swype
+    PREDICTION_WORKER_MAX_RESTARTS = 5  # restarts of a prediction worker that keeps failing to start before giving up
+    PREDICTION_WORKER_RESTART_BACKOFF = 0.5  # secs before the 2nd restart in a row - doubled for each restart after
     PRED_FLASH_DURATION = 0.2  # num secs that predicted word is flashed on key
     KEYS_TO_IGNORE = ['5', ',', '.', '?', 'display', 'suggestion_1', 'suggestion_2', 'suggestion_3',
                       'speak', 'delete', 'clear', 'exit']
 
     # eye gaze server
     GAZE_SERVER_HOST = 'http://localhost:3070'
+    START_GAZE_SERVER = True  # False if a gaze server is already running e.g. nuvox.services.gaze_replay_server
+    GAZE_STREAMING = False  # stream samples from the server if it supports it - otherwise it is polled
     EXE_PATH = os.path.join(ROOT_DIR, 'eye_gaze_server', 'Eye_Gaze_Server.exe')
 
     # key settings
@@ -1,14 +1,20 @@
 import copy
+import logging
+import math
+import time
 import tkinter as tk
 
 from nuvox.keyboard import Keyboard
 from nuvox.views.main_view import View
-from nuvox.services.predictive_text import PredictiveText
+from nuvox.services.prediction_worker import PredictionWorker
 from nuvox.services.text_to_speech import TextToSpeech
-from nuvox.services.eye_gaze_server import EyeGazeServer, NoGazeDataReturned
+from nuvox.services.eye_gaze_server import EyeGazeServer
 from nuvox.analytics.session import Session
 from nuvox.swype import Swype
 from nuvox.analytics.diagnostic_functions import plot_swype_probabilities
+from nuvox.utils.key_trace import RunLengthKeyTrace
+
+logger = logging.getLogger('main_app')
 
 class Controller:
 
@@ -20,6 +26,7 @@ class Controller:
         config: nuvox.config.Config
         """
         self.config = config
+        start = time.perf_counter()
 
         # Build Keyboard
         self.keyboard = Keyboard(key_list=config.KEY_LIST)
@@ -30,8 +37,10 @@ class Controller:
         self.view.periodic_callback = self.periodic_callback
         self.view.create_widgets(keyboard=self.keyboard)
 
-        # Initialise services
-        self.predictive_text = PredictiveText(config=config)
+        # Initialise services - predictive text runs in its own process so inference never blocks the Tk loop
+        self.prediction_worker = PredictionWorker(config=config)
+        self.pending_prediction_key_id = None  # end key of the swype whose prediction is awaited
+        self.prediction_worker_failure_reported = False
         self.text_to_speech = TextToSpeech()
         self.eye_gaze_server = EyeGazeServer(host=config.GAZE_SERVER_HOST,
                                              exe_path=config.EXE_PATH)
@@ -39,12 +48,15 @@ class Controller:
 
         # Swype
         self.swype_in_progress = False
-        self.required_iterations_in_focus = int(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
-        self.key_trace = []
+        self.key_trace = RunLengthKeyTrace(max_runs=config.KEY_TRACE_MAX_RUNS)
+        self.dwell_start_time = None  # timestamp of the sample the current dwell started on
+        self.gaze_lost_time = None  # timestamp of the first sample off the keys since the gaze was last on one
+        self.gaze_trace = []  # (relx, rely) recorded alongside each key in key_trace during a swype
         self.current_text = ''
         self.suggestions = []  # list of all current suggestions
         self.suggestion_indices = []  # list of current indices being shown
-        self.consecutive_intervals_with_no_gaze = 0  # used to automatically detect when to switch to mouse
+        self.no_gaze_since = None  # timestamp of the first sample without gaze data - used to offer the mouse
+        self.offer_switch_to_mouse = True  # False once the user has declined to switch
 
         # Mapping form key_id to action functions
         self.key_id_to_action_function = {'speak': self.on_speak_key,
@@ -57,57 +69,105 @@ class Controller:
                                           'suggestion_left_arrow': lambda: self.on_suggestion_left_arrow(),
                                           'suggestion_right_arrow': lambda: self.on_suggestion_right_arrow()
                                           }
+        logger.info('controller initialised in {:.2f}s'.format(time.perf_counter() - start))
 
     @property
-    def key_in_focus_just_changed(self):
-        return (len(self.key_trace) >= 2) and (self.key_trace[-1] != self.key_trace[-2])
+    def dwell_time(self):
+        """ Seconds the key in focus has been dwelt on - measured from sample timestamps rather than counted in samples
+        so it is independent of the sample rate and of how late the periodic callback runs"""
+        if self.dwell_start_time is None:
+            return 0.0
+        return self.key_trace.last_time - self.dwell_start_time
 
     @property
     def key_in_focus_for_required_time(self):
-        req_iters = self.required_iterations_in_focus
-        return (len(self.key_trace) >= req_iters) and (len(set(self.key_trace[-req_iters:])) == 1)
+        return self.dwell_time >= self.config.REQ_DWELL_TIME
 
     def run_app(self):
         if self.config.CONTROL_WITH_EYES:
-            self.eye_gaze_server.start_server()
+            if self.config.START_GAZE_SERVER:
+                self.eye_gaze_server.start_server()
+            self.eye_gaze_server.start_sampler(interval=self.config.GAZE_INTERVAL,
+                                               buffer_size=self.config.GAZE_BUFFER_SIZE,
+                                               streaming=self.config.GAZE_STREAMING)
         self.view.start_loop()
 
     def periodic_callback(self):
         """
-        Called every interval - gets eye gaze coords and adds to key list
+        Called every interval - processes the gaze samples recorded since the last call (or the mouse position)
         """
-        try:
-            relx, rely = self.get_gaze_relative_to_window()
-            self.consecutive_intervals_with_no_gaze = 0
-
-            key_in_focus = self.keyboard.get_key_at_point(x=relx, y=rely)
-            if key_in_focus:
-                self.key_trace.append(key_in_focus.key_id)
-
-                if self.key_in_focus_just_changed:
-                    self.on_key_in_focus_changing()
-                else:
-                    self.view.increment_widget_colour(key_id=key_in_focus.key_id)
-                    if self.key_in_focus_for_required_time:
-                        self.on_key_in_focus_for_required_time(key_in_focus)
-
-        except NoGazeDataReturned:
-            self.consecutive_intervals_with_no_gaze += 1
-            if self.consecutive_intervals_with_no_gaze > self.config.INTERVALS_BEFORE_SWITCH_TO_MOUSE:
-                switch_to_mouse = self.view.open_yes_no_popup(message='Failed to detect eye gaze - switch to mouse control?')
-                if switch_to_mouse:
-                    self.config.CONTROL_WITH_EYES = False
-                else:
-                    self.consecutive_intervals_with_no_gaze = -100000
-
-            self.on_gaze_leaving_window()
+        self.poll_prediction_worker()
+        if self.config.CONTROL_WITH_EYES:
+            for timestamp, x, y in self.eye_gaze_server.sampler.drain():
+                self.on_gaze_sample(x, y, timestamp)
+                if not self.config.CONTROL_WITH_EYES:
+                    break  # switched to the mouse - the rest of the samples are stale
+        else:
+            self.on_gaze_sample(*self.get_mouse_position_relative_to_screen(), timestamp=time.perf_counter())
+
+    def on_gaze_sample(self, x, y, timestamp):
+        """
+        Adds key in focus to key list
+        Parameters
+        ----------
+        x: float
+            gaze coords relative to the screen - nan if no gaze data was returned
+        y: float
+        timestamp: float
+            time.perf_counter when the sample was taken
+        """
+        if math.isnan(x) or math.isnan(y):
+            self.on_no_gaze_data(timestamp)
+            return
+
+        relx, rely = self.screen_to_window_coords(x, y)
+        self.no_gaze_since = None
+
+        key_in_focus = self.keyboard.get_key_at_point(x=relx, y=rely)
+        if key_in_focus:
+            if self.gaze_lost_time is not None:
+                self.on_gaze_returning(timestamp)
+            key_in_focus_changed = self.key_trace.push(key_in_focus.key_id, timestamp)
+            if self.swype_in_progress:
+                self.gaze_trace.append((relx, rely))
+                self.prediction_worker.update_swype(key_in_focus.key_id)
+            else:
+                self.gaze_trace = [(relx, rely)]  # only the latest point is needed to start a swype
+
+            if key_in_focus_changed or (self.dwell_start_time is None):
+                self.dwell_start_time = timestamp
+                self.on_key_in_focus_changing()
+            else:
+                self.view.show_dwell_progress(key_id=key_in_focus.key_id,
+                                              progress=self.dwell_time / self.config.REQ_DWELL_TIME)
+                if self.key_in_focus_for_required_time:
+                    self.on_key_in_focus_for_required_time(key_in_focus)
+        else:
+            self.on_gaze_leaving_window(timestamp)
+
+    def on_no_gaze_data(self, timestamp):
+        if self.no_gaze_since is None:
+            self.no_gaze_since = timestamp
+        if self.offer_switch_to_mouse and (timestamp - self.no_gaze_since > self.config.TIME_BEFORE_SWITCH_TO_MOUSE):
+            switch_to_mouse = self.view.open_yes_no_popup(message='Failed to detect eye gaze - switch to mouse control?')
+            if switch_to_mouse:
+                self.config.CONTROL_WITH_EYES = False
+                self.no_gaze_since = None
+                self.eye_gaze_server.stop_sampler()
+            else:
+                self.offer_switch_to_mouse = False
+
+        self.on_gaze_leaving_window(timestamp)
 
     def on_key_in_focus_changing(self):
-        prev_key_id, new_key_id = self.key_trace[-2:]
-        self.view.reset_widget_colour(key_id=prev_key_id)
-        self.view.increment_widget_colour(key_id=new_key_id)
+        if self.key_trace.previous_key is not None:
+            self.view.reset_widget_colour(key_id=self.key_trace.previous_key)
+        self.view.show_dwell_progress(key_id=self.key_trace.current_key, progress=0.0)
 
     def on_key_in_focus_for_required_time(self, key_in_focus):
+        if (not self.swype_in_progress) and self.prediction_worker.has_pending_request:
+            return  # the next swype is predicted from text including the pending word - it starts once that arrives
+        self.dwell_start_time = self.key_trace.last_time  # next dwell is timed from here
 
         if self.swype_in_progress:
             self.on_swype_end(key_in_focus)
@@ -119,16 +179,46 @@ class Controller:
         if key_action_function:
             key_action_function()
             self.key_trace.clear()
+            self.gaze_trace.clear()
+            self.dwell_start_time = None
         else:
-            self.key_trace = self.key_trace[-1:]
+            self.key_trace.keep_last_sample()
+            self.key_trace.set_max_runs(None)  # every run of the swype is needed to decode it
+            self.gaze_trace = self.gaze_trace[-1:]
+            self.prediction_worker.start_swype(key_trace=self.key_trace.to_list(), prompt=self.current_text)
             self.view.change_widget_colour(key_id=key_in_focus.key_id, rgb=self.config.START_KEY_COLOUR)
             self.swype_in_progress = True
 
     def on_swype_end(self, key_in_focus):
-        current_key_trace = copy.copy(self.key_trace)  # as it will change whilst processing
-        swype = Swype(key_trace=current_key_trace)
+        swype = Swype(key_trace=self.key_trace.to_list(), key_runs=self.key_trace.get_runs(),
+                      gaze_trace=copy.copy(self.gaze_trace))
         self.swype_in_progress = False
-        ranked_suggestions = self.predictive_text.predict_next_word(prompt=self.current_text, swype=swype)
+        self.prediction_worker.submit(prompt=self.current_text, swype=swype)  # result is handled in on_prediction
+        self.pending_prediction_key_id = key_in_focus.key_id
+        self.view.reset_widget_colour(key_id=key_in_focus.key_id)
+        self.key_trace.clear()
+        self.key_trace.set_max_runs(self.config.KEY_TRACE_MAX_RUNS)
+        self.gaze_trace.clear()
+        self.dwell_start_time = None
+
+    def poll_prediction_worker(self):
+        result = self.prediction_worker.poll()
+        if result is not None:
+            ranked_suggestions, swype = result
+            self.on_prediction(ranked_suggestions, swype)
+        elif self.prediction_worker.has_failed and (not self.prediction_worker_failure_reported):
+            self.prediction_worker_failure_reported = True
+            self.view.open_error_popup(message='Predictive text failed to start - {}'.format(
+                self.prediction_worker.startup_error))
+
+    def on_prediction(self, ranked_suggestions, swype):
+        """
+        Parameters
+        ----------
+        ranked_suggestions: list[str]
+        swype: nuvox.swype.Swype
+            swype returned by the prediction worker with its probability dicts filled in
+        """
         if ranked_suggestions:
             swype.ranked_suggestions = ranked_suggestions
             swype.accepted_word = ranked_suggestions[0]
@@ -140,13 +230,22 @@ class Controller:
             self.update_display_text(' '.join([self.current_text, ranked_suggestions[0]]))
             self.update_suggestions(suggestions=ranked_suggestions[1:],
                                     suggestion_indices=list(range(min(3, len(ranked_suggestions[1:])))))
-            self.view.flash_pred_word(key_id=key_in_focus.key_id, word=ranked_suggestions[0])
-        self.view.reset_widget_colour(key_id=key_in_focus.key_id)
-        self.key_trace.clear()
-
-    def on_gaze_leaving_window(self):
-        if self.key_trace:
-            self.view.reset_widget_colour(key_id=self.key_trace[-1])
+            self.view.flash_pred_word(key_id=self.pending_prediction_key_id, word=ranked_suggestions[0])
+
+    def on_gaze_leaving_window(self, timestamp):
+        """ The gaze is off the keys or lost - the dwell only ends once this has lasted longer than DWELL_GRACE_PERIOD so
+        that a dropped sample or a glance across a gap between keys doesn't restart it"""
+        if self.gaze_lost_time is None:
+            self.gaze_lost_time = timestamp
+        if (self.dwell_start_time is not None) and (timestamp - self.gaze_lost_time > self.config.DWELL_GRACE_PERIOD):
+            self.dwell_start_time = None
+            if self.key_trace:
+                self.view.reset_widget_colour(key_id=self.key_trace.current_key)
+
+    def on_gaze_returning(self, timestamp):
+        if self.dwell_start_time is not None:
+            self.dwell_start_time += timestamp - self.gaze_lost_time  # time spent away doesn't count towards the dwell
+        self.gaze_lost_time = None
 
     def on_speak_key(self):
         self.text_to_speech.speak_text(text=self.current_text)
@@ -155,6 +254,8 @@ class Controller:
         answered_yes = self.view.open_yes_no_popup(message='Are you sure you want to exit?')
         if answered_yes:
             self.session.save()  # save analytics data
+            self.prediction_worker.close()
+            self.eye_gaze_server.stop_sampler()
             self.view.toplevel.destroy()
             try:
                 self.eye_gaze_server.process.kill()
@@ -174,6 +275,9 @@ class Controller:
     def update_display_text(self, text):
         if text and (text[-1] in self.config.FIXED_KEY_ID_TO_PUNCTUATION.values()):
             text = ''.join([text[:-2], text[-1]])  # filter space before punc e.g. 'hello .' --> 'hello.'
+        if text != self.current_text:
+            self.prediction_worker.cancel_speculation()  # prompt that was prepared at the start of the swype is stale
+            self.prediction_worker.discard_pending()  # so is the prediction of a swype that ended before the change
         self.current_text = text
         self.view.update_display_text(new_text=text)
 
@@ -208,14 +312,9 @@ class Controller:
             if widget:
                 widget.configure(text=suggestions[suggestion_idx])
 
-    def get_gaze_relative_to_window(self):
+    def screen_to_window_coords(self, x, y):
+        """ Convert coords relative to the screen to coords relative to the toplevel window"""
         top_level = self.view.toplevel
-        if self.config.CONTROL_WITH_EYES:
-            x, y = self.eye_gaze_server.get_gaze_relative_to_screen()
-        else:
-            x, y = self.get_mouse_position_relative_to_screen()
-
-        # get coords relative to toplevel window
         relx = (x * top_level.winfo_screenwidth() - top_level.winfo_x()) / top_level.winfo_width()
         rely = (y * top_level.winfo_height() - top_level.winfo_y()) / top_level.winfo_height()
         return relx, rely
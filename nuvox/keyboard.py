@@ -1,4 +1,6 @@
-import itertools
+import bisect
+
+import numpy as np
 
 
 class Keyboard:
@@ -12,6 +14,15 @@ class Keyboard:
         """
         self.key_id_to_key = {}
         self.char_to_key = {}
+
+        # spatial index - the sorted unique key edges split the window into a grid of cells that each lie within at
+        # most one key. _grid holds the index into _indexed_keys of the key covering each cell, or len(_indexed_keys)
+        # if no key does, with a border of empty cells so points outside the edges need no bounds checks
+        self._indexed_keys = []
+        self._x_edges = []
+        self._y_edges = []
+        self._grid = None
+        self._grid_rows = []  # _grid as nested lists for fast scalar lookups
         self._build_keyboard(key_list)
 
     @property
@@ -28,7 +39,29 @@ class Keyboard:
         for key in key_list:
             for char in key.contents:
                 self.char_to_key[char] = key
-        self._check_for_overlaps()
+        self._build_spatial_index()
+
+    def _build_spatial_index(self):
+        """
+        Fill the grid with the cells covered by each key - Raises ValueError if any keys overlap, which they do if and
+        only if they cover a common cell.
+        """
+        self._indexed_keys = self.keys
+        self._x_edges = sorted({edge for key in self._indexed_keys for edge in (key.x1, key.x2)})
+        self._y_edges = sorted({edge for key in self._indexed_keys for edge in (key.y1, key.y2)})
+        no_key = len(self._indexed_keys)
+        grid = np.full((len(self._y_edges) + 1, len(self._x_edges) + 1), no_key, dtype=np.int64)
+        for key_idx, key in enumerate(self._indexed_keys):
+            # cells are offset by one for the border
+            first_row, last_row = bisect.bisect_left(self._y_edges, key.y1), bisect.bisect_left(self._y_edges, key.y2)
+            first_col, last_col = bisect.bisect_left(self._x_edges, key.x1), bisect.bisect_left(self._x_edges, key.x2)
+            cells = grid[first_row + 1: last_row + 1, first_col + 1: last_col + 1]
+            covered = cells[cells != no_key]
+            if covered.size:
+                raise ValueError('Keys: {} and {} overlap'.format(self._indexed_keys[covered[0]].key_id, key.key_id))
+            cells[:] = key_idx
+        self._grid = grid
+        self._grid_rows = grid.tolist()
 
     def get_key_at_point(self, x, y):
         """
@@ -41,17 +74,36 @@ class Keyboard:
         Returns
         -------
         key: nuvox.key.Key
-            returns None if no key at point
+            returns None if no key at point - points on the shared edge of two keys return the key that comes first
+            in the key list
         """
-        return next((key for key in self.keys if key.contains_point(x, y)), None)
+        # a point on an edge touches the cells on both sides of it
+        col_right, col_left = bisect.bisect_right(self._x_edges, x), bisect.bisect_left(self._x_edges, x)
+        row_right, row_left = bisect.bisect_right(self._y_edges, y), bisect.bisect_left(self._y_edges, y)
+        upper_row, lower_row = self._grid_rows[row_left], self._grid_rows[row_right]
+        key_idx = min(upper_row[col_left], upper_row[col_right], lower_row[col_left], lower_row[col_right])
+        return self._indexed_keys[key_idx] if key_idx < len(self._indexed_keys) else None
 
-    def _check_for_overlaps(self):
+    def get_keys_at_points(self, xs, ys):
         """
-        Check if any of the keys overlap with each other - Raises ValueError if they do.
+        Vectorized get_key_at_point e.g. for replaying recorded gaze
+        Parameters
+        ----------
+        xs: np.ndarray
+        ys: np.ndarray
+
+        Returns
+        -------
+        keys: list[nuvox.key.Key]
+            key at each point - None where there is no key
         """
-        for key_a, key_b in itertools.combinations(self.keys, 2):
-            if key_a.intersects(key_b):
-                raise ValueError('Keys: {} and {} overlap'.format(key_a.key_id, key_b.key_id))
+        xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        col_right, col_left = np.searchsorted(self._x_edges, xs, side='right'), np.searchsorted(self._x_edges, xs)
+        row_right, row_left = np.searchsorted(self._y_edges, ys, side='right'), np.searchsorted(self._y_edges, ys)
+        key_indices = np.minimum.reduce([self._grid[row_left, col_left], self._grid[row_left, col_right],
+                                         self._grid[row_right, col_left], self._grid[row_right, col_right]])
+        return [self._indexed_keys[key_idx] if key_idx < len(self._indexed_keys) else None
+                for key_idx in key_indices.tolist()]
 
 
 if __name__ == '__main__':
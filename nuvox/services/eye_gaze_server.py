@@ -1,7 +1,17 @@
-import ast
 import ctypes
-import requests
+import json
+import logging
+import math
 import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from nuvox.utils.ring_buffer import RingBuffer
+
+logger = logging.getLogger('main_app')
 
 
 class NoGazeDataReturned(Exception):
@@ -25,8 +35,13 @@ class EyeGazeServer:
         self.host = host
         self.exe_path = exe_path
         self.process = None
+        self.session = requests.Session()  # keeps the connection to the server alive between samples
+        self.sampler = None
 
     def start_server(self):
+        if sys.platform != 'win32':
+            raise OSError('The eye gaze server is a Windows executable - on other platforms run a stand-in server '
+                          'with python -m nuvox.services.gaze_replay_server and set START_GAZE_SERVER = False')
         if not ctypes.windll.shell32.IsUserAnAdmin():
             raise OSError('You must run python with administrator rights to start the eye server')
         self.process = subprocess.Popen(self.exe_path)
@@ -44,14 +59,112 @@ class EyeGazeServer:
         ------
         NoGazeDataReturned: if no gaze data is returned
         """
-        response = requests.get(url=self.host)
-        coords_string = response.content.decode('utf-8')
+        response = self.session.get(url=self.host)
+        return parse_gaze_response(response.content)
+
+    def start_sampler(self, interval, buffer_size=256, streaming=False):
+        """
+        Start sampling the gaze in a background thread
+        Parameters
+        ----------
+        interval: float
+            seconds between samples when polling
+        buffer_size: int, optional
+        streaming: bool, optional
+            whether to stream samples from the server with nuvox.services.gaze_stream.GazeStreamSampler, which falls
+            back to polling if the server can't stream, rather than polling with GazeSampler
+
+        Returns
+        -------
+        sampler: GazeSampler or nuvox.services.gaze_stream.GazeStreamSampler
+        """
+        self.stop_sampler()
+        if streaming:
+            from nuvox.services.gaze_stream import GazeStreamSampler
+            self.sampler = GazeStreamSampler(self.host, poll_interval=interval, buffer_size=buffer_size)
+        else:
+            self.sampler = GazeSampler(self, interval=interval, buffer_size=buffer_size)
+        self.sampler.start()
+        return self.sampler
+
+    def stop_sampler(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+
+class GazeSampler(threading.Thread):
+
+    def __init__(self, eye_gaze_server, interval, buffer_size=256):
+        """
+        Background thread that samples the gaze every interval seconds, independently of the UI, and pushes
+        (timestamp, relx, rely) rows into a ring buffer for the UI thread to drain. Timestamps are from
+        time.perf_counter and samples without gaze data have nan coords.
+        Parameters
+        ----------
+        eye_gaze_server: EyeGazeServer
+        interval: float
+            seconds between samples
+        buffer_size: int, optional
+            number of samples buffered - older samples are dropped if the UI thread falls this far behind
+        """
+        super().__init__(name='gaze_sampler', daemon=True)
+        self.eye_gaze_server = eye_gaze_server
+        self.interval = interval
+        self.buffer = RingBuffer(capacity=buffer_size, width=3)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        next_sample_time = time.perf_counter()
+        while not self._stop_event.is_set():
+            timestamp = time.perf_counter()
+            try:
+                relx, rely = self.eye_gaze_server.get_gaze_relative_to_screen()
+            except (NoGazeDataReturned, requests.RequestException, ValueError, KeyError):
+                relx = rely = math.nan
+            self.buffer.push((timestamp, relx, rely))
+
+            # sample times are fixed multiples of interval so they don't drift - missed samples are skipped
+            next_sample_time += self.interval
+            now = time.perf_counter()
+            if next_sample_time < now:
+                next_sample_time += self.interval * math.ceil((now - next_sample_time) / self.interval)
+            self._stop_event.wait(next_sample_time - now)
+
+    def stop(self, timeout=1):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def drain(self):
+        """
+        Returns
+        -------
+        samples: np.ndarray
+            shape (num_samples, 3) of (timestamp, relx, rely) sampled since the last drain, oldest first
+        """
+        return self.buffer.drain()
+
 
-        if coords_string == 'null':
-            raise NoGazeDataReturned
+def parse_gaze_response(content):
+    """
+    Parameters
+    ----------
+    content: bytes
+        body of the gaze server response e.g. b'{"X": 100, "Y": 200, "ViewportWidth": 1920, "ViewportHeight": 1080}'
 
-        coords_dict = ast.literal_eval(coords_string)
-        relx = coords_dict['X'] / coords_dict['ViewportWidth']
-        rely = coords_dict['Y'] / coords_dict['ViewportHeight']
-        return relx, rely
+    Returns
+    -------
+    relx: float
+    rely: float
 
+    Raises
+    ------
+    NoGazeDataReturned: if the response is null
+    """
+    coords_dict = json.loads(content)
+    if coords_dict is None:
+        raise NoGazeDataReturned
+    relx = coords_dict['X'] / coords_dict['ViewportWidth']
+    rely = coords_dict['Y'] / coords_dict['ViewportHeight']
+    return relx, rely
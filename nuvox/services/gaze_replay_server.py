@@ -0,0 +1,182 @@
+import asyncio
+import itertools
+import json
+import random
+
+VIEWPORT_WIDTH = 1920
+VIEWPORT_HEIGHT = 1080
+
+
+class GazeReplayServer:
+
+    def __init__(self, samples, rate_hz=60, host='localhost', port=3070, streaming=True):
+        """
+        Pure-Python stand-in for the Windows eye gaze server that replays recorded or synthetic gaze.
+        Speaks the same protocol as the real server - GET / returns the latest sample as JSON - and also streams every
+        sample as newline-delimited JSON from GET /stream.
+        Parameters
+        ----------
+        samples: iterable[dict]
+            gaze samples in the format of the real server e.g. {'X': 960, 'Y': 540, 'ViewportWidth': 1920,
+            'ViewportHeight': 1080} or None for no gaze data - lists are replayed in a loop
+        rate_hz: float, optional
+            samples per second
+        host: str, optional
+        port: int, optional
+            0 picks a free port - see port after start
+        streaming: bool, optional
+            whether to serve /stream - turn off to test clients falling back to polling
+        """
+        self.samples = samples
+        self.rate_hz = rate_hz
+        self.host = host
+        self.port = port
+        self.streaming = streaming
+        self.current_sample = None
+        self.num_samples_sent = 0
+        self._subscribers = set()
+        self._connection_tasks = set()
+        self._server = None
+        self._ticker = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ticker = asyncio.ensure_future(self._tick())
+
+    async def stop(self):
+        self._server.close()
+        tasks = [self._ticker] + list(self._connection_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _tick(self):
+        """ Advance the current sample at rate_hz on a drift-free schedule and send it to every stream"""
+        loop = asyncio.get_event_loop()
+        period = 1 / self.rate_hz
+        next_time = loop.time()
+        samples = itertools.cycle(self.samples) if isinstance(self.samples, (list, tuple)) else self.samples
+        for sample in samples:
+            self.current_sample = sample
+            line = (json.dumps(sample) + '\n').encode('utf-8')
+            for queue in self._subscribers:
+                if queue.full():
+                    queue.get_nowait()  # slow client - drop its oldest sample
+                queue.put_nowait(line)
+
+            next_time += period
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+    async def _handle_connection(self, reader, writer):
+        self._connection_tasks.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass  # headers are not needed
+
+                path = request_line.split()[1].decode('utf-8') if len(request_line.split()) > 1 else '/'
+                if (path == '/stream') and self.streaming:
+                    await self._stream(writer)
+                    break
+                elif path == '/':
+                    _write_response(writer, 200, json.dumps(self.current_sample).encode('utf-8'))
+                    self.num_samples_sent += 1
+                else:
+                    _write_response(writer, 404, b'')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # client went away or server is stopping
+        finally:
+            self._connection_tasks.discard(asyncio.current_task())
+            writer.close()
+
+    async def _stream(self, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n')
+        queue = asyncio.Queue(maxsize=1000)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                writer.write(await queue.get())
+                self.num_samples_sent += 1
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+
+
+def _write_response(writer, status, body):
+    reason = {200: 'OK', 404: 'Not Found'}[status]
+    writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+        status, reason, len(body)).encode('utf-8') + body)
+
+
+def generate_synthetic_gaze(rate_hz, seed=0, min_fixation_secs=0.2, max_fixation_secs=1.0, noise=8.0,
+                            missing_prob=0.01):
+    """
+    Endless synthetic gaze - fixations at random points with gaussian jitter joined by instantaneous saccades and
+    the occasional missing sample
+    Parameters
+    ----------
+    rate_hz: float
+        samples per second - used to convert fixation durations into a number of samples
+    seed: int, optional
+    min_fixation_secs: float, optional
+    max_fixation_secs: float, optional
+    noise: float, optional
+        std of the jitter in pixels
+    missing_prob: float, optional
+        probability of each sample being None
+
+    Yields
+    ------
+    sample: dict
+    """
+    rng = random.Random(seed)
+    while True:
+        x, y = rng.uniform(0, VIEWPORT_WIDTH), rng.uniform(0, VIEWPORT_HEIGHT)
+        for _ in range(max(1, int(rng.uniform(min_fixation_secs, max_fixation_secs) * rate_hz))):
+            if rng.random() < missing_prob:
+                yield None
+            else:
+                yield {'X': min(max(rng.gauss(x, noise), 0), VIEWPORT_WIDTH),
+                       'Y': min(max(rng.gauss(y, noise), 0), VIEWPORT_HEIGHT),
+                       'ViewportWidth': VIEWPORT_WIDTH,
+                       'ViewportHeight': VIEWPORT_HEIGHT}
+
+
+def load_recorded_gaze(path):
+    """ Load samples from a file with one server response per line i.e. JSON or null"""
+    with open(path, 'r', encoding='utf-8') as recording_file:
+        return [json.loads(line) for line in recording_file if line.strip()]
+
+
+if __name__ == '__main__':
+    import argparse
+    from urllib.parse import urlsplit
+    from nuvox.config.config import Config
+
+    _default_address = urlsplit(Config.GAZE_SERVER_HOST)
+    parser = argparse.ArgumentParser(description='Serve recorded or synthetic gaze in place of the eye gaze server')
+    parser.add_argument('--recording', default=None, help='file with one JSON gaze sample (or null) per line')
+    parser.add_argument('--rate', type=float, default=60, help='samples per second e.g. 30 to 250')
+    parser.add_argument('--host', default=_default_address.hostname)
+    parser.add_argument('--port', type=int, default=_default_address.port)
+    parser.add_argument('--no-streaming', action='store_true', help='only serve polling requests')
+    args = parser.parse_args()
+
+    _samples = load_recorded_gaze(args.recording) if args.recording else generate_synthetic_gaze(args.rate)
+    _server = GazeReplayServer(_samples, rate_hz=args.rate, host=args.host, port=args.port,
+                               streaming=not args.no_streaming)
+    print('serving gaze at {}Hz on http://{}:{}'.format(args.rate, args.host, args.port))
+    asyncio.run(_server.serve_forever())
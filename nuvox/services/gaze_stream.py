@@ -0,0 +1,193 @@
+import asyncio
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+from nuvox.services.eye_gaze_server import NoGazeDataReturned, parse_gaze_response
+from nuvox.utils.ring_buffer import RingBuffer
+
+
+class GazeStreamClient:
+
+    def __init__(self, host, poll_interval=0.05, stream_path='/stream', timeout=2.0):
+        """
+        Asyncio gaze client - consumes the newline-delimited JSON samples from stream_path over one persistent
+        connection if the server supports it (see GazeReplayServer), otherwise falls back to polling the server
+        every poll_interval seconds, reusing the connection when the server allows it.
+        Parameters
+        ----------
+        host: str
+            url of the gaze server e.g. 'http://localhost:3070'
+        poll_interval: float, optional
+            seconds between requests when polling
+        stream_path: str, optional
+        timeout: float, optional
+            seconds to wait for the server to connect or for any read before giving up
+        """
+        address = urlsplit(host)
+        self.hostname = address.hostname
+        self.port = address.port or 80
+        self.poll_interval = poll_interval
+        self.stream_path = stream_path
+        self.timeout = timeout
+        self.mode = None  # 'stream' or 'poll' once connected
+
+    async def iter_samples(self):
+        """
+        Yields
+        ------
+        sample: tuple
+            (timestamp, relx, rely) where timestamp is time.perf_counter when the sample was received and the coords
+            are nan if the server returned no gaze data
+        """
+        reader, writer = await self._connect()
+        try:
+            status, headers = await self._request(reader, writer, self.stream_path)
+            if (status == 200) and ('ndjson' in headers.get('content-type', '')):
+                self.mode = 'stream'
+                while True:
+                    line = await self._read(reader.readline())
+                    if not line:
+                        return  # server closed the stream
+                    yield _to_sample(line)
+
+            await self._read_body(reader, headers)
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+                reader, writer = await self._connect()
+
+            self.mode = 'poll'
+            loop = asyncio.get_event_loop()
+            next_time = loop.time()
+            while True:
+                status, headers = await self._request(reader, writer, '/')
+                body = await self._read_body(reader, headers)
+                yield _to_sample(body) if status == 200 else (time.perf_counter(), math.nan, math.nan)
+                if headers.get('connection', '').lower() == 'close':
+                    writer.close()
+                    reader, writer = await self._connect()
+
+                next_time += self.poll_interval
+                await asyncio.sleep(max(0.0, next_time - loop.time()))
+        finally:
+            writer.close()
+
+    async def _connect(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.hostname, self.port), self.timeout)
+
+    async def _read(self, read):
+        """ Await a read from the server, raising asyncio.TimeoutError if it takes longer than timeout"""
+        return await asyncio.wait_for(read, self.timeout)
+
+    async def _request(self, reader, writer, path):
+        """ Send a GET request and returns (status code, dict of lower case headers)"""
+        writer.write('GET {} HTTP/1.1\r\nHost: {}:{}\r\nConnection: keep-alive\r\n\r\n'.format(
+            path, self.hostname, self.port).encode('utf-8'))
+        await writer.drain()
+
+        status_line = await self._read(reader.readline())
+        if not status_line:
+            raise ConnectionError('gaze server closed the connection')
+        headers = {}
+        while True:
+            line = (await self._read(reader.readline())).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return int(status_line.split()[1]), headers
+
+    async def _read_body(self, reader, headers):
+        """ Read the body of a response - raises ValueError if the server gives no way to tell where it ends"""
+        if 'content-length' in headers:
+            return await self._read(reader.readexactly(int(headers['content-length'])))
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            return await self._read_chunked_body(reader)
+        if headers.get('connection', '').lower() == 'close':
+            return await self._read(reader.read())  # body ends when the server closes the connection
+        raise ValueError('gaze server response has no content-length and the connection is kept alive')
+
+    async def _read_chunked_body(self, reader):
+        body = b''
+        while True:
+            size_line = await self._read(reader.readline())
+            if not size_line:
+                raise ConnectionError('gaze server closed the connection')
+            size = int(size_line.split(b';')[0], 16)  # ignore chunk extensions
+            if size == 0:
+                break
+            body += (await self._read(reader.readexactly(size + 2)))[:-2]  # chunk is followed by CRLF
+        while (await self._read(reader.readline())).strip():
+            pass  # skip trailers up to the blank line that ends the body
+        return body
+
+
+class GazeStreamSampler(threading.Thread):
+
+    def __init__(self, host, poll_interval=0.05, buffer_size=256, retry_interval=1.0):
+        """
+        Runs a GazeStreamClient in a background thread and pushes (timestamp, relx, rely) rows into a ring buffer for
+        the UI thread to drain - same interface as nuvox.services.eye_gaze_server.GazeSampler.
+        If the connection fails a nan sample is pushed and the client reconnects after retry_interval seconds.
+        Parameters
+        ----------
+        host: str
+        poll_interval: float, optional
+            seconds between requests if the server can't stream
+        buffer_size: int, optional
+            number of samples buffered - older samples are dropped if the UI thread falls this far behind
+        retry_interval: float, optional
+        """
+        super().__init__(name='gaze_stream_sampler', daemon=True)
+        self.client = GazeStreamClient(host, poll_interval=poll_interval)
+        self.retry_interval = retry_interval
+        self.buffer = RingBuffer(capacity=buffer_size, width=3)
+        self._loop = None
+        self._task = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._task = self._loop.create_task(self._consume())
+            if not self._stop_event.is_set():
+                self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    async def _consume(self):
+        while not self._stop_event.is_set():
+            try:
+                async for sample in self.client.iter_samples():
+                    self.buffer.push(sample)
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                pass
+            self.buffer.push((time.perf_counter(), math.nan, math.nan))
+            await asyncio.sleep(self.retry_interval)
+
+    def stop(self, timeout=1):
+        self._stop_event.set()
+        if (self._loop is not None) and (self._task is not None) and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # loop closed in the meantime
+        if self.is_alive():
+            self.join(timeout)
+
+    def drain(self):
+        """ See nuvox.services.eye_gaze_server.GazeSampler.drain"""
+        return self.buffer.drain()
+
+
+def _to_sample(content):
+    timestamp = time.perf_counter()
+    try:
+        relx, rely = parse_gaze_response(content)
+    except (NoGazeDataReturned, ValueError, KeyError, TypeError):
+        relx = rely = math.nan
+    return timestamp, relx, rely
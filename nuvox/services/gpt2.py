@@ -1,24 +1,74 @@
 import itertools
+import os
+import re
+import threading
 
 import numpy as np
 
-from tensorflow.keras.layers import Softmax
+import tensorflow as tf
 
 from transformers import (TFGPT2LMHeadModel, GPT2Tokenizer)
 
-from nuvox.utils.common import normalize_word_to_prob_dict
+from nuvox.services.language_model import LanguageModel
+from nuvox.utils.lru_cache import LRUCache
 
+PRECISIONS = ('float32', 'float16', 'int8')
 
-class GPT2:
 
-    def __init__(self, model_name='distilgpt2'):
-        """ Wrapper class for the hugging face GPT2 model"""
+class GPT2(LanguageModel):
+
+    def __init__(self, model_name='distilgpt2', batch_multi_token_words=True, max_seq_len=32, precision='float32',
+                 cache_dir=None, max_word_tokens=8, score_cache_size=4096, score_cache_context_tokens=None):
+        """
+        Wrapper class for the hugging face GPT2 model
+        Parameters
+        ----------
+        model_name: str, optional
+            see _initialise_model_and_tokenizer
+        batch_multi_token_words: bool, optional
+            whether to score all candidates that tokenize to more than one token in a single batched model call
+            rather than one call per candidate
+        max_seq_len: int, optional
+            maximum number of prompt tokens fed to the model - see window_prompt_tokens
+        precision: str, optional
+            'float32' runs the keras model. 'float16' or 'int8' run a TFLite conversion of the model with float16 or
+            dynamically quantized int8 weights - see _load_tflite_model
+        cache_dir: str, optional
+            directory that TFLite conversions are cached in - required unless precision is 'float32'
+        max_word_tokens: int, optional
+            tokens of a word scored by the TFLite model - any further tokens are ignored
+        score_cache_size: int, optional
+            number of (context, word) log probs kept in score_cache - 0 disables the cache
+        score_cache_context_tokens: int, optional
+            number of most recent prompt tokens that the cache is keyed on - defaults to max_seq_len which means cached
+            scores are exact
+        """
+        if precision not in PRECISIONS:
+            raise ValueError('precision must be one of {} - got {}'.format(PRECISIONS, precision))
+        if (precision != 'float32') and (cache_dir is None):
+            raise ValueError('cache_dir is required for {} precision'.format(precision))
+
         self.model_name = model_name
+        self.batch_multi_token_words = batch_multi_token_words
+        self.max_seq_len = max_seq_len
+        self.precision = precision
+        self.cache_dir = cache_dir
+        self.max_word_tokens = max_word_tokens
         self.keras_model = None
+        self.tflite_interpreter = None
         self.tokenizer = None
-        self._initialise_model_and_tokenizer()
 
-        self.max_seq_len = 16
+        # log probs of previously scored words keyed by (last score_cache_context_tokens prompt tokens, word)
+        self.score_cache = LRUCache(score_cache_size)
+        self.score_cache_context_tokens = score_cache_context_tokens or max_seq_len
+
+        # state of the last prompt that was run through the model - see _run_prompt
+        self._lock = threading.Lock()  # prompts may be prepared in a background thread - see prepare_prompt
+        self._cached_prompt_tokens = []
+        self._cached_next_token_logits = None
+        self._cached_past = None
+
+        self._initialise_model_and_tokenizer()
 
     def _initialise_model_and_tokenizer(self):
         """
@@ -32,53 +82,362 @@ class GPT2:
         self.tokenizer = GPT2Tokenizer.from_pretrained(pretrained_model_name_or_path=self.model_name)
         self.tokenizer.pad_token = '[PAD]'
         self.tokenizer.decoder[self.tokenizer.pad_token_id] = self.tokenizer.pad_token
-        self.keras_model = TFGPT2LMHeadModel.from_pretrained(self.model_name)
+        self._sentence_end_token_ids = set(self.tokenizer.convert_tokens_to_ids(['.', '?', '!']))
+        if self.precision == 'float32':
+            self.keras_model = TFGPT2LMHeadModel.from_pretrained(self.model_name)
+        else:
+            self._load_tflite_model()
         self.get_candidate_word_probs('.', ['warming', 'up'])  # because first prediction is always slow
 
-    def get_candidate_word_probs(self, prompt, candidate_words, normalize=False):
+    @property
+    def tflite_seq_len(self):
+        return self.max_seq_len + self.max_word_tokens
+
+    def get_tflite_model_path(self):
+        model_name = re.sub(r'[^\w.-]', '_', os.path.normpath(self.model_name)).strip('_')
+        return os.path.join(self.cache_dir, '{}_{}_{}.tflite'.format(model_name, self.precision, self.tflite_seq_len))
+
+    def _load_tflite_model(self):
         """
-        Returns a dict mapping each of the potential_words to the probability that it's the next word in the
-        current_sentence
+        Load the TFLite conversion of the model, converting it on first use.
+        The graph takes input ids of shape (batch_size, tflite_seq_len) and returns the logits for every position. It
+        has no past state so the keras model is only loaded to convert it and is then freed.
+        """
+        tflite_model_path = self.get_tflite_model_path()
+        if not os.path.exists(tflite_model_path):
+            keras_model = TFGPT2LMHeadModel.from_pretrained(self.model_name)
+
+            @tf.function(input_signature=[tf.TensorSpec([None, self.tflite_seq_len], tf.int32)])
+            def get_logits(input_ids):
+                return keras_model(input_ids)[0]
+
+            converter = tf.lite.TFLiteConverter.from_concrete_functions([get_logits.get_concrete_function()])
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]  # int8 weights with float activations
+            if self.precision == 'float16':
+                converter.target_spec.supported_types = [tf.float16]
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tflite_model_path, 'wb') as tflite_file:
+                tflite_file.write(converter.convert())
+
+        self.tflite_interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
+        self.tflite_interpreter.allocate_tensors()
+
+    def get_candidate_word_log_probs(self, prompt, candidate_words):
+        """
+        See LanguageModel - the log probs of the tokens of a word are summed so long words don't underflow.
+        Words that have been scored in the same context are looked up in score_cache and the rest are scored together.
+        """
+        with self._lock:
+            prompt_tokens = self._encode_prompt(prompt)
+            context = tuple(prompt_tokens[-self.score_cache_context_tokens:])
+
+            word_to_log_prob = {}
+            for word in candidate_words:
+                log_prob = self.score_cache.get((context, word))
+                if log_prob is not None:
+                    word_to_log_prob[word] = log_prob
 
+            missed_words = [word for word in dict.fromkeys(candidate_words) if word not in word_to_log_prob]
+            if missed_words:
+                for word, log_prob in self._score_words(prompt_tokens, missed_words).items():
+                    self.score_cache.put((context, word), log_prob)
+                    word_to_log_prob[word] = log_prob
+
+        return {word: word_to_log_prob[word] for word in candidate_words}  # keep order of candidate_words
+
+    def prepare_prompt(self, prompt, is_stale=None):
+        """
+        Run the prompt through the model ahead of get_candidate_word_probs so that the next-token logits and past are
+        cached and only the candidates are left to score - safe to call from a background thread.
+        The forward pass runs outside the lock so a speculation that has gone stale never holds up scoring, and the
+        result is only swapped into the cache if is_stale still returns False once it finishes.
+        """
+        if self.keras_model is None:  # the TFLite model has no past so there's nothing to precompute
+            return
+        prompt_tokens = self._encode_prompt(prompt)
+        with self._lock:
+            cache = (self._cached_prompt_tokens, self._cached_next_token_logits, self._cached_past)
+        if (is_stale is not None) and is_stale():
+            return
+        next_token_logits, past = self._forward_prompt(prompt_tokens, *cache)
+        if (is_stale is not None) and is_stale():
+            return
+        with self._lock:
+            self._cached_prompt_tokens = list(prompt_tokens)
+            self._cached_next_token_logits = next_token_logits
+            self._cached_past = past
+
+    def _encode_prompt(self, prompt):
+        if not prompt:
+            prompt = '.'  # model cannot predict on empty string
+        return self.window_prompt_tokens(self.tokenizer.encode(prompt))
+
+    def _score_words(self, prompt_tokens, words):
+        """
         Parameters
         ----------
-        prompt: str
-        candidate_words: list[str]
-        normalize: bool, optional
-            whether to normalize the probabilities so that they sum to 1
+        prompt_tokens: list[int]
+            windowed prompt tokens
+        words: list[str]
 
         Returns
         -------
-        word_to_prob: dict
-            dict mapping each of the potential words to it's predicted probability given the prompt
+        word_to_log_prob: dict
         """
-        word_to_prob = {}
-        softmax = Softmax()
+        potential_word_tokens = [self.tokenizer.encode(word) for word in words]
+        if self.tflite_interpreter is not None:
+            return dict(zip(words, self._get_word_log_probs_tflite(prompt_tokens, potential_word_tokens)))
 
-        potential_word_tokens = [self.tokenizer.encode(word) for word in candidate_words]
+        next_token_logits, past = self._run_prompt(prompt_tokens)
 
-        if not prompt:
-            prompt = '.'  # model cannot predict on empty string
-
-        prompt_tokens = self.tokenizer.encode(prompt)
-        initial_pred, past = self.keras_model(np.array(prompt_tokens), past=None)
-        softmax_vector = softmax(initial_pred[..., -1, :]).numpy()  # gives probabilities for next token
+        word_to_log_prob = {}
+        single_token_words = [(word, word_tokens[0]) for word, word_tokens in zip(words, potential_word_tokens)
+                              if len(word_tokens) == 1]
+        if single_token_words:
+            single_words, tokens = zip(*single_token_words)
+            log_probs = gather_log_probs(next_token_logits, np.array(tokens, dtype=np.int32)).numpy()
+            word_to_log_prob.update(zip(single_words, log_probs.astype(float).tolist()))
 
-        for word, word_tokens in zip(candidate_words, potential_word_tokens):
-            if len(word_tokens) == 1:
-                word_to_prob[word] = softmax_vector[word_tokens[0]]
+        multi_token_words = [(word, word_tokens) for word, word_tokens in zip(words, potential_word_tokens)
+                             if len(word_tokens) > 1]
+        if multi_token_words:
+            multi_words, words_tokens = zip(*multi_token_words)
+            if self.batch_multi_token_words:
+                log_probs = self._get_multi_token_word_log_probs_batched(words_tokens, past)
             else:
-                joint_prob = 1
-                pred, _ = self.keras_model(np.array(word_tokens), past=past)
-                for idx, token in enumerate(word_tokens):
-                    token_softmax = softmax(pred[..., idx, :]).numpy()
-                    joint_prob *= token_softmax[token]
-                word_to_prob[word] = joint_prob
+                log_probs = self._get_multi_token_word_log_probs_sequential(words_tokens, past)
+            word_to_log_prob.update(zip(multi_words, log_probs))
+
+        return word_to_log_prob
+
+    def window_prompt_tokens(self, prompt_tokens):
+        """
+        Keep at most max_seq_len of the most recent prompt tokens so that latency is bounded however long the text is.
+        The window starts after the first sentence end within the last max_seq_len tokens if there is one. Otherwise
+        its start is rounded up to a multiple of max_seq_len // 2. Either way the start of the window only moves every
+        few words as the text grows, so the cached past of the previous prompt can usually be reused.
+        Parameters
+        ----------
+        prompt_tokens: list[int]
+
+        Returns
+        -------
+        windowed_tokens: list[int]
+        """
+        if len(prompt_tokens) <= self.max_seq_len:
+            return prompt_tokens
+
+        start = len(prompt_tokens) - self.max_seq_len
+        sentence_start = next((idx + 1 for idx in range(start, len(prompt_tokens) - 1)
+                               if prompt_tokens[idx] in self._sentence_end_token_ids), None)
+        if sentence_start is None:
+            step = max(1, self.max_seq_len // 2)
+            sentence_start = -(-start // step) * step  # round up to multiple of step
+        return prompt_tokens[sentence_start:]
+
+    def _get_multi_token_word_log_probs_sequential(self, words_tokens, past):
+        """
+        One model call per word
+        Parameters
+        ----------
+        words_tokens: list[list[int]]
+            tokens for each word
+        past: list[tf.Tensor]
+            past state for the prompt
+
+        Returns
+        -------
+        log_probs: list[float]
+            joint log probability of the tokens of each word
+        """
+        log_probs = []
+        for word_tokens in words_tokens:
+            word_tokens = np.array(word_tokens, dtype=np.int32)
+            pred, _ = self.keras_model(word_tokens[np.newaxis], past=past)  # pred is (1, seq, vocab)
+            token_log_probs = gather_log_probs(pred[0], word_tokens, batch_dims=1)
+            log_probs.append(float(tf.reduce_sum(tf.cast(token_log_probs, tf.float64))))
+        return log_probs
+
+    def _get_multi_token_word_log_probs_batched(self, words_tokens, past):
+        """
+        Same as _get_multi_token_word_log_probs_sequential but all words are right-padded into a single batch and scored
+        in one model call, with the prompt past broadcast across the batch and padding masked out.
+        """
+        batch_size = len(words_tokens)
+        max_len = max(len(word_tokens) for word_tokens in words_tokens)
+        past_len = int(past[0].shape[3])
+
+        input_ids = np.zeros((batch_size, max_len), dtype=np.int32)
+        token_mask = np.zeros((batch_size, max_len), dtype=np.float64)
+        for row, word_tokens in enumerate(words_tokens):
+            input_ids[row, :len(word_tokens)] = word_tokens
+            token_mask[row, :len(word_tokens)] = 1
+        attention_mask = np.concatenate([np.ones((batch_size, past_len)), token_mask], axis=1).astype(np.float32)
+
+        # each layer past is (batch, 2, heads, seq, head_dim) so the batch is tiled along axis 0
+        batched_past = [tf.tile(layer_past, [batch_size, 1, 1, 1, 1]) for layer_past in past]
+        pred, _ = self.keras_model(input_ids, past=batched_past, attention_mask=attention_mask)
+
+        token_log_probs = tf.cast(gather_log_probs(pred, input_ids, batch_dims=2), tf.float64)
+        return [float(log_prob) for log_prob in tf.reduce_sum(token_log_probs * token_mask, axis=1).numpy()]
+
+    def _get_word_log_probs_tflite(self, prompt_tokens, words_tokens):
+        """
+        Score every candidate with one call to the fixed-length TFLite model. Each row holds the prompt followed by the
+        tokens of one multi-token word and is right padded - GPT-2 is causal so the padding does not change the logits
+        of earlier positions and the prompt logits can be read from any row.
+        Parameters
+        ----------
+        prompt_tokens: list[int]
+            at most max_seq_len tokens
+        words_tokens: list[list[int]]
+            tokens for each candidate word
+
+        Returns
+        -------
+        log_probs: list[float]
+        """
+        multi_token_idxs = [idx for idx, word_tokens in enumerate(words_tokens) if len(word_tokens) > 1]
+        rows = [words_tokens[idx][:self.max_word_tokens] for idx in multi_token_idxs] or [[]]
+        num_prompt_tokens = len(prompt_tokens)
+
+        input_ids = np.zeros((len(rows), self.tflite_seq_len), dtype=np.int32)
+        token_mask = np.zeros((len(rows), self.max_word_tokens), dtype=np.float64)
+        input_ids[:, :num_prompt_tokens] = prompt_tokens
+        for row, word_tokens in enumerate(rows):
+            input_ids[row, num_prompt_tokens: num_prompt_tokens + len(word_tokens)] = word_tokens
+            token_mask[row, :len(word_tokens)] = 1
+        logits = self._run_tflite_model(input_ids)
+
+        log_probs = [0.0] * len(words_tokens)
+        single_token_idxs = [idx for idx, word_tokens in enumerate(words_tokens) if len(word_tokens) == 1]
+        if single_token_idxs:
+            tokens = np.array([words_tokens[idx][0] for idx in single_token_idxs], dtype=np.int32)
+            next_token_log_probs = gather_log_probs(logits[0, num_prompt_tokens - 1], tokens).numpy()
+            for idx, log_prob in zip(single_token_idxs, next_token_log_probs):
+                log_probs[idx] = float(log_prob)
+
+        if multi_token_idxs:
+            # same positions as the past based paths i.e. the logits after word token idx are used for word token idx
+            word_logits = logits[:, num_prompt_tokens: num_prompt_tokens + self.max_word_tokens]
+            word_ids = input_ids[:, num_prompt_tokens: num_prompt_tokens + self.max_word_tokens]
+            token_log_probs = tf.cast(gather_log_probs(word_logits, word_ids, batch_dims=2), tf.float64)
+            word_log_probs = tf.reduce_sum(token_log_probs * token_mask, axis=1).numpy()
+            for idx, log_prob in zip(multi_token_idxs, word_log_probs):
+                log_probs[idx] = float(log_prob)
+
+        return log_probs
+
+    def _run_tflite_model(self, input_ids):
+        """ Returns the logits for every position of input_ids - shape (batch_size, tflite_seq_len, vocab_size)"""
+        input_details = self.tflite_interpreter.get_input_details()[0]
+        if tuple(input_details['shape']) != input_ids.shape:
+            self.tflite_interpreter.resize_tensor_input(input_details['index'], input_ids.shape)
+            self.tflite_interpreter.allocate_tensors()
+        self.tflite_interpreter.set_tensor(input_details['index'], input_ids)
+        self.tflite_interpreter.invoke()
+        return self.tflite_interpreter.get_tensor(self.tflite_interpreter.get_output_details()[0]['index'])
+
+    def _run_prompt(self, prompt_tokens):
+        """
+        Run the prompt through the model reusing the past state of the previous prompt and cache the result - the caller
+        must hold the lock
+        Parameters
+        ----------
+        prompt_tokens: list[int]
+
+        Returns
+        -------
+        next_token_logits: tf.Tensor
+            logits for the token following the prompt
+        past: list[tf.Tensor]
+            past state for the whole prompt
+        """
+        next_token_logits, past = self._forward_prompt(
+            prompt_tokens, self._cached_prompt_tokens, self._cached_next_token_logits, self._cached_past)
+        self._cached_prompt_tokens = list(prompt_tokens)
+        self._cached_next_token_logits = next_token_logits
+        self._cached_past = past
+        return next_token_logits, past
+
+    def _forward_prompt(self, prompt_tokens, cached_prompt_tokens, cached_next_token_logits, cached_past):
+        """
+        Run the prompt through the model reusing the past state of a previous prompt without touching the cache.
+        The prompt usually only grows by a word between swypes so only the tokens after the longest common prefix with
+        the previous prompt are fed to the model. If text has been deleted the past is rolled back to the common prefix.
+        Parameters
+        ----------
+        prompt_tokens: list[int]
+        cached_prompt_tokens: list[int]
+        cached_next_token_logits: tf.Tensor
+        cached_past: list[tf.Tensor]
+
+        Returns
+        -------
+        next_token_logits: tf.Tensor
+        past: list[tf.Tensor]
+        """
+        num_common = 0
+        for cached_token, token in zip(cached_prompt_tokens, prompt_tokens):
+            if cached_token != token:
+                break
+            num_common += 1
+
+        if num_common == len(prompt_tokens) == len(cached_prompt_tokens):
+            return cached_next_token_logits, cached_past
+
+        # at least one token must be fed to get the logits for the last position
+        num_reused = min(num_common, len(prompt_tokens) - 1)
+        past = truncate_past(cached_past, num_reused) if num_reused else None
+        pred, past = self.keras_model(np.array(prompt_tokens[num_reused:]), past=past)
+        return pred[..., -1, :], past
+
+    def reset_prompt_cache(self):
+        with self._lock:
+            self._cached_prompt_tokens = []
+            self._cached_next_token_logits = None
+            self._cached_past = None
+
+
+def gather_log_probs(logits, token_ids, batch_dims=0):
+    """
+    Log softmax of logits evaluated only at token_ids - one logsumexp per position rather than a softmax over the
+    whole vocab
+    Parameters
+    ----------
+    logits: tf.Tensor
+        shape (..., vocab_size)
+    token_ids: np.ndarray
+        with batch_dims=0 any number of token ids to look up in 1D logits, otherwise shape logits.shape[:-1]
+    batch_dims: int, optional
+        number of leading dims shared by logits and token_ids
+
+    Returns
+    -------
+    log_probs: tf.Tensor
+        same shape as token_ids
+    """
+    log_normalizer = tf.reduce_logsumexp(logits, axis=-1)
+    if batch_dims:
+        return tf.gather(logits, token_ids, batch_dims=batch_dims) - log_normalizer
+    return tf.gather(logits, token_ids) - log_normalizer
+
 
-        if normalize:
-            word_to_prob = normalize_word_to_prob_dict(word_to_prob)
+def truncate_past(past, length):
+    """
+    Roll back the past state to the first length tokens
+    Parameters
+    ----------
+    past: list[tf.Tensor]
+        one tensor per layer with shape (batch_size, 2, num_heads, seq_len, head_dim)
+    length: int
 
-        return word_to_prob
+    Returns
+    -------
+    past: list[tf.Tensor]
+    """
+    return [layer_past[:, :, :, :length, :] for layer_past in past]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+import numpy as np
+
+from nuvox.utils.common import normalize_word_to_log_prob_dict
+
+LANGUAGE_MODELS = ('gpt2', 'ngram')
+
+
+class LanguageModel:
+    """ Base class for the language models used by PredictiveText - subclasses implement get_candidate_word_log_probs"""
+
+    def get_candidate_word_log_probs(self, prompt, candidate_words):
+        """
+        Parameters
+        ----------
+        prompt: str
+        candidate_words: list[str]
+
+        Returns
+        -------
+        word_to_log_prob: dict
+            dict mapping each of the candidate words to its log probability given the prompt, in the same order
+        """
+        raise NotImplementedError
+
+    def prepare_prompt(self, prompt, is_stale=None):
+        """
+        Optionally do any work that only depends on the prompt ahead of get_candidate_word_probs
+        Parameters
+        ----------
+        prompt: str
+        is_stale: callable, optional
+            returns True once the prepared prompt is no longer wanted so the work can be skipped or thrown away
+        """
+        pass
+
+    def get_candidate_word_probs(self, prompt, candidate_words, normalize=False):
+        """
+        Returns a dict mapping each of the potential_words to the probability that it's the next word in the
+        current_sentence
+
+        Parameters
+        ----------
+        prompt: str
+        candidate_words: list[str]
+        normalize: bool, optional
+            whether to normalize the probabilities so that they sum to 1
+
+        Returns
+        -------
+        word_to_prob: dict
+            dict mapping each of the potential words to it's predicted probability given the prompt
+        """
+        word_to_log_prob = self.get_candidate_word_log_probs(prompt, candidate_words)
+        if normalize:
+            return normalize_word_to_log_prob_dict(word_to_log_prob)
+        return {word: float(np.exp(log_prob)) for word, log_prob in word_to_log_prob.items()}
+
+
+def create_language_model(config):
+    """
+    Create the language model selected by config.LANGUAGE_MODEL - backends are imported here so that e.g.
+    tensorflow is only loaded when GPT2 is used
+    Parameters
+    ----------
+    config: nuvox.config.config.Config
+
+    Returns
+    -------
+    language_model: LanguageModel
+    """
+    if config.LANGUAGE_MODEL == 'gpt2':
+        from nuvox.services.gpt2 import GPT2
+        return GPT2(max_seq_len=config.LANGUAGE_MODEL_MAX_PROMPT_TOKENS,
+                    precision=config.GPT2_PRECISION,
+                    cache_dir=config.GPT2_CACHE_DIR,
+                    score_cache_size=config.LANGUAGE_MODEL_SCORE_CACHE_SIZE)
+    if config.LANGUAGE_MODEL == 'ngram':
+        from nuvox.services.ngram import NGramLanguageModel
+        return NGramLanguageModel(model_path=config.NGRAM_MODEL_PATH)
+    raise ValueError('language model must be one of {} - got {}'.format(LANGUAGE_MODELS, config.LANGUAGE_MODEL))
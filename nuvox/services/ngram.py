@@ -0,0 +1,198 @@
+from collections import Counter
+import math
+import re
+
+import numpy as np
+
+from nuvox.services.language_model import LanguageModel
+from nuvox.utils.io import read_text_file
+
+UNKNOWN, SENTENCE_START, SENTENCE_END = '<unk>', '<s>', '</s>'
+UNKNOWN_ID, SENTENCE_START_ID, SENTENCE_END_ID = 0, 1, 2
+_SENTENCE_SPLIT_PATTERN = re.compile(r'[.?!]|\n\s*\n')
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+class NGramLanguageModel(LanguageModel):
+
+    def __init__(self, model_path):
+        """
+        Interpolated Kneser-Ney n-gram language model - a CPU-cheap alternative to GPT2.
+        The model file (see train_ngram_model) holds, for every order, the sorted packed word ids of each n-gram with
+        its interpolated log prob and the sorted packed contexts with their log backoff weights. Candidates are scored
+        together with one np.searchsorted per order.
+        Parameters
+        ----------
+        model_path: str
+            path to .npz file created by train_ngram_model
+        """
+        with np.load(model_path) as model_file:
+            self.order = int(model_file['order'])
+            self.bits = int(model_file['bits'])
+            self.words = model_file['words'].tolist()
+            self.keys = [model_file['keys_{}'.format(n)] for n in range(1, self.order + 1)]
+            self.log_probs = [model_file['log_probs_{}'.format(n)] for n in range(1, self.order + 1)]
+            self.context_keys = [model_file['context_keys_{}'.format(n)] for n in range(1, self.order + 1)]
+            self.context_log_backoffs = [model_file['context_log_backoffs_{}'.format(n)]
+                                         for n in range(1, self.order + 1)]
+        self.word_to_id = {word: word_id for word_id, word in enumerate(self.words)}
+        self.uniform_log_prob = -math.log(len(self.words))
+
+    def get_candidate_word_log_probs(self, prompt, candidate_words):
+        context_ids = self.get_context_ids(prompt)
+        word_ids = np.array([self.word_to_id.get(word.lower(), UNKNOWN_ID) for word in candidate_words], dtype=np.int64)
+
+        log_probs = np.zeros(len(word_ids))
+        found = np.zeros(len(word_ids), dtype=bool)
+        for n in range(self.order, 0, -1):
+            context_key = pack_ids(context_ids[len(context_ids) - n + 1:] if n > 1 else [], self.bits)
+            is_match, idxs = _search(self.keys[n - 1], (context_key << self.bits) | word_ids)
+            is_match &= ~found
+            log_probs[is_match] += self.log_probs[n - 1][idxs[is_match]]
+            found |= is_match
+            if found.all():
+                break
+
+            # unseen n-grams back off to the next order down, weighted by the context's backoff if it has been seen
+            is_context_match, context_idx = _search(self.context_keys[n - 1], np.array([context_key], dtype=np.int64))
+            if is_context_match[0]:
+                log_probs[~found] += self.context_log_backoffs[n - 1][context_idx[0]]
+
+        log_probs[~found] += self.uniform_log_prob
+        return {word: float(log_prob) for word, log_prob in zip(candidate_words, log_probs)}
+
+    def get_context_ids(self, prompt):
+        """
+        Returns
+        -------
+        context_ids: list[int]
+            ids of the last order - 1 words of the current sentence in the prompt, padded with sentence starts
+        """
+        sentences = _SENTENCE_SPLIT_PATTERN.split(prompt.lower())
+        context_words = _WORD_PATTERN.findall(sentences[-1])[-(self.order - 1):] if self.order > 1 else []
+        context_ids = [self.word_to_id.get(word, UNKNOWN_ID) for word in context_words]
+        return [SENTENCE_START_ID] * (self.order - 1 - len(context_ids)) + context_ids
+
+
+def tokenize_sentences(text):
+    """ Split text into lowercase sentences of words - sentences end at . ? ! or a blank line"""
+    sentences = (_WORD_PATTERN.findall(sentence) for sentence in _SENTENCE_SPLIT_PATTERN.split(text.lower()))
+    return [sentence for sentence in sentences if sentence]
+
+
+def pack_ids(ids, bits):
+    """ Pack a sequence of word ids into a single int - packed keys sort in the same order as the id sequences"""
+    key = 0
+    for word_id in ids:
+        key = (key << bits) | int(word_id)
+    return key
+
+
+def train_ngram_model(corpus_paths, output_path, order=3, min_count=1):
+    """
+    Train an interpolated Kneser-Ney n-gram model on text files and save it to output_path (.npz).
+    The highest order uses raw counts and lower orders use continuation counts i.e. the number of distinct words
+    that precede them. Each order has a single absolute discount estimated from its counts of counts and the
+    unigram distribution is interpolated with a uniform distribution over the vocab so every word has a probability.
+    Parameters
+    ----------
+    corpus_paths: list[str]
+        text files to train on
+    output_path: str
+    order: int, optional
+        e.g. 3 for a trigram model
+    min_count: int, optional
+        words that occur fewer times than this are mapped to <unk>
+
+    Returns
+    -------
+    num_ngrams: int
+        total number of n-grams stored across all orders
+
+    Raises
+    ------
+    ValueError
+        if the vocab is too large to pack an n-gram of the given order into 63 bits
+    """
+    sentences = [sentence for corpus_path in corpus_paths for sentence in tokenize_sentences(read_text_file(corpus_path))]
+    word_counts = Counter(word for sentence in sentences for word in sentence)
+    words = [UNKNOWN, SENTENCE_START, SENTENCE_END] + sorted(
+        word for word, count in word_counts.items() if (count >= min_count) and (word not in (UNKNOWN, SENTENCE_START, SENTENCE_END)))
+    word_to_id = {word: word_id for word_id, word in enumerate(words)}
+
+    bits = max(1, (len(words) - 1).bit_length())
+    if order * bits > 63:
+        raise ValueError('a vocab of {} words is too large for an order {} model'.format(len(words), order))
+
+    # order_counts[n - 1] maps n-gram tuples to their (continuation) count
+    order_counts = [Counter() for _ in range(order)]
+    for sentence in sentences:
+        ids = [SENTENCE_START_ID] * (order - 1) + [word_to_id.get(word, UNKNOWN_ID) for word in sentence] + [SENTENCE_END_ID]
+        for end in range(order, len(ids) + 1):
+            order_counts[-1][tuple(ids[end - order: end])] += 1
+    for n in range(order - 1, 0, -1):
+        for ngram in order_counts[n]:
+            order_counts[n - 1][ngram[1:]] += 1
+
+    arrays = {'order': np.array(order), 'bits': np.array(bits), 'words': np.array(words)}
+    ngram_to_prob = {}
+    for n, ngram_counts in enumerate(order_counts, start=1):
+        discount = estimate_discount(ngram_counts.values())
+        context_totals, context_types = Counter(), Counter()
+        for ngram, count in ngram_counts.items():
+            context_totals[ngram[:-1]] += count
+            context_types[ngram[:-1]] += 1
+        context_to_backoff = {context: discount * context_types[context] / total
+                              for context, total in context_totals.items()}
+
+        lower_order_ngram_to_prob, ngram_to_prob = ngram_to_prob, {}
+        for ngram, count in ngram_counts.items():
+            lower_order_prob = lower_order_ngram_to_prob[ngram[1:]] if n > 1 else 1 / len(words)
+            ngram_to_prob[ngram] = ((max(count - discount, 0) / context_totals[ngram[:-1]])
+                                    + context_to_backoff[ngram[:-1]] * lower_order_prob)
+
+        arrays['keys_{}'.format(n)], arrays['log_probs_{}'.format(n)] = _to_sorted_arrays(ngram_to_prob, bits)
+        arrays['context_keys_{}'.format(n)], arrays['context_log_backoffs_{}'.format(n)] = _to_sorted_arrays(
+            context_to_backoff, bits)
+
+    np.savez(output_path, **arrays)
+    return sum(len(ngram_counts) for ngram_counts in order_counts)
+
+
+def estimate_discount(counts, default=0.75):
+    """ Absolute discount n1 / (n1 + 2 * n2) where nk is the number of n-grams with count k"""
+    counts = list(counts)
+    n1, n2 = counts.count(1), counts.count(2)
+    if (n1 == 0) or (n2 == 0):
+        return default
+    return min(max(n1 / (n1 + 2 * n2), 0.1), 0.9)
+
+
+def _to_sorted_arrays(ngram_to_prob, bits):
+    """ Returns (int64 packed keys, float32 log probs) sorted by key"""
+    keys = np.array([pack_ids(ngram, bits) for ngram in ngram_to_prob], dtype=np.int64)
+    log_probs = np.log(np.array(list(ngram_to_prob.values()), dtype=np.float64)).astype(np.float32)
+    order = np.argsort(keys)
+    return keys[order], log_probs[order]
+
+
+def _search(sorted_keys, keys):
+    """ Returns (bool array of whether each key is in sorted_keys, index of each key that is)"""
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+    idxs = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[idxs] == keys, idxs
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Train an interpolated Kneser-Ney n-gram language model')
+    parser.add_argument('corpus_paths', nargs='+', help='text files to train on')
+    parser.add_argument('--output', required=True, help='path of the .npz model file - see Config.NGRAM_MODEL_PATH')
+    parser.add_argument('--order', type=int, default=3)
+    parser.add_argument('--min-count', type=int, default=1)
+    args = parser.parse_args()
+
+    _num_ngrams = train_ngram_model(args.corpus_paths, args.output, order=args.order, min_count=args.min_count)
+    print('saved {} n-grams to {}'.format(_num_ngrams, args.output))
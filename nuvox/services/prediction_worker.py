@@ -0,0 +1,201 @@
+import logging
+import multiprocessing
+import queue
+import time
+
+from nuvox.services.predictive_text import PredictiveText
+
+logger = logging.getLogger('main_app')
+
+
+class PredictionWorker:
+
+    def __init__(self, config, clock=time.monotonic):
+        """
+        Runs PredictiveText in a separate process so that inference never blocks the Tk loop.
+        Swype updates are forwarded to the worker as they happen and predictions are requested with submit and
+        collected with poll, which never blocks. Only the result of the latest request is returned - results of
+        superseded or discarded requests are dropped, so callers that need the results of consecutive requests in order
+        should wait for has_pending_request to clear before submitting the next. Requests that raise return no
+        suggestions. If the worker process dies it is restarted and the pending request resent - unless the worker
+        already died on it once, in which case the request is dropped. Restarts back off exponentially while the worker keeps dying before it has started, e.g. when the
+        model fails to load, and stop after PREDICTION_WORKER_MAX_RESTARTS so the error can be shown instead.
+        Parameters
+        ----------
+        config: nuvox.config.config.Config
+        clock: callable, optional
+            monotonic clock returning seconds - used to time restarts
+        """
+        self.config = config
+        self._context = multiprocessing.get_context('spawn')  # tensorflow is not fork safe
+        self._request_queue = None
+        self._result_queue = None
+        self._process = None
+        self._latest_request_id = 0
+        self._pending_request = None  # (request_id, prompt, swype) of the latest request until its result is polled
+        self._pending_request_resent = False
+        self.clock = clock
+        self.num_restarts = 0
+        self.num_failed_starts = 0  # restarts since the worker last started successfully
+        self.startup_error = None  # error the worker process last failed to start with
+        self._next_restart_time = None
+        self.start()
+
+    @property
+    def is_alive(self):
+        return (self._process is not None) and self._process.is_alive()
+
+    @property
+    def has_pending_request(self):
+        """ Whether a request has been submitted whose result has not been polled yet"""
+        return self._pending_request is not None
+
+    @property
+    def has_failed(self):
+        """ Whether the worker keeps dying before it starts and is no longer restarted"""
+        return (not self.is_alive) and (self.num_failed_starts >= self.config.PREDICTION_WORKER_MAX_RESTARTS)
+
+    def start(self):
+        self._request_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._process = self._context.Process(target=_run_worker,
+                                              args=(self.config, self._request_queue, self._result_queue),
+                                              name='prediction_worker',
+                                              daemon=True)
+        self._process.start()
+
+    def close(self, timeout=2):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._request_queue.put(None)
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+
+    def start_swype(self, key_trace, prompt=None):
+        self._request_queue.put(('start_swype', (list(key_trace), prompt)))
+
+    def update_swype(self, key_id):
+        self._request_queue.put(('update_swype', (key_id,)))
+
+    def cancel_speculation(self):
+        self._request_queue.put(('cancel_speculation', ()))
+
+    def submit(self, prompt, swype):
+        """
+        Request a prediction - see PredictiveText.predict_next_word
+        Parameters
+        ----------
+        prompt: str
+        swype: nuvox.swype.Swype
+
+        Returns
+        -------
+        request_id: int
+            id of the request - any earlier request that has not been polled yet is superseded
+        """
+        self._latest_request_id += 1
+        self._pending_request = (self._latest_request_id, prompt, swype)
+        self._pending_request_resent = False
+        self._request_queue.put(('predict', self._pending_request))
+        return self._latest_request_id
+
+    def discard_pending(self):
+        """ Drop the pending request e.g. when the text it was predicted from has changed - its result is never returned"""
+        self._latest_request_id += 1  # any result still in flight no longer matches the latest request
+        self._pending_request = None
+        self._pending_request_resent = False
+
+    def poll(self):
+        """
+        Non-blocking check for the result of the latest request
+
+        Returns
+        -------
+        result: tuple
+            (ranked_suggestions, swype) where swype has its probability dicts filled in by the worker - None if the
+            result is not ready yet
+        """
+        result = None
+        while True:
+            try:
+                request_id, ranked_suggestions, swype = self._result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request_id is None:  # startup message - ranked_suggestions holds the startup error if there was one
+                self._on_startup(error=ranked_suggestions)
+            elif request_id == self._latest_request_id:
+                result = (ranked_suggestions, swype)
+                self._pending_request = None
+
+        if (result is None) and (not self.is_alive) and (not self.has_failed):
+            self._restart_when_due()
+        return result
+
+    def _on_startup(self, error):
+        if error is None:
+            self.num_failed_starts = 0
+            self.startup_error = None
+        else:
+            logger.error('prediction worker failed to start: {}'.format(error))
+            self.startup_error = error
+
+    def _restart_when_due(self):
+        """ Restart straight away after the first death then back off exponentially while the worker fails to start"""
+        now = self.clock()
+        if self._next_restart_time is None:
+            backoff = self.config.PREDICTION_WORKER_RESTART_BACKOFF * 2 ** (self.num_failed_starts - 1)
+            self._next_restart_time = now + (backoff if self.num_failed_starts else 0.0)
+        if now >= self._next_restart_time:
+            self.restart()
+
+    def restart(self):
+        logger.warning('prediction worker exited with code {} - restarting'.format(
+            self._process.exitcode if self._process is not None else None))
+        self.close()
+        self.start()
+        self.num_restarts += 1
+        self.num_failed_starts += 1
+        self._next_restart_time = None
+        if self._pending_request is None:
+            return
+        if self._pending_request_resent:
+            logger.warning('prediction worker died twice on request {} - dropping it'.format(self._pending_request[0]))
+            self._pending_request = None
+        else:
+            self._request_queue.put(('predict', self._pending_request))
+            self._pending_request_resent = True
+
+
+def _run_worker(config, request_queue, result_queue):
+    """ Worker process loop - a request of None stops the worker. Errors are logged and a failed prediction returns no
+    suggestions so that one bad swype doesn't kill the worker. Whether PredictiveText could be created is reported as a
+    result with request_id None"""
+    try:
+        predictive_text = PredictiveText(config=config)
+    except Exception as error:
+        logger.exception('prediction worker failed to start')
+        result_queue.put((None, '{}: {}'.format(type(error).__name__, error), None))
+        return
+    result_queue.put((None, None, None))
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+
+        method, args = request
+        if method == 'predict':
+            request_id, prompt, swype = args
+            try:
+                ranked_suggestions = predictive_text.predict_next_word(prompt=prompt, swype=swype)
+            except Exception:
+                logger.exception('prediction failed for request {}'.format(request_id))
+                ranked_suggestions = []
+            result_queue.put((request_id, ranked_suggestions, swype))
+        else:
+            try:
+                getattr(predictive_text, method)(*args)
+            except Exception:
+                logger.exception('prediction worker {} failed'.format(method))
@@ -1,27 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import logging
+import threading
+import time
 
-from wordfreq import zipf_frequency
+import numpy as np
 
-from nuvox.services.gpt2 import GPT2
+from nuvox.keyboard import Keyboard
+from nuvox.services.language_model import create_language_model
+from nuvox.services.template_decoder import TemplateDecoder
 from nuvox.services.trace_algorithm import TraceAlgorithm
+from nuvox.utils.key_trace import merge_runs
+
+logger = logging.getLogger('main_app')
+
+TRACE_MODELS = ('key_trace', 'gaze_template')
 
 
 class PredictiveText:
 
-    def __init__(self, config):
+    def __init__(self, config, language_model=None, load_in_background=True):
         """
 
         Parameters
         ----------
         config: nuvox.config.config.Config
+        language_model: optional
+            any object with a get_candidate_word_probs(prompt, candidate_words, normalize) method - defaults to the
+            model selected by config.LANGUAGE_MODEL
+        load_in_background: bool, optional
+            whether to load the default language model in a background thread so that the keyboard is usable straight
+            away - predictions are ranked by trace prob and frequency alone until language_model_ready is set
 
         """
+        if config.TRACE_MODEL not in TRACE_MODELS:
+            raise ValueError('TRACE_MODEL must be one of {} - got {}'.format(TRACE_MODELS, config.TRACE_MODEL))
 
         self.config = config
-        self.language_model = GPT2()
+        self.language_model = language_model
+        self.language_model_ready = threading.Event()
+        if language_model is not None:
+            self.language_model_ready.set()
+        elif load_in_background:
+            threading.Thread(target=self._load_language_model, name='language_model_loader', daemon=True).start()
+        else:
+            self._load_language_model()
 
         max_count = int(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
-        self.trace_algorithm = TraceAlgorithm(vocab_path=config.VOCAB_PATH, max_count=max_count)
+        self.trace_algorithm = TraceAlgorithm(vocab_path=config.VOCAB_PATH,
+                                              max_count=max_count,
+                                              decoder=config.TRACE_DECODER,
+                                              beam_width=config.TRACE_BEAM_WIDTH,
+                                              prob_floor=config.TRACE_PROB_FLOOR,
+                                              cache_size=config.TRACE_CACHE_SIZE,
+                                              cache_bucket_width=config.TRACE_CACHE_BUCKET_WIDTH)
+        self.incremental_decoder = None
+
+        # the prompt is run through the language model in the background while the user swypes - see start_swype
+        self._speculation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prompt_speculation')
+        self._speculative_prompt = None
+        self._speculation_future = None
+
+        self.template_decoder = None
+        if config.TRACE_MODEL == 'gaze_template':
+            self.template_decoder = TemplateDecoder(keyboard=Keyboard(key_list=config.KEY_LIST),
+                                                    discrete_reprs=self.trace_algorithm.discrete_repr_to_words.keys(),
+                                                    num_points=config.TEMPLATE_NUM_POINTS,
+                                                    sigma=config.TEMPLATE_SIGMA,
+                                                    top_k=config.TEMPLATE_TOP_K)
+
+    def _load_language_model(self):
+        start = time.perf_counter()
+        try:
+            self.language_model = create_language_model(self.config)
+        except Exception:
+            logger.exception('failed to load {} language model - predictions will be ranked by trace and frequency '
+                             'only'.format(self.config.LANGUAGE_MODEL))
+            return
+        self.language_model_ready.set()
+        logger.info('loaded {} language model in {:.2f}s'.format(self.config.LANGUAGE_MODEL, time.perf_counter() - start))
+
+    def start_swype(self, key_trace, prompt=None):
+        """
+        Start decoding a swype incrementally - subsequent keys should be passed to update_swype as they come in so
+        that by the time predict_next_word is called only the end key remains to be decoded.
+        The prompt is also run through the language model in the background so that only the candidates are left to
+        score at the end of the swype - call cancel_speculation if the text changes before then.
+        Parameters
+        ----------
+        key_trace: list[str]
+            key ids recorded so far in the swype
+        prompt: str, optional
+            text that the swyped word will follow
+        """
+        self.incremental_decoder = self.trace_algorithm.create_incremental_decoder(keys_to_ignore=self.config.KEYS_TO_IGNORE)
+        for key_id in key_trace:
+            self.incremental_decoder.push(key_id)
+
+        self.cancel_speculation()
+        if (prompt is not None) and self.language_model_ready.is_set() and \
+                hasattr(self.language_model, 'prepare_prompt'):
+            self._speculative_prompt = prompt
+            self._speculation_future = self._speculation_executor.submit(self._prepare_prompt, prompt)
+
+    def cancel_speculation(self):
+        """ Drop the speculative prompt - it is skipped if it has not started yet"""
+        self._speculative_prompt = None
+        if self._speculation_future is not None:
+            self._speculation_future.cancel()
+            self._speculation_future = None
+
+    def _prepare_prompt(self, prompt):
+        if prompt != self._speculative_prompt:
+            return  # cancelled or superseded while queued
+        start = time.perf_counter()
+        self.language_model.prepare_prompt(prompt, is_stale=lambda: prompt != self._speculative_prompt)
+        logger.debug('prepared prompt in {:.1f}ms'.format(1000 * (time.perf_counter() - start)))
+
+    def update_swype(self, key_id):
+        if self.incremental_decoder is not None:
+            self.incremental_decoder.push(key_id)
 
     def predict_next_word(self, prompt, swype):
         """
@@ -52,26 +150,48 @@ class PredictiveText:
             return [intended_punctuation]
 
         # Phase 1) Get dict mapping word --> prob(word | trace) for all possibly intended words using trace algorithm
-        word_to_trace_prob = self.trace_algorithm.get_possible_word_to_trace_prob(key_id_sequence=key_trace)
+        incremental_decoder, self.incremental_decoder = self.incremental_decoder, None
+        if (self.template_decoder is not None) and swype.gaze_trace:
+            discrete_repr_to_prob = self.template_decoder.get_discrete_repr_to_prob(swype.gaze_trace,
+                                                                                    start_key=key_trace[0],
+                                                                                    end_key=key_trace[-1])
+            word_to_trace_prob, word_ids = self.trace_algorithm.get_word_to_prob(discrete_repr_to_prob,
+                                                                                 return_word_ids=True)
+        elif (incremental_decoder is not None) and (incremental_decoder.key_trace == key_trace):
+            word_to_trace_prob, word_ids = incremental_decoder.finish(return_word_ids=True)
+        elif swype.key_runs:
+            # already run-length encoded by the controller so there's no need to regroup key_trace
+            run_keys, run_counts = merge_runs(swype.key_runs, keys_to_ignore=self.config.KEYS_TO_IGNORE)
+            word_to_trace_prob, word_ids = self.trace_algorithm.get_possible_word_to_trace_prob_from_runs(
+                start_key=run_keys[0], end_key=run_keys[-1], grouped_intermediate_keys=run_keys[1:-1],
+                counts=run_counts[1:-1], return_word_ids=True)
+        else:
+            word_to_trace_prob, word_ids = self.trace_algorithm.get_possible_word_to_trace_prob(key_id_sequence=key_trace,
+                                                                                                return_word_ids=True)
         swype.word_to_trace_prob = word_to_trace_prob  # store in swype obj for analytics
         candidate_words = list(word_to_trace_prob)
 
         # Phase 2) Filter the list of candidates based on their frequency in the english language
-        candidate_words = list(sorted(candidate_words, key=lambda word: zipf_frequency(word, 'en'), reverse=True))[:self.config.MAX_SUGGESTIONS]
+        candidate_words = self.get_most_frequent_words(candidate_words, word_ids, top_k=self.config.MAX_SUGGESTIONS)
 
         # Phase 3) Get dict mapping word --> prob(word | prompt) all possibly intended words using language model
-        word_to_language_prob = self.language_model.get_candidate_word_probs(prompt,
-                                                                             candidate_words=candidate_words,
-                                                                             normalize=True)
+        if self.language_model_ready.is_set():
+            word_to_language_prob = self.language_model.get_candidate_word_probs(prompt,
+                                                                                 candidate_words=candidate_words,
+                                                                                 normalize=True)
+            # TODO - need some sort of scaling factor to control influence of each model
+            w = 0.75  # relative weight on the trace probability vs language model prob
+        else:
+            word_to_language_prob = {word: 0.0 for word in candidate_words}  # still loading - rank by trace prob only
+            w = 1.0
         swype.word_to_language_prob = word_to_language_prob  # store in swype obj for analytics
 
-        # Phase 3) Get dict mapping word --> prob(word | trace) * prob(word | prompt) (i.e. the joint probability)
-        # TODO - need some sort of scaling factor to control influence of each model
-        w = 0.75  # relative weight on the trace probability vs language model prob
+        # Phase 4) Get dict mapping word --> prob(word | trace) * prob(word | prompt) (i.e. the joint probability)
         word_to_joint_prob = {word: ((w * word_to_trace_prob[word]) + ((1-w) * word_to_language_prob[word]))
                               for word in candidate_words}
         swype.word_to_joint_prob = word_to_joint_prob  # store in swype obj for analytics
 
+        # sort is stable so ties keep the frequency order from phase 2
         ranked_suggestions = sorted(word_to_joint_prob.keys(), key=lambda k: word_to_joint_prob.get(k, 0), reverse=True)
 
         if self.need_to_capitalize(prompt):
@@ -79,6 +199,33 @@ class PredictiveText:
 
         return ranked_suggestions
 
+    def get_most_frequent_words(self, candidate_words, word_ids, top_k):
+        """
+        Returns the top_k most frequent candidate words, most frequent first.
+        Uses the word frequencies stored alongside the vocab index if available - otherwise falls back to wordfreq
+        Parameters
+        ----------
+        candidate_words: list[str]
+        word_ids: np.ndarray
+            vocab index word ids aligned with candidate_words - None if the vocab is not a vocab index
+        top_k: int
+
+        Returns
+        -------
+        most_frequent_words: list[str]
+        """
+        word_frequencies = self.trace_algorithm.word_frequencies
+        if (word_ids is None) or (word_frequencies is None):
+            from wordfreq import zipf_frequency  # only needed for vocabs without precomputed frequencies
+            return list(sorted(candidate_words, key=lambda word: zipf_frequency(word, 'en'), reverse=True))[:top_k]
+
+        frequencies = word_frequencies[word_ids]
+        top_indices = np.arange(len(frequencies))
+        if len(frequencies) > top_k:
+            top_indices = np.argpartition(-frequencies, top_k - 1)[:top_k]
+        top_indices = top_indices[np.lexsort((top_indices, -frequencies[top_indices]))]  # ties keep candidate order
+        return [candidate_words[idx] for idx in top_indices]
+
     def get_intended_punctuation(self, key_id_sequence):
         """
         Config contains a hardcoded mapping from key_id to punctuation
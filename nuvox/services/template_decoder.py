@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class TemplateDecoder:
+
+    def __init__(self, keyboard, discrete_reprs, num_points=32, sigma=0.05, top_k=50):
+        """
+        Alternative to the trace algorithm that works on the raw gaze path rather than the sequence of key ids.
+        Every discrete repr in the vocab has a template path through the centers of its keys. The gaze path and the
+        templates are resampled to num_points equally spaced points and scored by their mean point-wise distance.
+        Templates are indexed by their (start key, end key) so only a small fraction of the vocab is scored per swype.
+        Parameters
+        ----------
+        keyboard: nuvox.keyboard.Keyboard
+        discrete_reprs: iterable[str]
+            all discrete reprs in the vocab e.g. TraceAlgorithm.discrete_repr_to_words.keys()
+        num_points: int, optional
+            number of points that paths are resampled to
+        sigma: float, optional
+            std of the gaussian that converts a mean distance (relative to the window) into a probability
+        top_k: int, optional
+            maximum number of discrete reprs returned per swype
+        """
+        self.num_points = num_points
+        self.sigma = sigma
+        self.top_k = top_k
+        self.key_id_to_center = {key.key_id: ((key.x1 + key.x2) / 2, (key.y1 + key.y2) / 2) for key in keyboard.keys}
+
+        self.discrete_reprs = [discrete_repr for discrete_repr in discrete_reprs
+                               if all(key_id in self.key_id_to_center for key_id in discrete_repr)]
+        self.templates = np.zeros((len(self.discrete_reprs), num_points, 2), dtype=np.float32)
+        self.start_end_to_template_idxs = {}
+        self._build_templates()
+
+    def _build_templates(self):
+        """ Resample the template path of every discrete repr - batched by number of keys so it's vectorized"""
+        num_keys_to_idxs = {}
+        for idx, discrete_repr in enumerate(self.discrete_reprs):
+            num_keys_to_idxs.setdefault(len(discrete_repr), []).append(idx)
+            self.start_end_to_template_idxs.setdefault((discrete_repr[0], discrete_repr[-1]), []).append(idx)
+
+        for idxs in num_keys_to_idxs.values():
+            paths = np.array([[self.key_id_to_center[key_id] for key_id in self.discrete_reprs[idx]] for idx in idxs])
+            self.templates[idxs] = resample_paths(paths, self.num_points)
+
+        self.start_end_to_template_idxs = {start_end: np.array(idxs)
+                                           for start_end, idxs in self.start_end_to_template_idxs.items()}
+
+    def get_discrete_repr_to_prob(self, gaze_points, start_key, end_key):
+        """
+        Parameters
+        ----------
+        gaze_points: list[tuple]
+            (relx, rely) gaze coords relative to the window recorded during the swype
+        start_key: str
+        end_key: str
+
+        Returns
+        -------
+        discrete_repr_to_prob: dict
+            unnormalized probabilities of the top_k closest templates that start with start_key and end with end_key
+        """
+        template_idxs = self.start_end_to_template_idxs.get((str(start_key), str(end_key)))
+        if (template_idxs is None) or (not gaze_points):
+            return {}
+
+        gaze_path = resample_paths(np.array([gaze_points], dtype=np.float64), self.num_points)[0]
+        distances = np.linalg.norm(self.templates[template_idxs] - gaze_path, axis=2).mean(axis=1)
+
+        if len(distances) > self.top_k:
+            top = np.argpartition(distances, self.top_k - 1)[:self.top_k]
+            template_idxs, distances = template_idxs[top], distances[top]
+
+        probs = np.exp(-0.5 * (distances / self.sigma) ** 2)
+        return {self.discrete_reprs[idx]: float(prob) for idx, prob in zip(template_idxs, probs) if prob > 0}
+
+
+def resample_paths(paths, num_points):
+    """
+    Resample paths to num_points points equally spaced along their length
+    Parameters
+    ----------
+    paths: np.ndarray
+        shape (num_paths, path_len, 2)
+    num_points: int
+
+    Returns
+    -------
+    resampled_paths: np.ndarray
+        shape (num_paths, num_points, 2) - paths with zero length are repeats of their first point
+    """
+    num_paths, path_len, _ = paths.shape
+    if path_len == 1:
+        return np.repeat(paths, num_points, axis=1)
+
+    segment_lengths = np.linalg.norm(np.diff(paths, axis=1), axis=2)  # (num_paths, path_len - 1)
+    cumulative_lengths = np.concatenate([np.zeros((num_paths, 1)), np.cumsum(segment_lengths, axis=1)], axis=1)
+    targets = cumulative_lengths[:, -1:] * np.linspace(0, 1, num_points)  # (num_paths, num_points)
+
+    # index of the segment that each target distance falls in
+    segment_idxs = (targets[:, :, np.newaxis] > cumulative_lengths[:, np.newaxis, 1:-1]).sum(axis=2)
+    rows = np.arange(num_paths)[:, np.newaxis]
+    segment_starts = cumulative_lengths[rows, segment_idxs]
+    segment_lens = segment_lengths[rows, segment_idxs]
+    fractions = np.divide(targets - segment_starts, segment_lens,
+                          out=np.zeros_like(targets), where=segment_lens > 0)
+
+    start_points = paths[rows, segment_idxs]
+    end_points = paths[rows, segment_idxs + 1]
+    return start_points + fractions[:, :, np.newaxis] * (end_points - start_points)
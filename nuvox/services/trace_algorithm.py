@@ -1,33 +1,77 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
+import heapq
 import itertools
+import math
+from multiprocessing import Pool
 
 import numpy as np
 
-from nuvox.utils.io import pickle_load
 from nuvox.utils.common import normalize_word_to_prob_dict
+from nuvox.utils.lru_cache import LRUCache
+from nuvox.utils.trie import Trie
+from nuvox.utils.vocab_index import VocabIndex, load_vocab, load_word_frequencies
 
 
 class TraceAlgorithm:
 
-    def __init__(self, vocab_path, max_count):
+    DECODERS = ('beam', 'exhaustive', 'vectorized')
+
+    def __init__(self, vocab_path, max_count, decoder='beam', beam_width=128, prob_floor=0.0, cache_size=512,
+                 cache_bucket_width=1):
         """
         The trace algorithm is responsible for identifying a set of potential intended words given the sequence of
         key ids that were in focus at each interval during the swype
         Parameters
         ----------
         vocab_path: str
-            path to a pkl file containing a dict mapping from discrete representation e.g. '3246' to the set of
-            possible words for that discrete repr
+            path to either a vocab index file (see nuvox.utils.vocab_index) or a pkl file containing a dict mapping
+            from discrete representation e.g. '3246' to the set of possible words for that discrete repr
         max_count: int
             maximum number of times a single key can be in focus in a row
             equal to int(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
+        decoder: str, optional
+            'beam' - walks a prefix trie of the vocab and only expands sub-sequences that are real vocab prefixes
+            'exhaustive' - enumerates all 2^n sub-sequences of the intermediate keys
+            'vectorized' - scores all 2^n sub-sequences at once with NumPy - same output as 'exhaustive'
+        beam_width: int, optional
+            number of partial sub-sequences kept at each step of the beam search
+        prob_floor: float, optional
+            sub-sequences with a joint probability below this are dropped by the vectorized decoder
+        cache_size: int, optional
+            number of decoded swypes memoized on their run-length signature - 0 disables the cache
+        cache_bucket_width: int, optional
+            run counts are divided by this in the cache signature so that swypes whose counts differ by a sample or two
+            share a cache entry - 1 only matches identical counts
         """
-
+        if decoder not in self.DECODERS:
+            raise ValueError('decoder must be one of {} - got {}'.format(self.DECODERS, decoder))
+        if cache_bucket_width < 1:
+            raise ValueError('cache_bucket_width must be at least 1 - got {}'.format(cache_bucket_width))
+
+        self.init_kwargs = {'vocab_path': vocab_path, 'max_count': max_count, 'decoder': decoder,
+                            'beam_width': beam_width, 'prob_floor': prob_floor, 'cache_size': cache_size,
+                            'cache_bucket_width': cache_bucket_width}
         self.vocab_path = vocab_path
-        self.discrete_repr_to_words = pickle_load(vocab_path)
+        self.discrete_repr_to_words = load_vocab(vocab_path)
+        self.is_vocab_index = isinstance(self.discrete_repr_to_words, VocabIndex)
+        self.word_frequencies = load_word_frequencies(vocab_path) if self.is_vocab_index else None
         self.max_count = max_count
-
-    def get_possible_word_to_trace_prob(self, key_id_sequence):
+        self.decoder = decoder
+        self.beam_width = beam_width
+        self.prob_floor = prob_floor
+        self._vocab_trie = None
+        self._key_prob_table = None
+        self.cache = LRUCache(max_size=cache_size)
+        self.cache_bucket_width = cache_bucket_width
+
+    @property
+    def vocab_trie(self):
+        """ Prefix trie over all discrete reprs in the vocab - built on first use as only the beam decoder needs it"""
+        if self._vocab_trie is None:
+            self._vocab_trie = Trie(self.discrete_repr_to_words.keys())
+        return self._vocab_trie
+
+    def get_possible_word_to_trace_prob(self, key_id_sequence, return_word_ids=False):
         """
         Returns a dict mapping all possible intended words to the probability of that word being intended based on the
         trace ONLY - NO language modelling occurs at this stage
@@ -35,21 +79,76 @@ class TraceAlgorithm:
         ----------
         key_id_sequence: list[str]
             list of key ids that have been recorded in a single swype
+        return_word_ids: bool, optional
+            whether to also return the vocab index word ids of the possible words
 
         Returns
         -------
         possible_word_to_prob: dict
             dict mapping a possible word to it's probability based solely on the trace - NOT how likely that word is
             to appear in the current context
+        word_ids: np.ndarray
+            only returned if return_word_ids is True - word ids aligned with possible_word_to_prob or None if the vocab
+            is not a vocab index
         """
 
         start_key, end_key, intermediate_keys = self.get_start_end_intermediate_keys(key_id_sequence)
+        grouped_intermediate_keys, counts = self.get_grouped_intermediate_keys_with_counts(intermediate_keys)
+
+        return self.get_possible_word_to_trace_prob_from_runs(start_key, end_key, grouped_intermediate_keys, counts,
+                                                              return_word_ids=return_word_ids)
+
+    def get_possible_word_to_trace_prob_from_runs(self, start_key, end_key, grouped_intermediate_keys, counts,
+                                                  beam=None, return_word_ids=False):
+        """
+        Same as get_possible_word_to_trace_prob but takes the run-length form of the swype i.e. the output of
+        get_start_end_intermediate_keys and get_grouped_intermediate_keys_with_counts.
+        Results are memoized on the run-length signature of the swype, with counts bucketed by cache_bucket_width, as
+        many swypes for the same word produce identical or near identical runs.
+        Parameters
+        ----------
+        start_key: str
+        end_key: str
+        grouped_intermediate_keys: list[str]
+        counts: list[int]
+        beam: dict, optional
+            beam decoder state after the start key and all intermediate keys e.g. from an IncrementalTraceDecoder -
+            if given only the end key step remains
+        return_word_ids: bool, optional
 
-        if intermediate_keys:
-            grouped_intermediate_keys, counts = self.get_grouped_intermediate_keys_with_counts(intermediate_keys)
+        Returns
+        -------
+        possible_word_to_prob: OrderedDict
+        word_ids: np.ndarray
+            only returned if return_word_ids is True
+        """
+        signature = (str(start_key), str(end_key), tuple(str(key_id) for key_id in grouped_intermediate_keys),
+                     tuple(count // self.cache_bucket_width for count in counts))
+        cached = self.cache.get(signature)
+        if cached is None:
+            cached = self._decode_runs(start_key, end_key, grouped_intermediate_keys, counts, beam)
+            self.cache.put(signature, cached)
 
+        possible_word_to_prob, word_ids = cached
+        possible_word_to_prob = OrderedDict(possible_word_to_prob)  # copy so that callers can't modify the cached dict
+        return (possible_word_to_prob, word_ids) if return_word_ids else possible_word_to_prob
+
+    def _decode_runs(self, start_key, end_key, grouped_intermediate_keys, counts, beam):
+        """ Uncached part of get_possible_word_to_trace_prob_from_runs - returns (possible_word_to_prob, word_ids)"""
+
+        if grouped_intermediate_keys:
             # get dict mapping all possible sub-seq of intermediate keys to it's probability
-            discrete_repr_to_prob = self.get_discrete_repr_to_prob(start_key, end_key, grouped_intermediate_keys, counts)
+            if (self.decoder == 'beam') and (beam is not None):
+                discrete_repr_to_prob = self.finish_beam(beam, end_key)
+            elif self.decoder == 'beam':
+                discrete_repr_to_prob = self.get_discrete_repr_to_prob_beam_search(start_key, end_key,
+                                                                                   grouped_intermediate_keys, counts)
+            elif self.decoder == 'vectorized':
+                discrete_repr_to_prob = self.get_discrete_repr_to_prob_vectorized(start_key, end_key,
+                                                                                  grouped_intermediate_keys, counts)
+            else:
+                discrete_repr_to_prob = self.get_discrete_repr_to_prob(start_key, end_key,
+                                                                       grouped_intermediate_keys, counts)
         else:
             if start_key == end_key:
                 discrete_repr = start_key
@@ -57,11 +156,68 @@ class TraceAlgorithm:
                 discrete_repr = ''.join([start_key, end_key])
             discrete_repr_to_prob = {discrete_repr: 1.0}
 
+        return self.get_word_to_prob(discrete_repr_to_prob, return_word_ids=True)
+
+    def decode_many(self, traces, workers=1, chunksize=64, max_pending_chunks=None):
+        """
+        Decode many key traces e.g. when replaying recorded sessions - results are yielded in the same order as traces.
+        With workers > 1 each worker process builds its own TraceAlgorithm with the same settings (a vocab index is
+        memory-mapped so its pages are shared between workers) and traces are streamed to them in chunks - at most
+        max_pending_chunks chunks are read from traces ahead of the results being yielded so memory stays bounded for
+        large generators.
+        Parameters
+        ----------
+        traces: iterable[list[str]]
+            key traces as passed to get_possible_word_to_trace_prob
+        workers: int, optional
+            number of worker processes - 1 decodes in this process
+        chunksize: int, optional
+            number of traces sent to a worker at a time
+        max_pending_chunks: int, optional
+            maximum number of chunks sent to the workers but not yet yielded - defaults to 2 * workers
+
+        Yields
+        ------
+        possible_word_to_prob: OrderedDict
+        """
+        if workers <= 1:
+            for trace in traces:
+                yield self.get_possible_word_to_trace_prob(trace)
+            return
+
+        # Pool.imap would read the whole of traces ahead of the workers so chunks are submitted as results are yielded
+        max_pending_chunks = max_pending_chunks or 2 * workers
+        traces = iter(traces)
+        with Pool(processes=workers, initializer=_init_decode_worker, initargs=(self.init_kwargs,)) as pool:
+            pending = deque()
+            while True:
+                while len(pending) < max_pending_chunks:
+                    chunk = list(itertools.islice(traces, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(pool.apply_async(_decode_chunk_in_worker, (chunk,)))
+                if not pending:
+                    return
+                yield from pending.popleft().get()
+
+    def create_incremental_decoder(self, keys_to_ignore=()):
+        """ Returns an IncrementalTraceDecoder that can be fed keys while a swype is in progress"""
+        return IncrementalTraceDecoder(trace_algorithm=self, keys_to_ignore=keys_to_ignore)
+
+    def get_word_to_prob(self, discrete_repr_to_prob, return_word_ids=False):
+        """ Look up the words for each discrete repr - returns normalized OrderedDict with most likely words first"""
         # possible word to prob
         possible_word_to_prob = {}
+        word_to_id = {}
         for discrete_repr, prob in discrete_repr_to_prob.items():
-            words = self.discrete_repr_to_words.get(discrete_repr, [])
-            possible_word_to_prob.update({word: prob for word in words})
+            if self.is_vocab_index:
+                for word_id in self.discrete_repr_to_words.get_word_ids(discrete_repr):
+                    word = self.discrete_repr_to_words.get_word(word_id)
+                    possible_word_to_prob[word] = prob
+                    word_to_id[word] = word_id
+            else:
+                words = self.discrete_repr_to_words.get(discrete_repr, [])
+                possible_word_to_prob.update({word: prob for word in words})
 
         # Normalize so probs sum to 1
         possible_word_to_prob = normalize_word_to_prob_dict(possible_word_to_prob)
@@ -69,7 +225,10 @@ class TraceAlgorithm:
         # Order so that most likely appear first
         possible_word_to_prob = OrderedDict({w: p for w, p in sorted(possible_word_to_prob.items(), key=lambda item: item[1], reverse=True)})
 
-        return possible_word_to_prob
+        if not return_word_ids:
+            return possible_word_to_prob
+        word_ids = np.array([word_to_id[word] for word in possible_word_to_prob], dtype=np.int64) if self.is_vocab_index else None
+        return possible_word_to_prob, word_ids
 
     @staticmethod
     def get_start_end_intermediate_keys(key_id_sequence):
@@ -125,6 +284,29 @@ class TraceAlgorithm:
 
         return grouped_keys, counts
 
+    def get_key_inclusion_prob(self, key_count):
+        """ Probability that an intermediate key was intended given the number of intervals it was in focus for"""
+        return 1 / (1 + np.exp(-10*((key_count / self.max_count) - 0.5)))
+
+    def get_key_inclusion_probs(self, key_counts):
+        """
+        Vectorized get_key_inclusion_prob - looks up a sigmoid table indexed by count that is built once per max_count
+        Parameters
+        ----------
+        key_counts: list[int]
+
+        Returns
+        -------
+        key_probs: np.ndarray
+        """
+        if (self._key_prob_table is None) or (len(self._key_prob_table) != self.max_count + 1):
+            self._key_prob_table = self.get_key_inclusion_prob(np.arange(self.max_count + 1))
+
+        key_counts = np.asarray(key_counts)
+        if key_counts.max(initial=0) <= self.max_count:
+            return self._key_prob_table[key_counts]
+        return self.get_key_inclusion_prob(key_counts)  # counts beyond the table are rare - compute directly
+
     def get_discrete_repr_to_prob(self, start_key, end_key, grouped_intermediate_keys, intermediate_key_counts):
 
         discrete_repr_to_prob = {}
@@ -133,7 +315,7 @@ class TraceAlgorithm:
             joint_prob = 1
             discrete_repr = str(start_key)
             for is_key_included, key_id, key_count in zip(sub_list_bools, grouped_intermediate_keys, intermediate_key_counts):
-                key_prob = 1 / (1 + np.exp(-10*((key_count / self.max_count) - 0.5)))
+                key_prob = self.get_key_inclusion_prob(key_count)
                 if is_key_included:
                     discrete_repr += str(key_id)
                     joint_prob *= key_prob
@@ -145,6 +327,197 @@ class TraceAlgorithm:
 
         return discrete_repr_to_prob
 
+    def get_discrete_repr_to_prob_vectorized(self, start_key, end_key, grouped_intermediate_keys,
+                                             intermediate_key_counts):
+        """
+        Vectorized version of get_discrete_repr_to_prob that returns the same dict.
+        The joint log prob of every inclusion mask is computed with a single bitmask-matrix product and the discrete
+        repr string is only built for masks whose joint prob is at least self.prob_floor.
+        Parameters
+        ----------
+        start_key: str
+        end_key: str
+        grouped_intermediate_keys: list[str]
+        intermediate_key_counts: list[int]
+
+        Returns
+        -------
+        discrete_repr_to_prob: dict
+        """
+        num_keys = len(grouped_intermediate_keys)
+        key_probs = self.get_key_inclusion_probs(intermediate_key_counts)
+
+        # row i matches the i'th element of itertools.product([True, False], repeat=num_keys)
+        bit_positions = np.arange(num_keys - 1, -1, -1)
+        masks = ((np.arange(2 ** num_keys)[:, np.newaxis] >> bit_positions) & 1) == 0
+
+        # clip so that 0 * log(0) never occurs in the product - exp of the clipped value still underflows to 0
+        with np.errstate(divide='ignore'):
+            log_include = np.maximum(np.log(key_probs), _MIN_LOG_PROB)
+            log_exclude = np.maximum(np.log(1 - key_probs), _MIN_LOG_PROB)
+        joint_log_probs = masks.astype(np.float64) @ log_include + (~masks).astype(np.float64) @ log_exclude
+        joint_probs = np.exp(joint_log_probs)
+
+        start_key, end_key = str(start_key), str(end_key)
+        key_ids = [str(key_id) for key_id in grouped_intermediate_keys]
+        discrete_repr_to_prob = {}
+        for mask_idx in np.flatnonzero(joint_probs >= self.prob_floor):
+            discrete_repr = ''.join([start_key, *itertools.compress(key_ids, masks[mask_idx]), end_key])
+            discrete_repr_to_prob[discrete_repr] = float(joint_probs[mask_idx])
+
+        return discrete_repr_to_prob
+
+    def get_discrete_repr_to_prob_beam_search(self, start_key, end_key, grouped_intermediate_keys,
+                                              intermediate_key_counts):
+        """
+        Same contract as get_discrete_repr_to_prob but only returns discrete reprs that exist in the vocab.
+        Walks the vocab trie one intermediate key at a time, expanding a partial sub-sequence only if including the
+        key leads to a real vocab prefix, and keeps the top beam_width partial sub-sequences in log-probability space.
+        Where several sub-sequences produce the same discrete repr the most likely one is kept.
+        Parameters
+        ----------
+        start_key: str
+        end_key: str
+        grouped_intermediate_keys: list[str]
+        intermediate_key_counts: list[int]
+
+        Returns
+        -------
+        discrete_repr_to_prob: dict
+        """
+        beam = self.init_beam(start_key)
+        for key_id, key_count in zip(grouped_intermediate_keys, intermediate_key_counts):
+            beam = self.advance_beam(beam, key_id, key_count)
+        return self.finish_beam(beam, end_key)
+
+    def init_beam(self, start_key):
+        """
+        Returns
+        -------
+        beam: dict
+            mapping from partial discrete repr to tuple of (trie node, log prob)
+        """
+        start_key = str(start_key)
+        start_node = self.vocab_trie.get_node(start_key)
+        return {start_key: (start_node, 0.0)} if start_node is not None else {}
+
+    def advance_beam(self, beam, key_id, key_count):
+        """ Extend every partial discrete repr in the beam by either skipping or including key_id"""
+        key_id = str(key_id)
+        key_prob = self.get_key_inclusion_prob(key_count)
+        log_include, log_exclude = _safe_log(key_prob), _safe_log(1 - key_prob)
+
+        next_beam = {}
+        for prefix, (node, log_prob) in beam.items():
+            _add_to_beam(next_beam, prefix, node, log_prob + log_exclude)
+            child = node.children.get(key_id)
+            if child is not None:
+                _add_to_beam(next_beam, prefix + key_id, child, log_prob + log_include)
+
+        if len(next_beam) > self.beam_width:
+            next_beam = dict(heapq.nlargest(self.beam_width, next_beam.items(), key=lambda item: item[1][1]))
+        return next_beam
+
+    @staticmethod
+    def finish_beam(beam, end_key):
+        """ Append end_key to every partial discrete repr and keep those that are complete vocab entries"""
+        end_key = str(end_key)
+        discrete_repr_to_prob = {}
+        for prefix, (node, log_prob) in beam.items():
+            end_node = node.children.get(end_key)
+            if (end_node is not None) and end_node.is_end:
+                discrete_repr_to_prob[prefix + end_key] = math.exp(log_prob)
+        return discrete_repr_to_prob
+
+
+class IncrementalTraceDecoder:
+
+    def __init__(self, trace_algorithm, keys_to_ignore=()):
+        """
+        Decodes a swype one key at a time while it's still in progress.
+        Keeps the runs (grouped keys and counts) of the swype so far and, for the beam decoder, the beam state after
+        every completed run. A run is only complete once the next key arrives so when the swype ends only the end key
+        step remains.
+        Parameters
+        ----------
+        trace_algorithm: TraceAlgorithm
+        keys_to_ignore: list[str], optional
+            keys that are dropped before decoding e.g. config.KEYS_TO_IGNORE
+        """
+        self.trace_algorithm = trace_algorithm
+        self.keys_to_ignore = set(keys_to_ignore)
+        self.key_trace = []  # all keys pushed so far excluding ignored keys
+        self.run_keys = []
+        self.run_counts = []
+        self.beam = None
+        self._num_runs_decoded = 0
+
+    def push(self, key_id):
+        """ Add the key in focus at the latest interval"""
+        if key_id in self.keys_to_ignore:
+            return
+        self.key_trace.append(key_id)
+
+        if self.run_keys and (self.run_keys[-1] == key_id):
+            self.run_counts[-1] += 1
+        else:
+            self.run_keys.append(key_id)
+            self.run_counts.append(1)
+            self._decode_completed_runs()
+
+    def finish(self, return_word_ids=False):
+        """
+        Treat the current run as the end key and return the same as
+        TraceAlgorithm.get_possible_word_to_trace_prob(self.key_trace, return_word_ids)
+        """
+        if not self.run_keys:
+            return (OrderedDict(), None) if return_word_ids else OrderedDict()
+        return self.trace_algorithm.get_possible_word_to_trace_prob_from_runs(start_key=self.run_keys[0],
+                                                                              end_key=self.run_keys[-1],
+                                                                              grouped_intermediate_keys=self.run_keys[1:-1],
+                                                                              counts=self.run_counts[1:-1],
+                                                                              beam=self.beam,
+                                                                              return_word_ids=return_word_ids)
+
+    def _decode_completed_runs(self):
+        """ Advance the beam over every completed run - all runs except the last one are complete"""
+        if self.trace_algorithm.decoder != 'beam':
+            return  # other decoders only benefit from the runs being kept up to date
+        num_completed_runs = len(self.run_keys) - 1
+        if (self.beam is None) and (num_completed_runs >= 1):
+            self.beam = self.trace_algorithm.init_beam(self.run_keys[0])
+            self._num_runs_decoded = 1
+        while self._num_runs_decoded < num_completed_runs:
+            run_idx = self._num_runs_decoded
+            self.beam = self.trace_algorithm.advance_beam(self.beam, self.run_keys[run_idx], self.run_counts[run_idx])
+            self._num_runs_decoded += 1
+
+
+_MIN_LOG_PROB = -1e4
+_worker_trace_algorithm = None  # set in each decode_many worker by _init_decode_worker
+
+
+def _init_decode_worker(init_kwargs):
+    global _worker_trace_algorithm
+    _worker_trace_algorithm = TraceAlgorithm(**init_kwargs)
+
+
+def _decode_chunk_in_worker(traces):
+    return [_worker_trace_algorithm.get_possible_word_to_trace_prob(trace) for trace in traces]
+
+
+
+def _safe_log(prob):
+    return math.log(prob) if prob > 0 else -math.inf
+
+
+def _add_to_beam(beam, prefix, node, log_prob):
+    """ Add partial discrete repr to beam - keeping the highest log prob if it's already present"""
+    if log_prob == -math.inf:
+        return
+    current = beam.get(prefix)
+    if (current is None) or (log_prob > current[1]):
+        beam[prefix] = (node, log_prob)
 
 
 if __name__ == '__main__':
@@ -3,26 +3,34 @@
 class Swype:
 
     def __init__(self, key_trace,
+                 gaze_trace=None,
                  ranked_suggestions=None,
                  accepted_word=None,
                  word_to_trace_prob=None,
                  word_to_language_prob=None,
-                 word_to_joint_prob=None):
+                 word_to_joint_prob=None,
+                 key_runs=None):
         """
         Single swype
         Parameters
         ----------
         key_trace: list[str]
             list of key_ids that were recorded at every timesteps during the swype
+        gaze_trace: list[tuple], optional
+            list of (relx, rely) gaze coords relative to the window that were recorded alongside key_trace
         ranked_suggestions: list[str], optional
             list of ranked suggestions that was predicted for the swype
         accepted_word: str, optional
         word_to_trace_prob: dict, optional
         word_to_language_prob: dict, optional
         word_to_joint_prob: dict, optional
+        key_runs: list[tuple], optional
+            key_trace in run-length form as (key_id, count) runs - see nuvox.utils.key_trace.RunLengthKeyTrace
         """
 
         self.key_trace = key_trace
+        self.gaze_trace = gaze_trace
+        self.key_runs = key_runs
         self.ranked_suggestions = ranked_suggestions
         self._accepted_word = None
         if accepted_word:
@@ -1,3 +1,5 @@
+import numpy as np
+
 
 def normalize_word_to_prob_dict(word_to_prob):
     """
@@ -12,4 +14,24 @@ def normalize_word_to_prob_dict(word_to_prob):
     normalized_word_to_prob: dict
     """
     _sum = sum([prob for prob in word_to_prob.values()])
-    return {word: prob / _sum for word, prob in word_to_prob.items()}
\ No newline at end of file
+    return {word: prob / _sum for word, prob in word_to_prob.items()}
+
+
+def normalize_word_to_log_prob_dict(word_to_log_prob):
+    """
+    Convert a dictionary mapping words to log probabilities into normalized probabilities - the max log prob is
+    subtracted first so that very small probabilities don't all underflow to 0
+    Parameters
+    ----------
+    word_to_log_prob: dict
+
+    Returns
+    -------
+    normalized_word_to_prob: dict
+    """
+    if not word_to_log_prob:
+        return {}
+    log_probs = np.array(list(word_to_log_prob.values()), dtype=np.float64)
+    probs = np.exp(log_probs - log_probs.max())
+    probs /= probs.sum()
+    return {word: float(prob) for word, prob in zip(word_to_log_prob, probs)}
@@ -0,0 +1,136 @@
+from collections import deque
+
+
+class RunLengthKeyTrace:
+
+    def __init__(self, max_runs=256):
+        """
+        Run-length encoded trace of the key in focus at each gaze sample e.g. [3, 3, 3, 2, 2] is held as the runs
+        [(3, 3), (2, 2)]. Focus changes are detected in constant time and only the latest max_runs runs are kept, so
+        memory stays constant however long the gaze wanders between swypes.
+        Parameters
+        ----------
+        max_runs: int, optional
+            maximum number of runs kept including the current run - older runs are dropped and counted in
+            num_dropped_runs. None keeps every run e.g. while a swype is in progress
+        """
+        self.max_runs = None
+        self.runs = deque()  # completed runs as (key_id, count, start_time), oldest first
+        self.current_key = None
+        self.run_length = 0  # number of samples in the current run
+        self.run_start_time = None  # timestamp of the first sample in the current run
+        self.last_time = None  # timestamp of the latest sample
+        self.num_dropped_runs = 0
+        self._num_samples = 0
+        self.set_max_runs(max_runs)
+
+    def set_max_runs(self, max_runs):
+        """ Change the maximum number of runs kept - the oldest runs are dropped if there are now too many"""
+        if (max_runs is not None) and (max_runs <= 0):
+            raise ValueError('max_runs must be positive - got {}'.format(max_runs))
+        self.max_runs = max_runs
+        runs = self.runs
+        if max_runs is not None:
+            while len(runs) > max_runs - 1:
+                self._num_samples -= runs.popleft()[1]
+                self.num_dropped_runs += 1
+        self.runs = deque(runs, maxlen=None if max_runs is None else max_runs - 1)
+
+    def __len__(self):
+        """ Number of samples in the trace"""
+        return self._num_samples
+
+    @property
+    def previous_key(self):
+        """ Key in focus before the current key - None if there is no earlier run"""
+        return self.runs[-1][0] if self.runs else None
+
+    def push(self, key_id, timestamp=None):
+        """
+        Add the key in focus at the latest sample
+        Parameters
+        ----------
+        key_id: str
+        timestamp: float, optional
+
+        Returns
+        -------
+        key_changed: bool
+            whether key_id started a new run
+        """
+        self.last_time = timestamp
+        self._num_samples += 1
+        if (self.run_length > 0) and (key_id == self.current_key):
+            self.run_length += 1
+            return False
+
+        if self.run_length > 0:
+            if len(self.runs) == self.runs.maxlen:
+                self._num_samples -= self.runs[0][1] if self.runs else self.run_length
+                self.num_dropped_runs += 1
+            self.runs.append((self.current_key, self.run_length, self.run_start_time))
+        self.current_key = key_id
+        self.run_length = 1
+        self.run_start_time = timestamp
+        return True
+
+    def clear(self):
+        self.runs.clear()
+        self.current_key = None
+        self.run_length = 0
+        self.run_start_time = None
+        self._num_samples = 0
+
+    def keep_last_sample(self):
+        """ Drop every sample except the latest e.g. when a swype starts on the key in focus"""
+        if self.run_length == 0:
+            return
+        self.runs.clear()
+        self.run_length = 1
+        self.run_start_time = self.last_time
+        self._num_samples = 1
+
+    def get_runs(self):
+        """
+        Returns
+        -------
+        runs: list[tuple]
+            (key_id, count) of every run including the current run, oldest first
+        """
+        runs = [(key_id, count) for key_id, count, _ in self.runs]
+        if self.run_length > 0:
+            runs.append((self.current_key, self.run_length))
+        return runs
+
+    def to_list(self):
+        """ Expand the runs back into one key_id per sample"""
+        return [key_id for key_id, count in self.get_runs() for _ in range(count)]
+
+
+def merge_runs(runs, keys_to_ignore=()):
+    """
+    Drop runs of ignored keys and merge the neighbouring runs of the same key that this leaves
+    e.g. [(3, 2), ('5', 1), (3, 1), (2, 4)] --> ([3, 2], [3, 4]) when '5' is ignored
+    Parameters
+    ----------
+    runs: list[tuple]
+        (key_id, count) runs e.g. from RunLengthKeyTrace.get_runs
+    keys_to_ignore: iterable[str], optional
+
+    Returns
+    -------
+    run_keys: list[str]
+    run_counts: list[int]
+    """
+    keys_to_ignore = set(keys_to_ignore)
+    run_keys = []
+    run_counts = []
+    for key_id, count in runs:
+        if key_id in keys_to_ignore:
+            continue
+        if run_keys and (run_keys[-1] == key_id):
+            run_counts[-1] += count
+        else:
+            run_keys.append(key_id)
+            run_counts.append(count)
+    return run_keys, run_counts
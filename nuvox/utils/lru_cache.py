@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, max_size):
+        """
+        Bounded least-recently-used cache that keeps hit/miss/eviction statistics for tuning max_size
+        Parameters
+        ----------
+        max_size: int
+            maximum number of entries - least recently used entries are evicted first
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        """ Membership test - does not count as a hit or miss or change the order of entries"""
+        return key in self._data
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        stats: dict
+            hits, misses, hit_rate, evictions, size and max_size
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hit_rate,
+                'size': len(self),
+                'max_size': self.max_size}
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class RingBuffer:
+
+    def __init__(self, capacity, width):
+        """
+        Fixed size buffer of float rows for passing samples from one producer thread to one consumer thread without a
+        lock. The producer only writes a row and then advances the write count and the consumer only advances the read
+        count, so neither blocks the other. If the producer gets more than capacity rows ahead the oldest rows are
+        overwritten and counted in num_dropped.
+        Parameters
+        ----------
+        capacity: int
+            maximum number of rows held
+        width: int
+            number of values per row e.g. 3 for (timestamp, x, y)
+        """
+        if capacity <= 0:
+            raise ValueError('capacity must be positive - got {}'.format(capacity))
+        self.capacity = capacity
+        self._data = np.zeros((capacity, width), dtype=np.float64)
+        self._write_count = 0
+        self._num_writes_started = 0
+        self._read_count = 0
+        self.num_dropped = 0
+
+    def __len__(self):
+        return min(self._write_count - self._read_count, self.capacity)
+
+    def push(self, values):
+        """ Producer only"""
+        self._num_writes_started = self._write_count + 1
+        self._data[self._write_count % self.capacity] = values
+        self._write_count += 1
+
+    def drain(self):
+        """
+        Consumer only - returns all rows pushed since the last drain, oldest first
+
+        Returns
+        -------
+        rows: np.ndarray
+            shape (num_rows, width)
+        """
+        write_count = self._write_count
+        start = max(self._read_count, write_count - self.capacity)
+        rows = self._data[np.arange(start, write_count) % self.capacity]
+
+        # rows the producer overwrote, or started to overwrite, while they were being copied are dropped
+        num_overwritten = min(self._num_writes_started - self.capacity - start, len(rows))
+        if num_overwritten > 0:
+            rows = rows[num_overwritten:]
+            start += num_overwritten
+
+        self.num_dropped += start - self._read_count
+        self._read_count = write_count
+        return rows
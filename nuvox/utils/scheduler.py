@@ -0,0 +1,84 @@
+import math
+import time
+
+
+class TickScheduler:
+
+    def __init__(self, interval, catch_up=False, max_catch_up_ticks=5, clock=time.perf_counter):
+        """
+        Schedules periodic ticks at absolute deadlines start + n * interval on a monotonic clock, so the period does
+        not stretch by the time taken to handle each tick. Call start before the first tick and tick after handling
+        each one - tick returns how long to wait until the next deadline.
+        When a tick overruns past one or more deadlines the missed ticks are either run back to back (catch_up) or
+        skipped, and both are counted.
+        Parameters
+        ----------
+        interval: float
+            seconds between ticks
+        catch_up: bool, optional
+            whether to run missed ticks immediately rather than skip them
+        max_catch_up_ticks: int, optional
+            most missed ticks run back to back when catching up - any more are skipped
+        clock: callable, optional
+            monotonic clock returning seconds
+        """
+        if interval <= 0:
+            raise ValueError('interval must be positive - got {}'.format(interval))
+        self.interval = interval
+        self.catch_up = catch_up
+        self.max_catch_up_ticks = max_catch_up_ticks
+        self.clock = clock
+        self.next_deadline = None
+        self.num_ticks = 0
+        self.num_overruns = 0  # ticks that finished after the next deadline
+        self.num_skipped = 0  # deadlines that were skipped rather than run
+        self.num_caught_up = 0  # missed deadlines that were run late
+        self.max_lateness = 0.0  # seconds by which the worst overrun passed the next deadline
+        self._num_behind = 0  # missed deadlines still to be caught up
+
+    def start(self):
+        """
+        Returns
+        -------
+        delay: float
+            seconds until the first tick i.e. 0
+        """
+        self.next_deadline = self.clock()
+        self._num_behind = 0
+        return 0.0
+
+    def tick(self):
+        """
+        Record that the current tick has been handled and advance to the next deadline
+
+        Returns
+        -------
+        delay: float
+            seconds to wait before the next tick - 0 if it is already due
+        """
+        if self.next_deadline is None:
+            raise ValueError('TickScheduler.start must be called before tick')
+        self.num_ticks += 1
+        self.next_deadline += self.interval
+        now = self.clock()
+        lateness = now - self.next_deadline
+        if lateness <= 0:
+            self._num_behind = 0
+            return self.next_deadline - now
+        if self._num_behind:
+            self._num_behind -= 1  # still catching up on an earlier overrun
+            self.num_caught_up += 1
+            return 0.0
+
+        self.num_overruns += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        num_missed = math.floor(lateness / self.interval)  # deadlines passed as well as the next one
+        num_run = min(num_missed, self.max_catch_up_ticks) if self.catch_up else 0
+        self._num_behind = num_run
+        self.num_skipped += num_missed - num_run
+        self.next_deadline += self.interval * (num_missed - num_run)
+        return 0.0
+
+    def summary(self):
+        return 'ticks: {}, overruns: {}, skipped: {}, caught up: {}, max lateness: {:.1f}ms'.format(
+            self.num_ticks, self.num_overruns, self.num_skipped, self.num_caught_up, 1000 * self.max_lateness)
@@ -0,0 +1,71 @@
+
+
+class TrieNode:
+
+    __slots__ = ('children', 'is_end')
+
+    def __init__(self):
+        """
+        Single node of a prefix trie
+        children: dict
+            mapping from the next char (i.e. key id) to the child TrieNode
+        is_end: bool
+            True if the path from the root to this node is a complete entry e.g. a discrete repr in the vocab
+        """
+        self.children = {}
+        self.is_end = False
+
+
+class Trie:
+
+    def __init__(self, sequences=()):
+        """
+        Prefix trie over strings - used by the trace algorithm to walk only those sub-sequences of a swype that are
+        prefixes of a discrete representation in the vocab
+        Parameters
+        ----------
+        sequences: iterable[str], optional
+            strings to insert e.g. the keys of the discrete_repr_to_words dict
+        """
+        self.root = TrieNode()
+        self.size = 0
+        for sequence in sequences:
+            self.insert(sequence)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, sequence):
+        node = self.get_node(sequence)
+        return (node is not None) and node.is_end
+
+    def insert(self, sequence):
+        node = self.root
+        for char in sequence:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = TrieNode()
+            node = child
+        if not node.is_end:
+            node.is_end = True
+            self.size += 1
+
+    def get_node(self, prefix, node=None):
+        """
+        Returns the node reached by following prefix from node (or from the root if node is None)
+        Parameters
+        ----------
+        prefix: str
+        node: TrieNode, optional
+
+        Returns
+        -------
+        node: TrieNode
+            or None if prefix does not exist in the trie
+        """
+        node = self.root if node is None else node
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
@@ -0,0 +1,151 @@
+import hashlib
+from multiprocessing import Pool
+import os
+
+import numpy as np
+from wordfreq import zipf_frequency
+
+from nuvox.keyboard import Keyboard
+from nuvox.utils.io import pickle_load, pickle_save, read_json_file, read_text_file, write_json_file
+from nuvox.utils.swype import get_discrete_representation_for_word
+from nuvox.utils.vocab_index import compile_vocab_index, get_frequencies_path
+
+_worker_keyboard = None  # set in each pool worker by _init_worker
+
+
+def compile_vocab(words, key_list, output_path, workers=None, chunksize=500):
+    """
+    Compile a vocab index (see nuvox.utils.vocab_index) for a keyboard layout along with per-word frequency ranks.
+    Discrete reprs and frequencies are computed across a process pool and cached next to the output, keyed by a
+    hash of the layout, so that rebuilding after adding words or tweaking a layout only computes what has changed.
+    If neither the layout nor the word list have changed since the last build nothing is done.
+
+    Writes:
+        output_path - the vocab index
+        <output_path stem>.ranks.npy - uint32 rank of each word id, 0 being the most frequent word
+        <output_path stem>.freq.npy - float32 zipf frequency of each word id
+        <output_path stem>.manifest.json - hashes of the layout and word list the index was built from
+        <output_path stem>.cache.pkl - cached discrete reprs and frequencies
+    Parameters
+    ----------
+    words: list[str]
+    key_list: list[nuvox.key.Key]
+    output_path: str
+    workers: int, optional
+        number of worker processes - defaults to the number of CPUs
+    chunksize: int, optional
+        number of words sent to a worker at a time
+
+    Returns
+    -------
+    num_computed: int
+        number of words that were not found in the cache and had to be computed
+    """
+    words = list(dict.fromkeys(word.strip() for word in words if word.strip()))  # de-dupe and keep order
+    layout_hash = get_layout_hash(key_list)
+    manifest = {'layout_hash': layout_hash, 'word_list_hash': get_word_list_hash(words)}
+
+    manifest_path, cache_path = get_manifest_path(output_path), get_cache_path(output_path)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if os.path.exists(output_path) and os.path.exists(manifest_path) and read_json_file(manifest_path) == manifest:
+        return 0
+
+    cache = pickle_load(cache_path) if os.path.exists(cache_path) else {'word_to_repr': {}, 'word_to_zipf': {}}
+    word_to_repr = cache['word_to_repr'].setdefault(layout_hash, {})
+    word_to_zipf = cache['word_to_zipf']
+
+    words_to_compute = [word for word in words if (word not in word_to_repr) or (word not in word_to_zipf)]
+    if words_to_compute:
+        with Pool(processes=workers, initializer=_init_worker, initargs=(key_list,)) as pool:
+            results = pool.map(_compute_word, words_to_compute, chunksize=chunksize)
+        for word, (discrete_repr, zipf) in zip(words_to_compute, results):
+            word_to_repr[word] = discrete_repr
+            word_to_zipf[word] = zipf
+
+    discrete_repr_to_words = {}
+    for word in words:
+        if word_to_repr[word] is not None:  # None if word contains a char that's not on the keyboard
+            discrete_repr_to_words.setdefault(word_to_repr[word], []).append(word)
+
+    index_words = compile_vocab_index(discrete_repr_to_words, output_path)
+    frequencies = np.array([word_to_zipf[word] for word in index_words], dtype=np.float32)
+    np.save(get_frequencies_path(output_path), frequencies)
+    np.save(get_ranks_path(output_path), get_frequency_ranks(frequencies))
+
+    pickle_save(cache_path, cache)
+    write_json_file(manifest_path, manifest)
+
+    return len(words_to_compute)
+
+
+def get_frequency_ranks(frequencies):
+    """
+    Returns the rank of each frequency - 0 is the highest frequency and ties keep their original order
+    e.g. [1.0, 3.0, 2.0] --> [2, 0, 1]
+    Parameters
+    ----------
+    frequencies: list[float]
+
+    Returns
+    -------
+    ranks: np.ndarray
+    """
+    order = np.argsort(-np.asarray(frequencies, dtype=np.float64), kind='stable')
+    ranks = np.empty(len(order), dtype=np.uint32)
+    ranks[order] = np.arange(len(order), dtype=np.uint32)
+    return ranks
+
+
+def get_layout_hash(key_list):
+    """ Hash of everything in a layout that affects discrete reprs i.e. key ids and contents"""
+    layout_string = '\n'.join('{}:{}'.format(key.key_id, '|'.join(key.contents)) for key in key_list)
+    return hashlib.sha256(layout_string.encode('utf-8')).hexdigest()
+
+
+def get_word_list_hash(words):
+    return hashlib.sha256('\n'.join(words).encode('utf-8')).hexdigest()
+
+
+def get_ranks_path(index_path):
+    return '{}.ranks.npy'.format(os.path.splitext(index_path)[0])
+
+
+def get_manifest_path(index_path):
+    return '{}.manifest.json'.format(os.path.splitext(index_path)[0])
+
+
+def get_cache_path(index_path):
+    return '{}.cache.pkl'.format(os.path.splitext(index_path)[0])
+
+
+def _init_worker(key_list):
+    global _worker_keyboard
+    _worker_keyboard = Keyboard(key_list=key_list)
+
+
+def _compute_word(word):
+    try:
+        discrete_repr = get_discrete_representation_for_word(_worker_keyboard, word)
+    except KeyError:
+        discrete_repr = None
+    return discrete_repr, zipf_frequency(word, 'en')
+
+
+if __name__ == '__main__':
+    import argparse
+    from definition import ROOT_DIR
+    from nuvox.config import keyboard_layouts
+
+    parser = argparse.ArgumentParser(description='Compile a vocab index and frequency ranks for a keyboard layout')
+    parser.add_argument('--word-list', default=os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'clean_word_list.txt'))
+    parser.add_argument('--layout', default='nuvox_standard_keyboard',
+                        help='name of a key list in nuvox/config/keyboard_layouts.py')
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'nuvox', 'vocab', 'clean_vocab.idx'))
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    _num_computed = compile_vocab(words=read_text_file(args.word_list).split('\n'),
+                                  key_list=getattr(keyboard_layouts, args.layout),
+                                  output_path=args.output,
+                                  workers=args.workers)
+    print('computed {} words'.format(_num_computed))
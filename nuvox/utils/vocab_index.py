@@ -0,0 +1,235 @@
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from nuvox.utils.io import pickle_load
+
+MAGIC = b'NVXVOCAB'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIII')  # magic, version, num_keys, num_words, key_blob_len, word_blob_len
+
+
+class VocabIndex:
+
+    def __init__(self, path):
+        """
+        Read-only, memory-mapped replacement for the pickled discrete_repr_to_words dict.
+        The file (see compile_vocab_index) holds the sorted discrete reprs, offsets and a packed UTF-8 word blob so
+        opening it is near instant and pages are only read from disk when they are looked up.
+        Supports the subset of the dict interface used by the trace algorithm i.e. get, in, keys, items and len.
+        Parameters
+        ----------
+        path: str
+            path to file created by compile_vocab_index
+
+        Raises
+        ------
+        ValueError
+            if file is not a vocab index or was written with an unsupported version
+        """
+        self.path = path
+        with open(path, 'rb') as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.num_keys, self.num_words, key_blob_len, word_blob_len = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('{} is not a vocab index file'.format(path))
+        if version != VERSION:
+            raise ValueError('vocab index version {} is not supported - expected {}'.format(version, VERSION))
+
+        offset = HEADER.size
+        self._key_offsets, offset = _read_uint32_array(self._mmap, offset, self.num_keys + 1)
+        self._key_word_offsets, offset = _read_uint32_array(self._mmap, offset, self.num_keys + 1)
+        self._word_offsets, offset = _read_uint32_array(self._mmap, offset, self.num_words + 1)
+        self._key_blob = self._mmap[offset: offset + key_blob_len]  # keys are small so are read into memory
+        offset += key_blob_len
+        self._word_blob_offset = offset
+
+    def __len__(self):
+        return self.num_keys
+
+    def __contains__(self, discrete_repr):
+        return self._find(discrete_repr) is not None
+
+    def __getitem__(self, discrete_repr):
+        key_idx = self._find(discrete_repr)
+        if key_idx is None:
+            raise KeyError(discrete_repr)
+        return self._words_for_key_idx(key_idx)
+
+    def __iter__(self):
+        return self.keys()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get(self, discrete_repr, default=None):
+        key_idx = self._find(discrete_repr)
+        return self._words_for_key_idx(key_idx) if key_idx is not None else default
+
+    def keys(self):
+        for key_idx in range(self.num_keys):
+            yield self._key_at(key_idx)
+
+    def items(self):
+        for key_idx in range(self.num_keys):
+            yield self._key_at(key_idx), self._words_for_key_idx(key_idx)
+
+    def get_word_ids(self, discrete_repr):
+        """
+        Returns the ids of the words for a discrete repr - ids index into arrays that are aligned with the words in
+        the index e.g. word frequencies
+        Returns
+        -------
+        word_ids: range
+            empty if discrete repr is not in the index
+        """
+        key_idx = self._find(discrete_repr)
+        if key_idx is None:
+            return range(0)
+        return range(self._key_word_offsets[key_idx], self._key_word_offsets[key_idx + 1])
+
+    def get_word(self, word_id):
+        start = self._word_blob_offset + self._word_offsets[word_id]
+        end = self._word_blob_offset + self._word_offsets[word_id + 1]
+        return self._mmap[start: end].decode('utf-8')
+
+    def close(self):
+        for view in (self._key_offsets, self._key_word_offsets, self._word_offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def _key_at(self, key_idx):
+        return self._key_blob[self._key_offsets[key_idx]: self._key_offsets[key_idx + 1]].decode('utf-8')
+
+    def _words_for_key_idx(self, key_idx):
+        return [self.get_word(word_id)
+                for word_id in range(self._key_word_offsets[key_idx], self._key_word_offsets[key_idx + 1])]
+
+    def _find(self, discrete_repr):
+        """ Binary search over the sorted keys - returns the key idx or None if not present"""
+        target = str(discrete_repr).encode('utf-8')
+        key_blob, key_offsets = self._key_blob, self._key_offsets
+        low, high = 0, self.num_keys
+        while low < high:
+            mid = (low + high) // 2
+            key = key_blob[key_offsets[mid]: key_offsets[mid + 1]]
+            if key < target:
+                low = mid + 1
+            elif key > target:
+                high = mid
+            else:
+                return mid
+        return None
+
+
+def compile_vocab_index(discrete_repr_to_words, output_path):
+    """
+    Write a vocab index file that can be opened with VocabIndex.
+    Words keep the order they have in discrete_repr_to_words[discrete_repr] and keys are sorted by their UTF-8 bytes.
+    Parameters
+    ----------
+    discrete_repr_to_words: dict
+        mapping from discrete repr e.g. '3246' to list of words
+    output_path: str
+
+    Returns
+    -------
+    words: list[str]
+        all words in the order of their word ids in the index
+    """
+    encoded_keys = sorted(str(discrete_repr).encode('utf-8') for discrete_repr in discrete_repr_to_words)
+
+    key_offsets, key_word_offsets, word_offsets = array('I', [0]), array('I', [0]), array('I', [0])
+    key_blob, word_blob = bytearray(), bytearray()
+    words = []
+    for encoded_key in encoded_keys:
+        key_blob += encoded_key
+        key_offsets.append(len(key_blob))
+        for word in discrete_repr_to_words[encoded_key.decode('utf-8')]:
+            word_blob += word.encode('utf-8')
+            word_offsets.append(len(word_blob))
+            words.append(word)
+        key_word_offsets.append(len(words))
+
+    if sys.byteorder != 'little':
+        for offsets in (key_offsets, key_word_offsets, word_offsets):
+            offsets.byteswap()
+
+    with open(output_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, VERSION, len(encoded_keys), len(words), len(key_blob), len(word_blob)))
+        for offsets in (key_offsets, key_word_offsets, word_offsets):
+            index_file.write(offsets.tobytes())
+        index_file.write(key_blob)
+        index_file.write(word_blob)
+
+    return words
+
+
+def convert_pickle_to_vocab_index(pickle_path, output_path):
+    """ Convert a pickled discrete_repr_to_words dict into a vocab index file"""
+    return compile_vocab_index(pickle_load(pickle_path), output_path)
+
+
+def is_vocab_index(path):
+    with open(path, 'rb') as vocab_file:
+        return vocab_file.read(len(MAGIC)) == MAGIC
+
+
+def load_vocab(path):
+    """
+    Load either vocab format
+    Parameters
+    ----------
+    path: str
+        path to a vocab index file or a pkl file containing a discrete_repr_to_words dict
+
+    Returns
+    -------
+    discrete_repr_to_words: VocabIndex or dict
+    """
+    return VocabIndex(path) if is_vocab_index(path) else pickle_load(path)
+
+
+def get_frequencies_path(index_path):
+    """ Path of the word frequency array that's stored alongside a vocab index"""
+    return '{}.freq.npy'.format(os.path.splitext(index_path)[0])
+
+
+def load_word_frequencies(index_path):
+    """
+    Returns
+    -------
+    word_frequencies: np.ndarray
+        memory-mapped array of the zipf frequency of each word id in the vocab index or None if it doesn't exist
+    """
+    frequencies_path = get_frequencies_path(index_path)
+    return np.load(frequencies_path, mmap_mode='r') if os.path.exists(frequencies_path) else None
+
+
+def _read_uint32_array(buffer, offset, count):
+    """ Returns (array, offset after array) - zero copy on little endian machines"""
+    end = offset + 4 * count
+    if sys.byteorder == 'little':
+        return memoryview(buffer)[offset: end].cast('I'), end
+    values = array('I', buffer[offset: end])
+    values.byteswap()
+    return values, end
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a pickled discrete_repr_to_words dict into a vocab index')
+    parser.add_argument('pickle_path')
+    parser.add_argument('output_path')
+    args = parser.parse_args()
+    convert_pickle_to_vocab_index(args.pickle_path, args.output_path)
@@ -1,9 +1,11 @@
+import logging
 import tkinter as tk
 from tkinter import messagebox
-import time
 
-import numpy as np
-from nuvox.views.popups import YesNoPopup
+from nuvox.utils.scheduler import TickScheduler
+from nuvox.views.popups import ErrorPopup, YesNoPopup
+
+logger = logging.getLogger('main_app')
 
 
 class View:
@@ -21,10 +23,8 @@ class View:
         self.configure_window()
         self.key_id_to_widget = {}
         self.periodic_callback = None
-
-        num_colour_increments = np.math.ceil(config.REQ_DWELL_TIME / config.GAZE_INTERVAL)
-        rgb_increment_arr = (np.array(config.HIGHLIGHT_BG) - np.array(config.DEFAULT_BG)) / num_colour_increments
-        self.rgb_increment = tuple([int(val) for val in rgb_increment_arr])
+        self.scheduler = TickScheduler(interval=config.GAZE_INTERVAL, catch_up=config.GAZE_TICK_CATCH_UP)
+        self.flashing_key_id_to_text = {}  # text to restore on keys that are flashing a predicted word
 
     def start_loop(self):
         if self.periodic_callback is None:
@@ -32,20 +32,21 @@ class View:
 
         self.start_periodic_callback()
         self.toplevel.mainloop()
+        logger.info('periodic callback {}'.format(self.scheduler.summary()))
 
     def start_periodic_callback(self):
         """
-        Periodic callback - used to sample either eye gaze or mouse position every n seconds
-        Parameters
-        ----------
-        interval_secs: float
-            number of seconds between succesive callbacks calls
-        callback: function
-            function to be called every n=interval_secs seconds
+        Periodic callback - used to process the eye gaze or mouse position every config.GAZE_INTERVAL seconds.
+        Calls are scheduled at fixed multiples of the interval by self.scheduler so the period doesn't drift by the
+        time the callback takes - calls that overrun are caught up or skipped depending on config.GAZE_TICK_CATCH_UP
         """
-        # make function call and then call this function again after delay
+        delay = self.scheduler.start()
+        self.toplevel.after(ms=int(1000 * delay), func=self._run_periodic_callback)
+
+    def _run_periodic_callback(self):
         self.periodic_callback()
-        self.toplevel.after(ms=int(1000 * self.config.GAZE_INTERVAL), func=self.start_periodic_callback)
+        delay = self.scheduler.tick()
+        self.toplevel.after(ms=int(round(1000 * delay)), func=self._run_periodic_callback)
 
     def create_widgets(self, keyboard):
         """
@@ -88,13 +89,19 @@ class View:
         widget.configure(text=new_text)
 
     def flash_pred_word(self, key_id, word):
-        """ flash predicted word on last key in focus"""
+        """ flash predicted word on last key in focus - the key's text is restored after a delay without blocking"""
         widget = self.key_id_to_widget[key_id]
-        current_text = widget.cget('text')
+        if key_id not in self.flashing_key_id_to_text:
+            self.flashing_key_id_to_text[key_id] = widget.cget('text')
         widget.configure(text=word, font="{} {}".format(self.config.FONT, self.config.BUTTON_FONT_SIZE+6))
-        self.toplevel.update()
-        time.sleep(self.config.PRED_FLASH_DURATION)
-        widget.configure(text=current_text, font="{} {}".format(self.config.FONT, self.config.BUTTON_FONT_SIZE))  # restore current text
+        self.toplevel.after(ms=int(1000 * self.config.PRED_FLASH_DURATION), func=lambda: self._end_flash(key_id, word))
+
+    def _end_flash(self, key_id, word):
+        widget = self.key_id_to_widget[key_id]
+        if widget.cget('text') != word:
+            return  # flashing a newer word
+        widget.configure(text=self.flashing_key_id_to_text.pop(key_id),
+                         font="{} {}".format(self.config.FONT, self.config.BUTTON_FONT_SIZE))  # restore current text
 
     def open_yes_no_popup(self, message):
         """
@@ -112,11 +119,27 @@ class View:
         answered_yes = popup.get_response()
         return answered_yes
 
-    def increment_widget_colour(self, key_id):
-        widget = self.key_id_to_widget[key_id]
-        current_hex = widget.cget('bg')
-        current_rgb = hex_to_rgb(current_hex)
-        new_rgb = tuple([curr + incr for curr, incr in zip(current_rgb, self.rgb_increment)])
+    def open_error_popup(self, message):
+        """
+        Open popup reporting an error
+        Parameters
+        ----------
+        message: str
+        """
+        ErrorPopup(master=self.toplevel, message=message).show()
+
+    def show_dwell_progress(self, key_id, progress):
+        """
+        Shade key from DEFAULT_BG towards HIGHLIGHT_BG as the gaze dwells on it
+        Parameters
+        ----------
+        key_id: str
+        progress: float
+            fraction of REQ_DWELL_TIME the key has been in focus for - clipped to [0, 1]
+        """
+        progress = min(max(progress, 0.0), 1.0)
+        new_rgb = tuple([int(default + progress * (highlight - default))
+                         for default, highlight in zip(self.config.DEFAULT_BG, self.config.HIGHLIGHT_BG)])
         self.change_widget_colour(key_id, rgb=new_rgb)
 
     def reset_widget_colour(self, key_id):
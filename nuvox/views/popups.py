@@ -16,3 +16,13 @@ class YesNoPopup():
         return answered_yes
 
 
+class ErrorPopup():
+
+    def __init__(self, master, message):
+        self.popup = tk.Toplevel(master)
+        self.popup.withdraw()
+        self.popup.attributes("-topmost", True)
+        self.message = message
+
+    def show(self):
+        messagebox.showerror(message=self.message, parent=self.popup)
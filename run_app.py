@@ -1,8 +1,10 @@
 from nuvox.config.config import Config
 from nuvox.controller import Controller
+from nuvox.utils.logger import initialise_logger
 
 
 if __name__ == '__main__':
 
+    initialise_logger()
     controller = Controller(config=Config())
     controller.run_app()
\ No newline at end of file
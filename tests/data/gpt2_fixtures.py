@@ -0,0 +1,32 @@
+import json
+import os
+
+import numpy as np
+
+
+def save_tiny_gpt2(directory, seed=0):
+    """
+    Save a tiny, randomly initialised GPT-2 model and byte-level tokenizer to directory so that
+    nuvox.services.gpt2.GPT2(model_name=directory) can be tested without downloading anything.
+    The tokenizer has one token per byte plus a few merges so that some words are single tokens and others aren't.
+    """
+    import tensorflow as tf
+    from transformers import GPT2Config, TFGPT2LMHeadModel
+    from transformers.tokenization_gpt2 import bytes_to_unicode
+
+    byte_tokens = list(bytes_to_unicode().values())
+    merges = [('Ġ', 't'), ('h', 'e'), ('Ġt', 'he'), ('Ġ', 'a')]
+    vocab = {token: idx for idx, token in enumerate(byte_tokens + [''.join(merge) for merge in merges])}
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'vocab.json'), 'w', encoding='utf-8') as vocab_file:
+        json.dump(vocab, vocab_file)
+    with open(os.path.join(directory, 'merges.txt'), 'w', encoding='utf-8') as merges_file:
+        merges_file.write('#version: 0.2\n' + '\n'.join(' '.join(merge) for merge in merges) + '\n')
+
+    tf.random.set_seed(seed)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=128, n_ctx=128, n_embd=32, n_layer=2, n_head=2)
+    model = TFGPT2LMHeadModel(config)
+    model(np.array([[0, 1, 2]]))  # build weights
+    model.save_pretrained(directory)
+    return directory
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from tests.data.keyboard_fixtures import valid_keyboard
+from benchmarks.run_benchmarks import find_regressions
+from benchmarks.synthetic_swypes import generate_key_trace, generate_swypes
+from nuvox.keyboard import Keyboard
+from nuvox.services.trace_algorithm import TraceAlgorithm
+
+keyboard = Keyboard(valid_keyboard)
+
+
+@pytest.mark.parametrize('discrete_repr', ['6', '3246', '862'])
+def test_generate_key_trace_without_noise(discrete_repr):
+    key_trace = generate_key_trace(discrete_repr, max_count=5, rng=random.Random(0), jitter_prob=0)
+    start_key, end_key, intermediate_keys = TraceAlgorithm.get_start_end_intermediate_keys(key_trace)
+    grouped_keys, _ = TraceAlgorithm.get_grouped_intermediate_keys_with_counts(intermediate_keys)
+    assert key_trace[:5] == [discrete_repr[0]] * 5
+    assert key_trace[-5:] == [discrete_repr[-1]] * 5
+    assert ''.join([start_key, *grouped_keys, end_key])[:len(discrete_repr)] == discrete_repr
+
+
+def test_generate_swypes_is_reproducible():
+    words = ['hello', 'the', 'tome']
+    assert generate_swypes(words, keyboard, 10, max_count=5, seed=1) == generate_swypes(words, keyboard, 10, max_count=5, seed=1)
+
+
+def test_find_regressions():
+    baseline = {'trace_algorithm': {'all': {'count': 100, 'p95_ms': 1.0}}}
+    assert find_regressions({'trace_algorithm': {'all': {'count': 100, 'p95_ms': 1.2}}}, baseline, threshold=0.25) == []
+    assert len(find_regressions({'trace_algorithm': {'all': {'count': 100, 'p95_ms': 1.3}}}, baseline, threshold=0.25)) == 1
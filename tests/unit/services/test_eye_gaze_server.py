@@ -0,0 +1,45 @@
+import math
+import time
+
+import pytest
+
+from nuvox.services.eye_gaze_server import GazeSampler, NoGazeDataReturned, parse_gaze_response
+
+
+@pytest.mark.parametrize('content, expected', [(b'{"X": 960, "Y": 270, "ViewportWidth": 1920, "ViewportHeight": 1080}',
+                                                (0.5, 0.25)),
+                                               (b'{"X": 0, "Y": 1080, "ViewportWidth": 1920, "ViewportHeight": 1080}',
+                                                (0.0, 1.0))])
+def test_parse_gaze_response(content, expected):
+    assert parse_gaze_response(content) == pytest.approx(expected)
+
+
+def test_parse_null_gaze_response():
+    with pytest.raises(NoGazeDataReturned):
+        parse_gaze_response(b'null')
+
+
+class FakeEyeGazeServer:
+
+    def __init__(self):
+        self.num_requests = 0
+
+    def get_gaze_relative_to_screen(self):
+        self.num_requests += 1
+        if self.num_requests % 2 == 0:
+            raise NoGazeDataReturned
+        return 0.5, 0.25
+
+
+def test_gaze_sampler():
+    sampler = GazeSampler(FakeEyeGazeServer(), interval=0.005, buffer_size=1000)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+    samples = sampler.drain()
+
+    assert len(samples) > 5
+    assert all(samples[1:, 0] > samples[:-1, 0])  # timestamps increase
+    assert samples[0, 1:].tolist() == [0.5, 0.25]
+    assert math.isnan(samples[1, 1]) and math.isnan(samples[1, 2])
+    assert not sampler.is_alive()
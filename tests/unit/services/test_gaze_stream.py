@@ -0,0 +1,110 @@
+import asyncio
+import math
+import sys
+import time
+
+import pytest
+
+from nuvox.services.eye_gaze_server import EyeGazeServer
+from nuvox.services.gaze_replay_server import GazeReplayServer, generate_synthetic_gaze
+from nuvox.services.gaze_stream import GazeStreamClient, GazeStreamSampler
+
+SAMPLES = [{'X': 960, 'Y': 270, 'ViewportWidth': 1920, 'ViewportHeight': 1080}, None]
+
+
+async def collect_samples(num_samples, streaming, rate_hz=200):
+    server = GazeReplayServer(SAMPLES, rate_hz=rate_hz, host='127.0.0.1', port=0, streaming=streaming)
+    await server.start()
+    try:
+        client = GazeStreamClient('http://127.0.0.1:{}'.format(server.port), poll_interval=0.005)
+        samples = []
+        async for sample in client.iter_samples():
+            samples.append(sample)
+            if len(samples) == num_samples:
+                break
+        return client.mode, samples
+    finally:
+        await server.stop()
+
+
+@pytest.mark.parametrize('streaming, expected_mode', [(True, 'stream'), (False, 'poll')])
+def test_client(streaming, expected_mode):
+    mode, samples = asyncio.run(collect_samples(20, streaming=streaming))
+    assert mode == expected_mode
+    assert len(samples) == 20
+    assert [sample[0] for sample in samples] == sorted(sample[0] for sample in samples)
+    assert any(sample[1:] == (0.5, 0.25) for sample in samples)
+    if streaming:  # every sample is received so missing gaze alternates
+        assert sum(math.isnan(sample[1]) for sample in samples) == 10
+
+
+def test_stream_sampler():
+    loop = asyncio.new_event_loop()
+    server = GazeReplayServer(generate_synthetic_gaze(rate_hz=200), rate_hz=200, host='127.0.0.1', port=0)
+    loop.run_until_complete(server.start())
+
+    sampler = GazeStreamSampler('http://127.0.0.1:{}'.format(server.port), buffer_size=1000)
+    sampler.start()
+    loop.run_until_complete(asyncio.sleep(0.3))  # keep serving while the sampler runs
+    sampler.stop()
+    loop.run_until_complete(server.stop())
+    loop.close()
+
+    samples = sampler.drain()
+    assert sampler.client.mode == 'stream'
+    assert len(samples) > 10
+    assert not sampler.is_alive()
+
+
+def test_stream_sampler_survives_missing_server():
+    sampler = GazeStreamSampler('http://127.0.0.1:1', retry_interval=0.01)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    samples = sampler.drain()
+    assert len(samples) >= 1
+    assert all(math.isnan(x) for x in samples[:, 1])
+
+
+async def read_body_from_raw_response(response, timeout=2.0):
+    """ Read the body of the response to a poll from a server that replies with the raw response bytes"""
+    async def reply(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(response)
+        await writer.drain()
+        await asyncio.sleep(1)  # keep the connection open
+        writer.close()
+
+    server = await asyncio.start_server(reply, host='127.0.0.1', port=0)
+    try:
+        client = GazeStreamClient('http://127.0.0.1:{}'.format(server.sockets[0].getsockname()[1]), timeout=timeout)
+        reader, writer = await client._connect()
+        try:
+            status, headers = await client._request(reader, writer, '/')
+            return await client._read_body(reader, headers)
+        finally:
+            writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def test_read_chunked_body():
+    response = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n4\r\n{"X"\r\n5;ext=1\r\n: 960\r\n1\r\n}\r\n0\r\n\r\n'
+    assert asyncio.run(read_body_from_raw_response(response)) == b'{"X": 960}'
+
+
+def test_body_without_length_on_kept_alive_connection_raises():
+    with pytest.raises(ValueError):
+        asyncio.run(read_body_from_raw_response(b'HTTP/1.1 200 OK\r\nConnection: keep-alive\r\n\r\n{}'))
+
+
+def test_stalled_headers_time_out():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(read_body_from_raw_response(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n', timeout=0.1))
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='only raises on platforms without the windows server')
+def test_start_server_raises_os_error_off_windows():
+    with pytest.raises(OSError, match='gaze_replay_server'):
+        EyeGazeServer(host='http://localhost:3070', exe_path='Eye_Gaze_Server.exe').start_server()
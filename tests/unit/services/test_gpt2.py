@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('transformers')
+
+from tests.data.gpt2_fixtures import save_tiny_gpt2
+import numpy as np
+
+from nuvox.services.gpt2 import GPT2, gather_log_probs
+
+
+@pytest.fixture(scope='module')
+def tiny_model_dir(tmp_path_factory):
+    return save_tiny_gpt2(str(tmp_path_factory.mktemp('tiny_gpt2')))
+
+
+@pytest.fixture
+def language_model(tiny_model_dir):
+    return GPT2(model_name=tiny_model_dir, score_cache_size=0)
+
+
+def uncached_probs(language_model, prompt, candidate_words):
+    language_model.reset_prompt_cache()
+    return language_model.get_candidate_word_probs(prompt, candidate_words)
+
+
+@pytest.mark.parametrize('prompts', [['the cat', 'the cat sat', 'the cat sat on'],
+                                     ['the cat sat on', 'the cat', 'the dog'],
+                                     ['the cat', 'the cat', '']])
+def test_prompt_cache_matches_uncached(language_model, prompts):
+    candidate_words = ['the', 'a', 'mat', 'hat']
+    for prompt in prompts:
+        cached = language_model.get_candidate_word_probs(prompt, candidate_words)
+        assert cached == pytest.approx(uncached_probs(language_model, prompt, candidate_words), rel=1e-4)
+
+
+@pytest.mark.parametrize('prompt', ['', 'the cat sat on'])
+def test_batched_multi_token_words_match_sequential(language_model, prompt):
+    candidate_words = ['the', 'mat', 'elephant', 'a', 'xylophone']
+    language_model.batch_multi_token_words = False
+    sequential = language_model.get_candidate_word_probs(prompt, candidate_words)
+    language_model.batch_multi_token_words = True
+    batched = language_model.get_candidate_word_probs(prompt, candidate_words)
+    assert list(batched) == candidate_words
+    assert batched == pytest.approx(sequential, rel=1e-4)
+
+
+def test_window_prompt_tokens(language_model):
+    language_model.max_seq_len = 8
+    full_stop = language_model.tokenizer.convert_tokens_to_ids('.')
+    assert language_model.window_prompt_tokens([1, 2, 3]) == [1, 2, 3]
+    # window starts after the sentence end
+    assert language_model.window_prompt_tokens([1, 2, 3, full_stop, 4, 5, 6, 7, 8, 9]) == [4, 5, 6, 7, 8, 9]
+    # no sentence end - start is rounded up to a multiple of max_seq_len // 2
+    assert not language_model._sentence_end_token_ids.intersection(range(40, 51))
+    assert language_model.window_prompt_tokens(list(range(40, 50))) == list(range(44, 50))
+    assert language_model.window_prompt_tokens(list(range(40, 51))) == list(range(44, 51))
+
+
+def test_long_prompt_is_windowed(language_model):
+    language_model.max_seq_len = 8
+    language_model.get_candidate_word_probs('the cat sat on the mat and then the cat sat on the hat', ['a'])
+    assert len(language_model._cached_prompt_tokens) <= 8
+
+
+@pytest.mark.parametrize('shape, batch_dims', [((7,), 0), ((3, 7), 1), ((2, 3, 7), 2)])
+def test_gather_log_probs_matches_log_softmax(shape, batch_dims):
+    rng = np.random.RandomState(0)
+    logits = rng.normal(size=shape).astype(np.float32)
+    token_ids = np.array([1, 4, 6], dtype=np.int32) if batch_dims == 0 else rng.randint(0, 7, size=shape[:-1])
+    log_softmax = logits - np.log(np.exp(logits).sum(axis=-1, keepdims=True))
+    if batch_dims == 0:
+        expected = log_softmax[token_ids]
+    else:
+        expected = np.take_along_axis(log_softmax, token_ids[..., np.newaxis], axis=-1)[..., 0]
+    assert gather_log_probs(logits, token_ids, batch_dims=batch_dims).numpy() == pytest.approx(expected, abs=1e-5)
+
+
+def test_normalized_probs_sum_to_one(language_model):
+    word_to_prob = language_model.get_candidate_word_probs('the cat', ['the', 'mat', 'elephant'], normalize=True)
+    assert sum(word_to_prob.values()) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('precision', ['float16', 'int8'])
+def test_reduced_precision_matches_float32(tiny_model_dir, tmp_path, precision):
+    candidate_words = ['the', 'mat', 'elephant', 'a', 'xylophone']
+    float32_model = GPT2(model_name=tiny_model_dir, score_cache_size=0)
+    reduced_model = GPT2(model_name=tiny_model_dir, precision=precision, cache_dir=str(tmp_path))
+    assert reduced_model.keras_model is None
+    for prompt in ['', 'the cat sat on']:
+        expected = float32_model.get_candidate_word_probs(prompt, candidate_words, normalize=True)
+        word_to_prob = reduced_model.get_candidate_word_probs(prompt, candidate_words, normalize=True)
+        assert list(word_to_prob) == candidate_words
+        assert word_to_prob == pytest.approx(expected, abs=0.05)
+
+
+def test_tflite_model_is_cached(tiny_model_dir, tmp_path):
+    language_model = GPT2(model_name=tiny_model_dir, precision='int8', cache_dir=str(tmp_path))
+    tflite_model_path = language_model.get_tflite_model_path()
+    modified_time = os.path.getmtime(tflite_model_path)
+    GPT2(model_name=tiny_model_dir, precision='int8', cache_dir=str(tmp_path))
+    assert os.path.getmtime(tflite_model_path) == modified_time
+
+
+def test_invalid_precision(tiny_model_dir):
+    with pytest.raises(ValueError):
+        GPT2(model_name=tiny_model_dir, precision='int4')
+    with pytest.raises(ValueError):
+        GPT2(model_name=tiny_model_dir, precision='int8')
+
+
+def test_score_cache_only_scores_misses(tiny_model_dir, monkeypatch):
+    language_model = GPT2(model_name=tiny_model_dir)
+    language_model.score_cache.clear()
+    expected = GPT2(model_name=tiny_model_dir, score_cache_size=0).get_candidate_word_probs(
+        'the cat', ['mat', 'elephant', 'the', 'hat'], normalize=True)
+
+    scored_words = []
+    score_words = language_model._score_words
+
+    def recording_score_words(prompt_tokens, words):
+        scored_words.append(list(words))
+        return score_words(prompt_tokens, words)
+
+    monkeypatch.setattr(language_model, '_score_words', recording_score_words)
+    language_model.get_candidate_word_probs('the cat', ['mat', 'elephant'])
+    word_to_prob = language_model.get_candidate_word_probs('the cat', ['mat', 'elephant', 'the', 'hat'], normalize=True)
+    assert scored_words == [['mat', 'elephant'], ['the', 'hat']]
+    assert list(word_to_prob) == ['mat', 'elephant', 'the', 'hat']
+    assert word_to_prob == pytest.approx(expected, rel=1e-4)
+    assert language_model.score_cache.stats()['hits'] == 2
+
+    language_model.get_candidate_word_probs('the dog', ['mat'])  # different context
+    assert scored_words[-1] == ['mat']
+
+
+def test_prepared_prompt_matches_unprepared(language_model):
+    candidate_words = ['the', 'mat', 'elephant']
+    expected = uncached_probs(language_model, 'the cat sat on', candidate_words)
+    language_model.reset_prompt_cache()
+    language_model.prepare_prompt('the cat sat on')
+    assert language_model._cached_prompt_tokens
+    assert language_model.get_candidate_word_probs('the cat sat on', candidate_words) == pytest.approx(expected, rel=1e-4)
+
+
+def test_stale_prepared_prompt_is_not_cached(language_model):
+    language_model.reset_prompt_cache()
+    language_model.prepare_prompt('the cat sat on', is_stale=lambda: True)
+    assert language_model._cached_prompt_tokens == []
+    language_model.prepare_prompt('the cat sat on', is_stale=lambda: False)
+    assert language_model._cached_prompt_tokens
@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+from nuvox.config.config import Config
+from nuvox.services.language_model import create_language_model
+from nuvox.services.ngram import NGramLanguageModel, estimate_discount, tokenize_sentences, train_ngram_model
+
+CORPUS = """The cat sat on the mat. The dog sat on the log.
+The cat ate the fish! Did the dog eat the fish? The cat sat on the hat.
+
+A bird sang"""
+
+
+@pytest.fixture(scope='module', params=[1, 2, 3])
+def language_model(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp('ngram')
+    corpus_path = directory / 'corpus.txt'
+    corpus_path.write_text(CORPUS, encoding='utf-8')
+    model_path = str(directory / 'model_{}.npz'.format(request.param))
+    train_ngram_model([str(corpus_path)], model_path, order=request.param)
+    return NGramLanguageModel(model_path)
+
+
+def test_tokenize_sentences():
+    assert tokenize_sentences("It's a cat. Is it?\n\nyes no") == [["it's", 'a', 'cat'], ['is', 'it'], ['yes', 'no']]
+
+
+@pytest.mark.parametrize('counts, expected', [([1, 1, 2, 3], 0.5), ([1, 1, 1], 0.75), ([1] * 20 + [2], 0.9)])
+def test_estimate_discount(counts, expected):
+    assert estimate_discount(counts) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('prompt', ['', 'the cat', 'the cat sat on', 'a bird sang. the', 'never seen words'])
+def test_probs_over_vocab_sum_to_one(language_model, prompt):
+    word_to_prob = language_model.get_candidate_word_probs(prompt, language_model.words)
+    assert sum(word_to_prob.values()) == pytest.approx(1, abs=1e-4)
+
+
+def test_seen_continuation_is_more_likely(language_model):
+    if language_model.order == 1:
+        pytest.skip('unigram model ignores the prompt')
+    assert language_model.get_candidate_word_probs('the cat', ['sat'])['sat'] > \
+        language_model.get_candidate_word_probs('', ['sat'])['sat']
+    word_to_prob = language_model.get_candidate_word_probs('the dog sat on the', ['mat', 'bird'])
+    assert word_to_prob['mat'] > word_to_prob['bird']
+
+
+def test_unknown_words_get_a_probability(language_model):
+    word_to_prob = language_model.get_candidate_word_probs('the cat', ['zebra', 'Cat'], normalize=True)
+    assert list(word_to_prob) == ['zebra', 'Cat']
+    assert word_to_prob['Cat'] > word_to_prob['zebra'] > 0
+    assert sum(word_to_prob.values()) == pytest.approx(1)
+
+
+def test_context_ids_are_padded_to_current_sentence(language_model):
+    context_ids = language_model.get_context_ids('the dog sat. The cat')
+    assert len(context_ids) == language_model.order - 1
+    assert language_model.get_context_ids('the cat.') == [1] * (language_model.order - 1)
+
+
+def test_create_language_model(tmp_path):
+    corpus_path = tmp_path / 'corpus.txt'
+    corpus_path.write_text(CORPUS, encoding='utf-8')
+    config = Config()
+    config.LANGUAGE_MODEL = 'ngram'
+    config.NGRAM_MODEL_PATH = str(tmp_path / 'model.npz')
+    train_ngram_model([str(corpus_path)], config.NGRAM_MODEL_PATH)
+    assert isinstance(create_language_model(config), NGramLanguageModel)
+
+    config.LANGUAGE_MODEL = 'unknown'
+    with pytest.raises(ValueError):
+        create_language_model(config)
+
+
+def test_log_probs_match_probs(language_model):
+    word_to_log_prob = language_model.get_candidate_word_log_probs('the cat', ['sat', 'ate'])
+    word_to_prob = language_model.get_candidate_word_probs('the cat', ['sat', 'ate'])
+    assert word_to_prob['sat'] == pytest.approx(math.exp(word_to_log_prob['sat']))
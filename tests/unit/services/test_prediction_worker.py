@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from nuvox.config.config import Config
+from nuvox.services.prediction_worker import PredictionWorker
+from nuvox.swype import Swype
+
+KEY_TRACE = ['3'] * 14 + ['2', '2', '4', '4'] + ['6'] * 14
+
+
+@pytest.fixture(scope='module')
+def prediction_worker(tmp_path_factory):
+    config = Config()
+    config.LANGUAGE_MODEL = 'ngram'
+    config.NGRAM_MODEL_PATH = str(tmp_path_factory.mktemp('ngram') / 'missing.npz')  # ranked by trace prob only
+    prediction_worker = PredictionWorker(config=config)
+    yield prediction_worker
+    prediction_worker.close()
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_until(condition, timeout=60):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise TimeoutError('condition not met')
+        time.sleep(0.01)
+
+
+def wait_for_result(prediction_worker, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = prediction_worker.poll()
+        if result is not None:
+            return result
+        time.sleep(0.01)
+    raise TimeoutError('no result from prediction worker')
+
+
+def test_predict(prediction_worker):
+    prediction_worker.start_swype(key_trace=KEY_TRACE[:14], prompt='')
+    for key_id in KEY_TRACE[14:]:
+        prediction_worker.update_swype(key_id)
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=list(KEY_TRACE)))
+    ranked_suggestions, swype = wait_for_result(prediction_worker)
+    assert 'Hello' in ranked_suggestions
+    assert set(swype.word_to_joint_prob) == {word.lower() for word in ranked_suggestions}
+
+
+def test_superseded_results_are_discarded(prediction_worker):
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=['3'] * 14 + ['6'] * 14))
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=list(KEY_TRACE)))
+    ranked_suggestions, swype = wait_for_result(prediction_worker)
+    assert swype.key_trace == KEY_TRACE
+    time.sleep(0.5)
+    assert prediction_worker.poll() is None
+
+
+def test_discarded_request_is_not_returned(prediction_worker):
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=list(KEY_TRACE)))
+    assert prediction_worker.has_pending_request
+    prediction_worker.discard_pending()
+    assert not prediction_worker.has_pending_request
+    time.sleep(0.5)
+    assert prediction_worker.poll() is None
+
+
+def test_worker_survives_failed_prediction(prediction_worker):
+    num_restarts = prediction_worker.num_restarts
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=5))  # key_trace must be a list so prediction raises
+    ranked_suggestions, swype = wait_for_result(prediction_worker)
+    assert ranked_suggestions == []
+    assert prediction_worker.is_alive
+    assert prediction_worker.num_restarts == num_restarts
+
+
+def test_worker_is_restarted_after_crash(prediction_worker):
+    num_restarts = prediction_worker.num_restarts
+    prediction_worker._process.kill()
+    prediction_worker._process.join()
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=list(KEY_TRACE)))
+    ranked_suggestions, swype = wait_for_result(prediction_worker)
+    assert 'Hello' in ranked_suggestions
+    assert prediction_worker.num_restarts == num_restarts + 1
+    assert prediction_worker.is_alive
+
+
+def test_request_is_resent_at_most_once(prediction_worker):
+    prediction_worker.submit(prompt='', swype=Swype(key_trace=list(KEY_TRACE)))
+    prediction_worker.restart()  # as if the worker died on the request
+    assert prediction_worker._pending_request is not None
+    prediction_worker.restart()  # died on it again
+    assert prediction_worker._pending_request is None
+    assert prediction_worker.poll() is None
+
+
+def test_restarts_back_off_when_worker_fails_to_start():
+    config = Config()
+    config.TRACE_MODEL = 'missing'  # PredictiveText raises so the worker dies on startup
+    config.PREDICTION_WORKER_MAX_RESTARTS = 2
+    config.PREDICTION_WORKER_RESTART_BACKOFF = 10
+    clock = FakeClock()
+    prediction_worker = PredictionWorker(config=config, clock=clock)
+    try:
+        wait_until(lambda: (prediction_worker.poll() is None) and prediction_worker.num_restarts == 1)
+        assert 'TRACE_MODEL' in prediction_worker.startup_error
+        wait_until(lambda: not prediction_worker.is_alive)
+        for _ in range(5):
+            prediction_worker.poll()
+        assert prediction_worker.num_restarts == 1  # waiting for the backoff
+        clock.now += 10
+        wait_until(lambda: (prediction_worker.poll() is None) and prediction_worker.has_failed)
+        assert prediction_worker.num_restarts == 2
+        prediction_worker.poll()
+        assert prediction_worker.num_restarts == 2
+    finally:
+        prediction_worker.close()
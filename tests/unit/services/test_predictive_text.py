@@ -0,0 +1,123 @@
+import threading
+
+import numpy as np
+import pytest
+
+from nuvox.config.config import Config
+from nuvox.services import predictive_text as predictive_text_module
+from nuvox.services.predictive_text import PredictiveText
+from nuvox.swype import Swype
+
+
+class UniformLanguageModel:
+
+    @staticmethod
+    def get_candidate_word_probs(prompt, candidate_words, normalize=False):
+        return {word: 1 / len(candidate_words) for word in candidate_words}
+
+
+@pytest.fixture(scope='module')
+def predictive_text():
+    return PredictiveText(config=Config(), language_model=UniformLanguageModel())
+
+
+@pytest.mark.parametrize('frequencies, top_k, expected', [([1.0, 3.0, 2.0, 0.5], 2, ['b', 'c']),
+                                                          ([1.0, 3.0, 2.0, 0.5], 10, ['b', 'c', 'a', 'd']),
+                                                          ([2.0, 1.0, 2.0, 2.0], 2, ['a', 'c'])])
+def test_get_most_frequent_words(predictive_text, frequencies, top_k, expected):
+    word_frequencies = predictive_text.trace_algorithm.word_frequencies
+    try:
+        predictive_text.trace_algorithm.word_frequencies = np.array(frequencies, dtype=np.float32)
+        assert predictive_text.get_most_frequent_words(['a', 'b', 'c', 'd'], np.arange(4), top_k) == expected
+    finally:
+        predictive_text.trace_algorithm.word_frequencies = word_frequencies
+
+
+def test_precomputed_frequencies_match_wordfreq(predictive_text):
+    word_to_trace_prob, word_ids = predictive_text.trace_algorithm.get_possible_word_to_trace_prob(
+        ['3', '3', '2', '2', '4', '4', '6', '6'], return_word_ids=True)
+    candidate_words = list(word_to_trace_prob)
+    assert predictive_text.get_most_frequent_words(candidate_words, word_ids, top_k=5) == \
+        predictive_text.get_most_frequent_words(candidate_words, None, top_k=5)
+
+
+def test_invalid_trace_model():
+    config = Config()
+    config.TRACE_MODEL = 'gaze_templates'
+    with pytest.raises(ValueError):
+        PredictiveText(config=config, language_model=UniformLanguageModel())
+
+
+def test_predict_next_word(predictive_text):
+    swype = Swype(key_trace=['3'] * 14 + ['2', '2', '4', '4'] + ['6'] * 14)
+    ranked_suggestions = predictive_text.predict_next_word(prompt='', swype=swype)
+    assert 'Hello' in ranked_suggestions
+    assert set(swype.word_to_joint_prob) == {word.lower() for word in ranked_suggestions}
+
+
+def test_predict_next_word_from_key_runs(predictive_text):
+    key_trace = ['3'] * 14 + ['5', '2', '2', '5', '2', '4', '4'] + ['6'] * 14  # '5' is in KEYS_TO_IGNORE
+    key_runs = [('3', 14), ('5', 1), ('2', 2), ('5', 1), ('2', 1), ('4', 2), ('6', 14)]
+    from_trace = predictive_text.predict_next_word(prompt='', swype=Swype(key_trace=list(key_trace)))
+    from_runs = predictive_text.predict_next_word(prompt='', swype=Swype(key_trace=list(key_trace), key_runs=key_runs))
+    assert from_runs == from_trace
+
+
+class FavouriteWordLanguageModel:
+
+    def __init__(self, favourite_word):
+        self.favourite_word = favourite_word
+
+    def get_candidate_word_probs(self, prompt, candidate_words, normalize=False):
+        return {word: float(word == self.favourite_word) for word in candidate_words}
+
+
+def test_falls_back_to_trace_ranking_until_language_model_is_loaded(monkeypatch):
+    key_trace = ['3'] * 14 + ['2', '2', '4', '4'] + ['6'] * 14
+    loading_allowed = threading.Event()
+
+    def slow_create_language_model(config):
+        loading_allowed.wait()
+        return FavouriteWordLanguageModel('hello')
+
+    monkeypatch.setattr(predictive_text_module, 'create_language_model', slow_create_language_model)
+    predictive_text = PredictiveText(config=Config())
+    assert not predictive_text.language_model_ready.is_set()
+
+    swype = Swype(key_trace=list(key_trace))
+    ranked_suggestions = predictive_text.predict_next_word(prompt='the', swype=swype)
+    assert swype.word_to_joint_prob == {word: swype.word_to_trace_prob[word] for word in ranked_suggestions}
+    trace_probs = [swype.word_to_trace_prob[word] for word in ranked_suggestions]
+    assert trace_probs == sorted(trace_probs, reverse=True)
+
+    loading_allowed.set()
+    assert predictive_text.language_model_ready.wait(timeout=5)
+    assert predictive_text.predict_next_word(prompt='the', swype=Swype(key_trace=list(key_trace)))[0] == 'hello'
+
+
+class RecordingLanguageModel(UniformLanguageModel):
+
+    def __init__(self):
+        self.prepared_prompts = []
+        self.prepare_started = threading.Event()
+        self.prepare_allowed = threading.Event()
+
+    def prepare_prompt(self, prompt, is_stale=None):
+        self.prepare_started.set()
+        self.prepare_allowed.wait(timeout=5)
+        if not is_stale():
+            self.prepared_prompts.append(prompt)
+
+
+def test_prompt_is_prepared_at_swype_start():
+    language_model = RecordingLanguageModel()
+    predictive_text = PredictiveText(config=Config(), language_model=language_model)
+
+    predictive_text.start_swype(key_trace=['3'], prompt='hello there')
+    assert language_model.prepare_started.wait(timeout=5)
+    predictive_text.start_swype(key_trace=['3'], prompt='hello')  # queued behind the first
+    predictive_text.cancel_speculation()
+    predictive_text.start_swype(key_trace=['3'], prompt='hi')
+    language_model.prepare_allowed.set()
+    predictive_text._speculation_future.result(timeout=5)
+    assert language_model.prepared_prompts == ['hi']  # 'hello there' went stale while it was running
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from tests.data.keyboard_fixtures import valid_keyboard
+from nuvox.keyboard import Keyboard
+from nuvox.services.template_decoder import TemplateDecoder, resample_paths
+
+keyboard = Keyboard(valid_keyboard)
+
+
+def test_resample_paths():
+    paths = np.array([[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]]])
+    resampled = resample_paths(paths, num_points=5)
+    assert resampled.shape == (1, 5, 2)
+    np.testing.assert_allclose(resampled[0], [[0, 0], [0.5, 0], [1, 0], [1, 0.5], [1, 1]])
+
+
+@pytest.mark.parametrize('paths', [np.array([[[0.2, 0.3]]]), np.array([[[0.2, 0.3], [0.2, 0.3]]])])
+def test_resample_zero_length_paths(paths):
+    np.testing.assert_allclose(resample_paths(paths, num_points=4)[0], [[0.2, 0.3]] * 4)
+
+
+def test_closest_template_is_most_likely():
+    decoder = TemplateDecoder(keyboard, discrete_reprs=['3246', '326', '36', '3146', '62', '1'], top_k=10)
+    key_centers = [decoder.key_id_to_center[key_id] for key_id in '3246']
+    rng = np.random.RandomState(0)
+    gaze_points = [tuple(np.array(center) + rng.normal(scale=0.01, size=2))
+                   for center in key_centers for _ in range(5)]
+
+    discrete_repr_to_prob = decoder.get_discrete_repr_to_prob(gaze_points, start_key='3', end_key='6')
+    assert set(discrete_repr_to_prob) == {'3246', '326', '36', '3146'}
+    assert max(discrete_repr_to_prob, key=discrete_repr_to_prob.get) == '3246'
+    assert decoder.get_discrete_repr_to_prob(gaze_points, start_key='9', end_key='6') == {}
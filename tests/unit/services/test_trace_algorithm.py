@@ -26,3 +26,103 @@ def test_get_grouped_intermediate_keys_with_counts(intermediate_keys, expected):
 
 
 
+@pytest.mark.parametrize('key_id_sequence', [['3', '3', '2', '2', '4', '4', '6', '6'],
+                                             ['8', '3', '3', '2', '2', '8', '8'],
+                                             ['6', '6', '2', '1', '1', '8', '4', '4', '2', '2', '3']])
+def test_beam_search_matches_exhaustive(key_id_sequence):
+    exhaustive = TraceAlgorithm(vocab_path, max_count=4, decoder='exhaustive')
+    beam = TraceAlgorithm(vocab_path, max_count=4, decoder='beam')
+    assert beam.get_possible_word_to_trace_prob(key_id_sequence) == \
+        pytest.approx(exhaustive.get_possible_word_to_trace_prob(key_id_sequence))
+
+
+def test_beam_search_only_returns_vocab_reprs():
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4, decoder='beam', beam_width=8)
+    discrete_repr_to_prob = trace_algo.get_discrete_repr_to_prob_beam_search('3', '6', ['2', '1', '4', '8', '9', '2', '4'],
+                                                                             [1, 2, 3, 1, 2, 1, 3])
+    assert discrete_repr_to_prob
+    assert all(discrete_repr in trace_algo.discrete_repr_to_words for discrete_repr in discrete_repr_to_prob)
+
+
+def test_invalid_decoder():
+    with pytest.raises(ValueError):
+        TraceAlgorithm(vocab_path, max_count=4, decoder='unknown')
+
+
+@pytest.mark.parametrize('grouped_intermediate_keys, counts', [(['2'], [1]),
+                                                               (['2', '1', '4'], [1, 3, 2]),
+                                                               (['2', '1', '2', '8', '9'], [4, 1, 2, 7, 3])])
+def test_vectorized_matches_exhaustive(grouped_intermediate_keys, counts):
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4)
+    expected = trace_algo.get_discrete_repr_to_prob('3', '6', grouped_intermediate_keys, counts)
+    actual = trace_algo.get_discrete_repr_to_prob_vectorized('3', '6', grouped_intermediate_keys, counts)
+    assert list(actual) == list(expected)
+    assert actual == pytest.approx(expected)
+
+
+def test_trace_cache():
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4, cache_size=8)
+    first = trace_algo.get_possible_word_to_trace_prob(['3', '3', '2', '4', '4', '6', '6'])
+    first['not_a_word'] = 1.0  # modifying the returned dict must not affect the cache
+    trace_algo.get_possible_word_to_trace_prob(['3', '2', '2', '4', '4', '6'])  # different counts so a miss
+    assert trace_algo.cache.stats()['hits'] == 0
+
+    second = trace_algo.get_possible_word_to_trace_prob(['3', '3', '3', '2', '4', '4', '6'])  # same runs as first
+    assert trace_algo.cache.stats()['hits'] == 1
+    assert 'not_a_word' not in second
+
+
+def test_trace_cache_buckets_counts():
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4, cache_size=8, cache_bucket_width=2)
+    first = trace_algo.get_possible_word_to_trace_prob(['3', '2', '2', '4', '4', '6'])
+    second = trace_algo.get_possible_word_to_trace_prob(['3', '2', '2', '2', '4', '4', '4', '6'])  # counts 3 vs 2
+    assert trace_algo.cache.stats()['hits'] == 1
+    assert second == first
+
+    trace_algo.get_possible_word_to_trace_prob(['3', '2', '4', '4', '6'])  # count 1 is in a different bucket to 2
+    assert trace_algo.cache.stats()['hits'] == 1
+
+
+def test_invalid_cache_bucket_width():
+    with pytest.raises(ValueError):
+        TraceAlgorithm(vocab_path, max_count=4, cache_bucket_width=0)
+
+
+@pytest.mark.parametrize('decoder', ['beam', 'vectorized'])
+@pytest.mark.parametrize('key_id_sequence', [['3'],
+                                             ['3', '3', '6'],
+                                             ['3', '3', '2', '2', '4', '4', '6', '6'],
+                                             ['6', '5', '6', '2', '1', '5', '1', '8', '4', '4', '2', '2', '3']])
+def test_incremental_decoder_matches_batch(decoder, key_id_sequence):
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4, decoder=decoder, cache_size=0)
+    incremental_decoder = trace_algo.create_incremental_decoder(keys_to_ignore=['5'])
+    for key_id in key_id_sequence:
+        incremental_decoder.push(key_id)
+
+    filtered_sequence = [key_id for key_id in key_id_sequence if key_id != '5']
+    assert incremental_decoder.key_trace == filtered_sequence
+    assert incremental_decoder.finish() == pytest.approx(trace_algo.get_possible_word_to_trace_prob(filtered_sequence))
+
+
+def test_decode_many():
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4)
+    traces = [['3', '3', '2', '2', '4', '4', '6', '6'], ['8', '3', '2', '8'], ['6'], ['1', '7', '2', '4', '8']] * 5
+    expected = [trace_algo.get_possible_word_to_trace_prob(trace) for trace in traces]
+    assert list(trace_algo.decode_many(iter(traces), workers=1)) == expected
+    assert list(trace_algo.decode_many(iter(traces), workers=2, chunksize=3)) == expected
+
+
+def test_decode_many_reads_traces_lazily():
+    trace_algo = TraceAlgorithm(vocab_path, max_count=4)
+    num_read = 0
+
+    def traces():
+        nonlocal num_read
+        while True:
+            num_read += 1
+            yield ['3', '3', '2', '2', '4', '4', '6', '6']
+
+    results = trace_algo.decode_many(traces(), workers=2, chunksize=3, max_pending_chunks=2)
+    next(results)
+    assert num_read <= 2 * 3 + 1  # islice may read one trace past the last full chunk
+    results.close()
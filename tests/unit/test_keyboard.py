@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from tests.data.keyboard_fixtures import valid_keyboard, invalid_keyboard_1, invalid_keyboard_2
@@ -22,3 +23,25 @@ def test_get_key_at_point():
     assert keyboard.get_key_at_point(0.1, 0.1).key_id == 'display'
     assert keyboard.get_key_at_point(1.1, 1.1) is None
 
+
+def get_key_at_point_by_scan(key_list, x, y):
+    return next((key for key in key_list if key.contains_point(x, y)), None)
+
+
+def test_get_key_at_point_matches_scan():
+    """ Includes points on key edges and corners and outside the window"""
+    keyboard = Keyboard(valid_keyboard)
+    edges = [edge for key in valid_keyboard for edge in (key.x1, key.x2, key.y1, key.y2)]
+    coords = np.concatenate([edges, np.linspace(-0.25, 1.25, 61), np.random.RandomState(0).uniform(-0.1, 1.1, 20)])
+    for x in coords:
+        for y in coords:
+            assert keyboard.get_key_at_point(x, y) is get_key_at_point_by_scan(valid_keyboard, x, y)
+
+
+def test_get_keys_at_points():
+    keyboard = Keyboard(valid_keyboard)
+    xs, ys = np.meshgrid(np.linspace(-0.25, 1.25, 61), np.linspace(-0.25, 1.25, 61))
+    xs, ys = np.append(xs.ravel(), np.nan), np.append(ys.ravel(), 0.5)
+    keys = keyboard.get_keys_at_points(xs, ys)
+    assert keys == [keyboard.get_key_at_point(x, y) for x, y in zip(xs[:-1], ys[:-1])] + [None]
+    assert keyboard.get_keys_at_points([], []) == []
@@ -1,6 +1,8 @@
+import math
+
 import pytest
 
-from nuvox.utils.common import normalize_word_to_prob_dict
+from nuvox.utils.common import normalize_word_to_log_prob_dict, normalize_word_to_prob_dict
 
 
 @pytest.mark.parametrize('d, expected', [({'a': 0.1, 'b': 0.3}, {'a': 0.25, 'b': 0.75})])
@@ -8,3 +10,13 @@ def test_normalize_word_to_prob_dict(d, expected):
     assert set(d) == set(expected)
     normalized_dict = normalize_word_to_prob_dict(d)
     assert all([(abs(normalized_dict[key] - expected[key]) < 1e-5) for key in d.keys()])
+
+
+
+@pytest.mark.parametrize('d, expected', [({'a': math.log(0.1), 'b': math.log(0.3)}, {'a': 0.25, 'b': 0.75}),
+                                         ({'a': -2000.0, 'b': -2000.0 + math.log(3)}, {'a': 0.25, 'b': 0.75}),
+                                         ({}, {})])
+def test_normalize_word_to_log_prob_dict(d, expected):
+    normalized_dict = normalize_word_to_log_prob_dict(d)
+    assert list(normalized_dict) == list(expected)
+    assert all([(abs(normalized_dict[key] - expected[key]) < 1e-5) for key in d.keys()])
@@ -0,0 +1,69 @@
+import pytest
+
+from nuvox.utils.key_trace import RunLengthKeyTrace, merge_runs
+
+
+def test_push():
+    key_trace = RunLengthKeyTrace()
+    key_changed = [key_trace.push(key_id, timestamp) for timestamp, key_id in enumerate(['3', '3', '3', '2', '2', '4'])]
+    assert key_changed == [True, False, False, True, False, True]
+    assert key_trace.get_runs() == [('3', 3), ('2', 2), ('4', 1)]
+    assert key_trace.to_list() == ['3', '3', '3', '2', '2', '4']
+    assert len(key_trace) == 6
+    assert (key_trace.current_key, key_trace.previous_key) == ('4', '2')
+    assert (key_trace.run_start_time, key_trace.last_time) == (5, 5)
+
+
+def test_runs_are_bounded():
+    key_trace = RunLengthKeyTrace(max_runs=3)
+    for _ in range(1000):
+        for key_id in ['1', '2', '2']:
+            key_trace.push(key_id)
+    assert key_trace.get_runs() == [('2', 2), ('1', 1), ('2', 2)]
+    assert len(key_trace) == 5
+    assert key_trace.num_dropped_runs == 1997
+
+
+def test_unbounded_while_swyping():
+    key_trace = RunLengthKeyTrace(max_runs=2)
+    key_trace.set_max_runs(None)
+    for key_id in ['1', '2', '3', '4']:
+        key_trace.push(key_id)
+    assert key_trace.get_runs() == [('1', 1), ('2', 1), ('3', 1), ('4', 1)]
+    assert key_trace.num_dropped_runs == 0
+
+    key_trace.set_max_runs(2)
+    assert key_trace.get_runs() == [('3', 1), ('4', 1)]
+    assert (len(key_trace), key_trace.num_dropped_runs) == (2, 2)
+    key_trace.push('5')
+    assert key_trace.get_runs() == [('4', 1), ('5', 1)]
+
+
+def test_keep_last_sample_and_clear():
+    key_trace = RunLengthKeyTrace()
+    for timestamp, key_id in enumerate(['1', '2', '2', '2']):
+        key_trace.push(key_id, timestamp)
+    key_trace.keep_last_sample()
+    assert key_trace.get_runs() == [('2', 1)]
+    assert key_trace.run_start_time == 3
+    assert key_trace.push('2', 4) is False
+
+    key_trace.clear()
+    assert (len(key_trace), key_trace.get_runs(), key_trace.current_key) == (0, [], None)
+    assert key_trace.push('2') is True
+
+
+@pytest.mark.parametrize('runs, keys_to_ignore, expected', [([], (), ([], [])),
+                                                            ([('3', 2), ('2', 1)], (), (['3', '2'], [2, 1])),
+                                                            ([('3', 2), ('5', 1), ('3', 1), ('2', 4)], ('5',),
+                                                             (['3', '2'], [3, 4])),
+                                                            ([('5', 3)], ('5',), ([], []))])
+def test_merge_runs(runs, keys_to_ignore, expected):
+    assert merge_runs(runs, keys_to_ignore) == expected
+
+
+def test_invalid_max_runs():
+    with pytest.raises(ValueError):
+        RunLengthKeyTrace(max_runs=0)
+    with pytest.raises(ValueError):
+        RunLengthKeyTrace().set_max_runs(0)
@@ -0,0 +1,29 @@
+from nuvox.utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'a' is now more recently used than 'b'
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_stats():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    cache.put('b', 2)
+    cache.put('c', 3)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'evictions': 1, 'size': 2, 'max_size': 2}
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(max_size=0)
+    cache.put('a', 1)
+    assert len(cache) == 0
+    assert cache.get('a') is None
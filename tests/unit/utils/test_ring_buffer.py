@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from nuvox.utils.ring_buffer import RingBuffer
+
+
+@pytest.mark.parametrize('capacity, num_pushed, expected_rows, expected_dropped', [(4, 0, [], 0),
+                                                                                  (4, 3, [0, 1, 2], 0),
+                                                                                  (4, 4, [0, 1, 2, 3], 0),
+                                                                                  (4, 6, [2, 3, 4, 5], 2)])
+def test_drain(capacity, num_pushed, expected_rows, expected_dropped):
+    ring_buffer = RingBuffer(capacity=capacity, width=2)
+    for value in range(num_pushed):
+        ring_buffer.push((value, -value))
+    assert len(ring_buffer) == len(expected_rows)
+    rows = ring_buffer.drain()
+    assert rows.shape == (len(expected_rows), 2)
+    assert rows[:, 0].tolist() == expected_rows
+    assert ring_buffer.num_dropped == expected_dropped
+    assert len(ring_buffer) == 0
+    assert len(ring_buffer.drain()) == 0
+
+
+def test_drain_continues_from_last_drain():
+    ring_buffer = RingBuffer(capacity=4, width=1)
+    ring_buffer.push(1)
+    ring_buffer.push(2)
+    assert ring_buffer.drain()[:, 0].tolist() == [1, 2]
+    ring_buffer.push(3)
+    assert ring_buffer.drain()[:, 0].tolist() == [3]
+
+
+def test_concurrent_producer_and_consumer():
+    num_pushed = 20000
+    ring_buffer = RingBuffer(capacity=64, width=1)
+
+    def produce():
+        for value in range(num_pushed):
+            ring_buffer.push(value)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    drained = []
+    while producer.is_alive() or len(ring_buffer):
+        drained.extend(ring_buffer.drain()[:, 0].tolist())
+    producer.join()
+    drained.extend(ring_buffer.drain()[:, 0].tolist())
+
+    assert drained == sorted(set(drained))  # in order without repeats
+    assert len(drained) + ring_buffer.num_dropped == num_pushed
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(capacity=0, width=1)
@@ -0,0 +1,63 @@
+import pytest
+
+from nuvox.utils.scheduler import TickScheduler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_ticks(scheduler, clock, callback_durations):
+    """ Run one tick per callback duration, waiting for each returned delay, and return the start time of each tick"""
+    tick_times = []
+    clock.now += scheduler.start()
+    for duration in callback_durations:
+        tick_times.append(clock.now)
+        clock.now += duration
+        clock.now += scheduler.tick()
+    return tick_times
+
+
+def test_ticks_do_not_drift():
+    clock = FakeClock()
+    scheduler = TickScheduler(interval=0.05, clock=clock)
+    tick_times = run_ticks(scheduler, clock, [0.01, 0.03, 0.02, 0.049, 0.0])
+    assert tick_times == pytest.approx([0.0, 0.05, 0.1, 0.15, 0.2])
+    assert scheduler.num_overruns == 0
+    assert scheduler.num_skipped == 0
+
+
+@pytest.mark.parametrize('catch_up, expected_tick_times, expected_skipped, expected_caught_up', [
+    (False, [0.0, 0.35, 0.4, 0.5], 2, 0),
+    (True, [0.0, 0.35, 0.35, 0.35, 0.4], 0, 2)])
+def test_overrun(catch_up, expected_tick_times, expected_skipped, expected_caught_up):
+    clock = FakeClock()
+    scheduler = TickScheduler(interval=0.1, catch_up=catch_up, clock=clock)
+    durations = [0.35] + [0.0] * (len(expected_tick_times) - 1)
+    tick_times = run_ticks(scheduler, clock, durations)
+    assert tick_times == pytest.approx(expected_tick_times)
+    assert scheduler.num_overruns == 1
+    assert scheduler.num_skipped == expected_skipped
+    assert scheduler.num_caught_up == expected_caught_up
+    assert scheduler.max_lateness == pytest.approx(0.25)
+
+
+def test_catch_up_is_bounded():
+    clock = FakeClock()
+    scheduler = TickScheduler(interval=0.1, catch_up=True, max_catch_up_ticks=2, clock=clock)
+    run_ticks(scheduler, clock, [0.55] + [0.0] * 4)
+    assert scheduler.num_caught_up == 2
+    assert scheduler.num_skipped == 2
+    assert scheduler.next_deadline == pytest.approx(0.7)
+
+
+def test_invalid_use():
+    with pytest.raises(ValueError):
+        TickScheduler(interval=0)
+    with pytest.raises(ValueError):
+        TickScheduler(interval=0.1).tick()
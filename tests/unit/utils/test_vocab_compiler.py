@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from tests.data.keyboard_fixtures import valid_keyboard
+from nuvox.key import Key
+from nuvox.utils.vocab_compiler import compile_vocab, get_frequency_ranks, get_layout_hash, get_ranks_path
+from nuvox.utils.vocab_index import VocabIndex
+
+
+@pytest.mark.parametrize('frequencies, expected', [([1.0, 3.0, 2.0], [2, 0, 1]),
+                                                   ([2.0, 2.0, 5.0], [1, 2, 0])])
+def test_get_frequency_ranks(frequencies, expected):
+    assert get_frequency_ranks(frequencies).tolist() == expected
+
+
+def test_layout_hash_changes_with_contents():
+    tweaked_keyboard = [Key(x1=key.x1, y1=key.y1, w=key.w, h=key.h, key_id=key.key_id,
+                            contents=list(reversed(key.contents)))
+                        for key in valid_keyboard]
+    assert get_layout_hash(valid_keyboard) == get_layout_hash(list(valid_keyboard))
+    assert get_layout_hash(valid_keyboard) != get_layout_hash(tweaked_keyboard)
+
+
+def test_compile_vocab(tmp_path):
+    output_path = str(tmp_path / 'vocab.idx')
+    assert compile_vocab(['hello', 'the', 'on', 'no', 'h3llo'], valid_keyboard, output_path, workers=2) == 5
+
+    with VocabIndex(output_path) as vocab_index:
+        assert vocab_index['3246'] == ['hello']
+        assert vocab_index['6'] == ['on', 'no']
+        assert vocab_index.num_words == 4  # 'h3llo' is dropped as '3' is not on the keyboard
+        assert not any('h3llo' in words for _, words in vocab_index.items())
+        ranks = np.load(get_ranks_path(output_path))
+        assert sorted(ranks.tolist()) == list(range(vocab_index.num_words))
+        assert ranks[vocab_index.get_word_ids('832')[0]] == 0  # 'the' is the most frequent word
+
+    # unchanged inputs are skipped and only new words are computed
+    assert compile_vocab(['hello', 'the', 'on', 'no', 'h3llo'], valid_keyboard, output_path, workers=2) == 0
+    assert compile_vocab(['hello', 'the', 'on', 'no', 'h3llo', 'tome'], valid_keyboard, output_path, workers=2) == 1
+    with VocabIndex(output_path) as vocab_index:
+        assert vocab_index['862'] == ['tome']
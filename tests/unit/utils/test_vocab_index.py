@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from definition import TESTS_DIR
+from nuvox.services.trace_algorithm import TraceAlgorithm
+from nuvox.utils.io import pickle_load
+from nuvox.utils.vocab_index import VocabIndex, compile_vocab_index, convert_pickle_to_vocab_index, load_vocab
+
+pickle_path = os.path.join(TESTS_DIR, 'data', 'config_fixtures', 'top_25k_vocab.pkl')
+
+discrete_repr_to_words = {'3246': ['hello', 'gello'],
+                          '6': ['on', 'no'],
+                          '862': ['tome'],
+                          '1': ['a', 'ab', 'ça']}
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / 'vocab.idx')
+    compile_vocab_index(discrete_repr_to_words, path)
+    return path
+
+
+def test_lookups_match_dict(index_path):
+    with VocabIndex(index_path) as vocab_index:
+        assert len(vocab_index) == len(discrete_repr_to_words)
+        assert set(vocab_index.keys()) == set(discrete_repr_to_words)
+        for discrete_repr, words in discrete_repr_to_words.items():
+            assert discrete_repr in vocab_index
+            assert vocab_index[discrete_repr] == words
+            assert vocab_index.get(discrete_repr) == words
+
+
+def test_missing_key(index_path):
+    with VocabIndex(index_path) as vocab_index:
+        assert '5' not in vocab_index
+        assert vocab_index.get('5', []) == []
+        assert vocab_index.get_word_ids('5') == range(0)
+        with pytest.raises(KeyError):
+            _ = vocab_index['5']
+
+
+def test_word_ids(index_path):
+    with VocabIndex(index_path) as vocab_index:
+        assert [vocab_index.get_word(word_id) for word_id in vocab_index.get_word_ids('6')] == ['on', 'no']
+
+
+def test_not_an_index(tmp_path):
+    path = str(tmp_path / 'not_an_index.idx')
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * 64)
+    with pytest.raises(ValueError):
+        VocabIndex(path)
+
+
+def test_convert_pickle(tmp_path):
+    path = str(tmp_path / 'top_25k_vocab.idx')
+    convert_pickle_to_vocab_index(pickle_path, path)
+    expected = pickle_load(pickle_path)
+    vocab_index = load_vocab(path)
+    assert isinstance(vocab_index, VocabIndex)
+    assert all(vocab_index[discrete_repr] == words for discrete_repr, words in expected.items())
+    vocab_index.close()
+
+
+def test_trace_algorithm_accepts_either_format(tmp_path):
+    path = str(tmp_path / 'top_25k_vocab.idx')
+    convert_pickle_to_vocab_index(pickle_path, path)
+    key_id_sequence = ['3', '3', '2', '2', '4', '4', '6', '6']
+    from_index = TraceAlgorithm(path, max_count=4).get_possible_word_to_trace_prob(key_id_sequence)
+    from_pickle = TraceAlgorithm(pickle_path, max_count=4).get_possible_word_to_trace_prob(key_id_sequence)
+    assert from_index == from_pickle